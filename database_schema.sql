@@ -53,12 +53,22 @@ CREATE TABLE properties (
     polygon_geometry GEOMETRY(POLYGON, 4326),
     created_by INTEGER REFERENCES users(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Resumo do progresso das etapas, mantido pela API a cada escrita em step_records
+    total_steps INTEGER NOT NULL DEFAULT 0,
+    completed_steps INTEGER NOT NULL DEFAULT 0,
+    completion_percentage DECIMAL(5,2) NOT NULL DEFAULT 0,
+    current_step_id INTEGER, -- primeira etapa não concluída (FK adicionada após regularization_steps)
+    last_activity_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP -- chave da paginação por cursor
 );
 
--- Trigger para atualizar updated_at na tabela properties
+-- Trigger para atualizar updated_at na tabela properties (o recálculo do
+-- resumo de progresso não é uma edição do imóvel e não altera updated_at)
 CREATE TRIGGER update_properties_updated_at 
-    BEFORE UPDATE ON properties 
+    BEFORE UPDATE OF municipal_code, registry_number, address_street, address_number,
+        address_neighborhood, address_city, address_zipcode, area_total, area_built,
+        property_type, current_use, current_owner, regularization_status, description,
+        geometry, polygon_geometry, created_by ON properties 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 -- Tabela de etapas de regularização
@@ -79,6 +89,9 @@ CREATE TRIGGER update_regularization_steps_updated_at
     BEFORE UPDATE ON regularization_steps 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+ALTER TABLE properties ADD CONSTRAINT properties_current_step_id_fkey
+    FOREIGN KEY (current_step_id) REFERENCES regularization_steps(id);
+
 -- Tabela de registros de etapas
 CREATE TABLE step_records (
     id SERIAL PRIMARY KEY,
@@ -88,6 +101,7 @@ CREATE TABLE step_records (
         CHECK (status IN ('not_started', 'in_progress', 'completed', 'blocked')),
     start_date DATE,
     end_date DATE,
+    expected_end_date DATE, -- start_date + estimated_duration_days da etapa
     responsible_user_id INTEGER REFERENCES users(id),
     observations TEXT,
     completion_percentage INTEGER DEFAULT 0 CHECK (completion_percentage >= 0 AND completion_percentage <= 100),
@@ -109,6 +123,7 @@ CREATE TABLE documents (
     filename VARCHAR(255) NOT NULL,
     file_path VARCHAR(500) NOT NULL,
     file_size BIGINT,
+    content_hash VARCHAR(64), -- SHA-256 do blob em document_blobs
     file_type VARCHAR(100),
     document_type VARCHAR(100),
     description TEXT,
@@ -116,6 +131,76 @@ CREATE TABLE documents (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Blobs de documentos endereçados por conteúdo (SHA-256), com contagem de referências
+CREATE TABLE document_blobs (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    file_path VARCHAR(500) NOT NULL,
+    file_size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabela de contadores do dashboard (mantida pela aplicação a cada escrita)
+CREATE TABLE dashboard_counters (
+    name VARCHAR(100) PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Etapas concluídas por mês de conclusão, etapa e bairro (mantida pela aplicação a cada escrita)
+CREATE TABLE monthly_completions (
+    month DATE NOT NULL, -- primeiro dia do mês de step_records.end_date
+    step_id INTEGER NOT NULL REFERENCES regularization_steps(id),
+    neighborhood VARCHAR(100) NOT NULL DEFAULT '', -- bairro do imóvel ('' quando não informado)
+    completed_steps INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (month, step_id, neighborhood)
+);
+
+-- Histograma das durações (end_date - start_date, em dias) das etapas concluídas, na mesma chave
+CREATE TABLE step_duration_buckets (
+    month DATE NOT NULL, -- primeiro dia do mês de step_records.end_date
+    step_id INTEGER NOT NULL REFERENCES regularization_steps(id),
+    neighborhood VARCHAR(100) NOT NULL DEFAULT '',
+    bucket SMALLINT NOT NULL, -- faixa de duração (src/services/histograms.py)
+    records INTEGER NOT NULL DEFAULT 0,
+    total_days BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, step_id, neighborhood, bucket)
+);
+
+-- Outbox transacional: eventos gravados na transação da escrita e processados pelo worker
+CREATE TABLE outbox_events (
+    id SERIAL PRIMARY KEY,
+    event_type VARCHAR(100) NOT NULL,
+    payload JSON NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processed', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- próxima tentativa ou fim da reserva do worker
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+-- Versão das alterações de imóveis: o incremento bloqueia a linha até o commit
+CREATE TABLE change_versions (
+    name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Imóveis criados, excluídos ou com geometria/status alterados em cada versão
+-- (invalidação da R-tree e do índice de clusters em memória)
+CREATE TABLE property_changes (
+    id SERIAL PRIMARY KEY,
+    version BIGINT NOT NULL,
+    property_id INTEGER NOT NULL,
+    -- retângulo da geometria anterior (nulo para imóveis novos)
+    previous_min_lng DOUBLE PRECISION,
+    previous_min_lat DOUBLE PRECISION,
+    previous_max_lng DOUBLE PRECISION,
+    previous_max_lat DOUBLE PRECISION
+);
+
 -- Criar índices para otimização de performance
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_role ON users(role);
@@ -129,6 +214,9 @@ CREATE INDEX idx_properties_neighborhood ON properties(address_neighborhood);
 -- Índices espaciais PostGIS
 CREATE INDEX idx_properties_geometry ON properties USING GIST(geometry);
 CREATE INDEX idx_properties_polygon_geometry ON properties USING GIST(polygon_geometry);
+-- Busca por raio e vizinhos mais próximos em metros (ST_DWithin / <-> sobre geography);
+-- expressão idêntica à gerada pelas consultas (cast(Property.geometry, Geography))
+CREATE INDEX idx_properties_geography ON properties USING GIST(CAST(geometry AS geography(GEOMETRY,-1)));
 
 CREATE INDEX idx_regularization_steps_order ON regularization_steps(order_sequence);
 CREATE INDEX idx_regularization_steps_active ON regularization_steps(active);
@@ -138,10 +226,45 @@ CREATE INDEX idx_step_records_step ON step_records(step_id);
 CREATE INDEX idx_step_records_status ON step_records(status);
 CREATE INDEX idx_step_records_property_status ON step_records(property_id, status);
 CREATE INDEX idx_step_records_responsible ON step_records(responsible_user_id);
+CREATE INDEX idx_step_records_status_expected_end ON step_records(status, expected_end_date);
 
 CREATE INDEX idx_documents_step_record ON documents(step_record_id);
 CREATE INDEX idx_documents_type ON documents(document_type);
 CREATE INDEX idx_documents_uploaded_by ON documents(uploaded_by);
+CREATE INDEX idx_documents_content_hash ON documents(content_hash);
+
+-- Índices para a paginação por cursor (chave de ordenação + desempate por id)
+CREATE INDEX idx_properties_created_at_id ON properties(created_at, id);
+CREATE INDEX idx_properties_updated_at_id ON properties(updated_at, id);
+
+-- Ordenação da listagem de imóveis pelo progresso
+CREATE INDEX idx_properties_completion_id ON properties(completion_percentage, id);
+CREATE INDEX idx_properties_last_activity_id ON properties(last_activity_at, id);
+CREATE INDEX idx_step_records_created_at_id ON step_records(created_at, id);
+CREATE INDEX idx_step_records_updated_at_id ON step_records(updated_at, id);
+CREATE INDEX idx_documents_created_at_id ON documents(created_at, id);
+
+-- Lote do worker do outbox e limpeza dos eventos processados
+CREATE INDEX idx_outbox_events_status_available ON outbox_events(status, available_at, id);
+CREATE INDEX idx_outbox_events_processed_at ON outbox_events(processed_at);
+
+-- Alterações de imóveis posteriores à versão de um índice em memória
+CREATE INDEX idx_property_changes_version ON property_changes(version, property_id);
+
+-- Busca textual de imóveis (trigramas + tsvector, sem acentos)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text AS
+$$ SELECT public.unaccent('public.unaccent', $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+CREATE INDEX idx_properties_search_trgm ON properties USING GIN (
+    immutable_unaccent(lower(coalesce(properties.municipal_code, '') || ' ' || coalesce(properties.address_street, '') || ' ' || coalesce(properties.current_owner, ''))) gin_trgm_ops
+);
+CREATE INDEX idx_properties_search_tsv ON properties USING GIN (
+    to_tsvector('portuguese'::regconfig, immutable_unaccent(lower(coalesce(properties.municipal_code, '') || ' ' || coalesce(properties.address_street, '') || ' ' || coalesce(properties.current_owner, ''))))
+);
 
 -- Inserir etapas padrão de regularização
 INSERT INTO regularization_steps (name, description, order_sequence, estimated_duration_days, required_documents) VALUES
@@ -166,7 +289,7 @@ SELECT
 FROM properties 
 GROUP BY regularization_status;
 
--- View para progresso de etapas por imóvel
+-- View para progresso de etapas por imóvel (lê o resumo mantido em properties)
 CREATE VIEW property_progress AS
 SELECT 
     p.id as property_id,
@@ -174,16 +297,12 @@ SELECT
     p.address_street,
     p.address_number,
     p.regularization_status,
-    COUNT(sr.id) as total_steps,
-    COUNT(CASE WHEN sr.status = 'completed' THEN 1 END) as completed_steps,
-    ROUND(
-        COUNT(CASE WHEN sr.status = 'completed' THEN 1 END) * 100.0 / 
-        NULLIF(COUNT(sr.id), 0), 2
-    ) as completion_percentage
-FROM properties p
-LEFT JOIN step_records sr ON p.id = sr.property_id
-LEFT JOIN regularization_steps rs ON sr.step_id = rs.id AND rs.active = true
-GROUP BY p.id, p.municipal_code, p.address_street, p.address_number, p.regularization_status;
+    p.total_steps,
+    p.completed_steps,
+    p.completion_percentage,
+    p.current_step_id,
+    p.last_activity_at
+FROM properties p;
 
 -- View para dashboard de estatísticas gerais
 CREATE VIEW dashboard_stats AS
@@ -201,6 +320,8 @@ COMMENT ON TABLE properties IS 'Imóveis públicos em processo de regularizaçã
 COMMENT ON TABLE regularization_steps IS 'Etapas padrão do processo de regularização';
 COMMENT ON TABLE step_records IS 'Registros de progresso das etapas por imóvel';
 COMMENT ON TABLE documents IS 'Documentos anexados às etapas de regularização';
+COMMENT ON TABLE document_blobs IS 'Arquivos de documentos armazenados uma única vez por conteúdo';
+COMMENT ON TABLE dashboard_counters IS 'Contadores agregados do dashboard (reconstruir com flask rebuild-counters)';
 
 -- Comentários nos campos geoespaciais
 COMMENT ON COLUMN properties.geometry IS 'Localização pontual do imóvel (lat/lng)';
@@ -0,0 +1,69 @@
+"""Benchmark dos clusters do mapa por zoom.
+
+    python benchmarks/bench_clusters.py --properties 100000
+
+Mede a montagem do índice, a atualização incremental após uma alteração e
+GET /api/properties/clusters para uma tela de 1280x800 px em vários zooms.
+Rodando com --properties 10000 e 100000 dá para comparar: nos zooms baixos o
+tempo depende da quantidade de clusters na tela, não do total de imóveis.
+"""
+import argparse
+import time
+
+from common import create_benchmark_app, login, measure, report, seed
+
+CENTER = (-46.96, -22.43)
+ZOOMS = [10, 12, 14, 16, 18]
+
+
+def viewport(zoom, width=1280, height=800):
+    """bbox de uma tela centrada no município"""
+    from src.services import mvt
+
+    x, y = mvt.lnglat_to_tile_fraction(*CENTER, zoom)
+    min_lng, max_lat = mvt.tile_fraction_to_lnglat(x - width / 512, y - height / 512, zoom)
+    max_lng, min_lat = mvt.tile_fraction_to_lnglat(x + width / 512, y + height / 512, zoom)
+    return f'{min_lng},{min_lat},{max_lng},{max_lat}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=0, with_geometry=True)
+    client = login(app)
+
+    from src.models import db
+    from src.models.property import Property
+    from src.services import clusters
+
+    with app.app_context():
+        started = time.perf_counter()
+        with clusters._lock:
+            clusters.cluster_index()
+        print(f'Montagem do índice: {(time.perf_counter() - started) * 1000:.1f} ms')
+
+        prop = db.session.get(Property, 1)
+        prop.regularization_status = 'registry_completed'
+        db.session.commit()
+        started = time.perf_counter()
+        with clusters._lock:
+            clusters.cluster_index()
+        print(f'Atualização após alterar um imóvel: {(time.perf_counter() - started) * 1000:.1f} ms')
+
+    results = {}
+    for zoom in ZOOMS:
+        params = {'bbox': viewport(zoom), 'zoom': zoom}
+        total = client.get('/api/properties/clusters', query_string=params).get_json()['total']
+        results[f'zoom {zoom} ({total} itens)'] = measure(
+            lambda: client.get('/api/properties/clusters', query_string=params), repeat=args.repeat
+        )
+
+    report(f'Clusters do mapa ({args.properties} imóveis)', results)
+
+
+if __name__ == '__main__':
+    main()
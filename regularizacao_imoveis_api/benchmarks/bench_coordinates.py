@@ -0,0 +1,81 @@
+"""Benchmark da serialização de imóveis com coordenadas (include_geometry).
+
+    python benchmarks/bench_coordinates.py --properties 10000
+
+Compara a decodificação linha a linha das geometrias (WKBElement por objeto)
+com a projeção ST_X/ST_Y na consulta (PostGIS) ou a decodificação em lote
+(SQLite), serializando uma página com todos os imóveis.
+"""
+import argparse
+
+from common import create_benchmark_app, login, measure, report, seed
+
+
+def per_row(properties):
+    """Abordagem anterior: cada objeto decodifica a própria geometria"""
+    from src.services import wkb
+
+    serialized = []
+    for prop in properties:
+        data = prop.to_dict()
+        point = wkb.decode(prop.geometry)
+        data['coordinates'] = {'latitude': point['coordinates'][1], 'longitude': point['coordinates'][0]} if point else None
+        data['polygon'] = wkb.decode(prop.polygon_geometry)
+        serialized.append(data)
+    return serialized
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=0, with_geometry=True)
+    client = login(app)
+
+    from src.models import db
+    from src.models.property import Property
+    from src.services import wkb
+    from src.services.coordinates import load_coordinates, with_coordinates
+
+    def before():
+        with app.app_context():
+            per_row(Property.query.order_by(Property.id).all())
+            db.session.remove()
+
+    def after():
+        with app.app_context():
+            properties = with_coordinates(Property.query.order_by(Property.id)).all()
+            [prop.to_dict(include_geometry=True) for prop in load_coordinates(properties)]
+            db.session.remove()
+
+    params = {'per_page': args.properties, 'include_geometry': 'true'}
+    results = {}
+    with app.app_context():
+        # Só a extração das coordenadas, com os objetos já carregados
+        properties = Property.query.order_by(Property.id).all()
+
+        def extract_per_row():
+            return [(wkb.decode(prop.geometry), wkb.decode(prop.polygon_geometry)) for prop in properties]
+
+        def extract_batch():
+            for prop in properties:
+                prop.__dict__.pop('longitude', None)
+            return load_coordinates(properties)
+
+        results['extração: por linha'] = measure(extract_per_row, repeat=args.repeat)
+        results['extração: em lote'] = measure(extract_batch, repeat=args.repeat)
+
+    results['antes: consulta + decodificação por linha'] = measure(before, repeat=args.repeat)
+    results['depois: consulta com projeção/lote'] = measure(after, repeat=args.repeat)
+    results['GET /api/properties?include_geometry=true'] = measure(
+        lambda: client.get('/api/properties', query_string=params), repeat=args.repeat
+    )
+
+    report(f'Serialização com coordenadas ({args.properties} imóveis)', results)
+
+
+if __name__ == '__main__':
+    main()
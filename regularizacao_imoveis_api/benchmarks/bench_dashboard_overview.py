@@ -0,0 +1,56 @@
+"""Benchmark de GET /api/dashboard/overview: onze COUNT(*) x contadores incrementais.
+
+    python benchmarks/bench_dashboard_overview.py --properties 100000
+"""
+import argparse
+
+from common import create_benchmark_app, login, measure, report, seed
+
+
+def legacy_overview():
+    """Implementação anterior: onze consultas COUNT(*) por requisição"""
+    from src.models.document import Document
+    from src.models.property import Property
+    from src.models.step_record import StepRecord
+    from src.models.user import User
+
+    Property.query.count()
+    for status in ['in_progress', 'municipal_registered', 'registry_completed', 'pending']:
+        Property.query.filter_by(regularization_status=status).count()
+    StepRecord.query.count()
+    for status in ['in_progress', 'completed', 'blocked']:
+        StepRecord.query.filter_by(status=status).count()
+    Document.query.count()
+    User.query.filter_by(active=True).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=100000)
+    parser.add_argument('--steps-per-property', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=args.steps_per_property)
+    client = login(app)
+
+    from src.services.counters import rebuild_counters
+    from src.models import db
+
+    with app.app_context():
+        rebuild_counters()
+        db.session.commit()
+        before = measure(legacy_overview, repeat=args.repeat)
+
+    after = measure(lambda: client.get('/api/dashboard/overview'), repeat=args.repeat)
+
+    report(
+        f'Dashboard overview ({args.properties} imóveis, '
+        f'{args.properties * args.steps_per_property} registros de etapas)',
+        {'antes: 11 x COUNT(*)': before, 'depois: GET /api/dashboard/overview': after}
+    )
+
+
+if __name__ == '__main__':
+    main()
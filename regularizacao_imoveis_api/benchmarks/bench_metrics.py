@@ -0,0 +1,78 @@
+"""Custo da instrumentação de requisições e SQL (services/metrics.py).
+
+    python benchmarks/bench_metrics.py --properties 5000
+
+Mede os mesmos endpoints com a coleta ligada e desligada (flag
+``enabled`` do RequestMetrics, sem recriar a aplicação) e o custo por
+instrução dos eventos de cursor, executando ``SELECT 1`` com e sem os
+listeners registrados no engine.
+"""
+import argparse
+
+from common import create_benchmark_app, login, measure, report, seed
+
+ENDPOINTS = [
+    ('GET /api/properties (50)', '/api/properties', {'per_page': 50}),
+    ('GET /api/properties/1', '/api/properties/1', {}),
+    ('GET /api/dashboard/overview', '/api/dashboard/overview', {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--statements', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties)
+    client = login(app)
+    metrics = app.extensions['metrics']
+
+    from sqlalchemy import event
+    from src.models import db
+    from src.services import metrics as metrics_service
+
+    results = {}
+    overhead = {}
+    for title, path, params in ENDPOINTS:
+        def call():
+            return client.get(path, query_string=params)
+
+        metrics.enabled = False
+        off = measure(call, repeat=args.repeat, warmup=10)
+        metrics.enabled = True
+        on = measure(call, repeat=args.repeat, warmup=10)
+        results[f'{title}: sem coleta'] = off
+        results[f'{title}: com coleta'] = on
+        overhead[title] = on['p50_ms'] - off['p50_ms']
+    report('Requisições com e sem instrumentação', results)
+
+    with app.app_context():
+        engine = db.engine
+
+        def statements():
+            with engine.connect() as connection:
+                for _ in range(args.statements):
+                    connection.exec_driver_sql('SELECT 1')
+
+        with_listeners = measure(statements, repeat=5, warmup=1)
+        event.remove(engine, 'before_cursor_execute', metrics_service._before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', metrics_service._after_cursor_execute)
+        without_listeners = measure(statements, repeat=5, warmup=1)
+        event.listen(engine, 'before_cursor_execute', metrics_service._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', metrics_service._after_cursor_execute)
+
+    report(f'{args.statements} x SELECT 1', {
+        'com listeners': with_listeners,
+        'sem listeners': without_listeners,
+    })
+    per_statement_us = (with_listeners['p50_ms'] - without_listeners['p50_ms']) * 1000 / args.statements
+    print(f'\n  custo por instrução: {per_statement_us:.2f} µs')
+    for title, delta in overhead.items():
+        print(f'  custo por requisição ({title}): {delta * 1000:.0f} µs (p50)')
+
+
+if __name__ == '__main__':
+    main()
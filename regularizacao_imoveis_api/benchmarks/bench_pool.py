@@ -0,0 +1,84 @@
+"""Teste de carga do pool de conexões: várias threads disputando poucas conexões.
+
+    python benchmarks/bench_pool.py --threads 16 --pool-size 2 --max-overflow 0 --pool-timeout 1
+    python benchmarks/bench_pool.py --threads 16 --pool-size 8 --max-overflow 8
+
+Cada thread repete listagens de imóveis e o dashboard durante --duration
+segundos. São reportados vazão, latência, respostas com erro (pool esgotado
+ou instrução cancelada) e as métricas de /api/admin/db-pool.
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+ENDPOINTS = [
+    ('/api/properties', {'per_page': 50}),
+    ('/api/properties', {'per_page': 50, 'status': 'pending'}),
+    ('/api/dashboard/overview', {}),
+    ('/api/dashboard/steps-progress', {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--max-overflow', type=int, default=0)
+    parser.add_argument('--pool-timeout', type=int, default=1)
+    parser.add_argument('--statement-timeout', type=int, default=0, help='ms para o blueprint dashboard (0 = padrão)')
+    args = parser.parse_args()
+
+    # O Config lê as variáveis na importação da aplicação
+    os.environ['DB_POOL_SIZE'] = str(args.pool_size)
+    os.environ['DB_MAX_OVERFLOW'] = str(args.max_overflow)
+    os.environ['DB_POOL_TIMEOUT'] = str(args.pool_timeout)
+    if args.statement_timeout:
+        os.environ['DB_STATEMENT_TIMEOUTS'] = f'dashboard={args.statement_timeout}'
+
+    from common import create_benchmark_app, login, seed
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=5)
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(offset):
+        client = login(app)
+        index = offset
+        while time.perf_counter() < deadline:
+            path, params = ENDPOINTS[index % len(ENDPOINTS)]
+            index += 1
+            started = time.perf_counter()
+            response = client.get(path, query_string=params)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    print(f'\nPool {args.pool_size}+{args.max_overflow} (espera {args.pool_timeout}s), '
+          f'{args.threads} threads, {args.duration:.0f}s')
+    print(f'  requisições: {len(latencies)} ({len(latencies) / args.duration:.1f}/s), status: {statuses}')
+    print(f'  latência p50={statistics.median(latencies):.1f} ms  '
+          f'p95={latencies[int(len(latencies) * 0.95)]:.1f} ms  max={latencies[-1]:.1f} ms')
+
+    pool = login(app).get('/api/admin/db-pool').get_json()['engines']['default']
+    for key in ('checkouts', 'wait_ms_avg', 'wait_ms_max', 'pool_timeouts', 'statement_timeouts', 'connects'):
+        print(f'  {key}: {pool.get(key)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Benchmark da busca de imóveis: três ILIKE '%termo%' x busca indexada.
+
+    python benchmarks/bench_property_search.py --properties 200000
+"""
+import argparse
+
+from common import create_benchmark_app, login, measure, report, seed
+
+TERMS = ['sao jose', 'Palmeiras', 'MM01234', 'educação', 'botesi']
+
+
+def legacy_search(term):
+    """Implementação anterior: OR de três ILIKE, sem ranking"""
+    from src.models.property import Property
+
+    query = Property.query.filter(
+        (Property.municipal_code.ilike(f'%{term}%')) |
+        (Property.address_street.ilike(f'%{term}%')) |
+        (Property.current_owner.ilike(f'%{term}%'))
+    )
+    query.paginate(page=1, per_page=10, error_out=False).items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=0)
+    client = login(app)
+
+    results = {}
+    for term in TERMS:
+        with app.test_request_context():
+            results[f'antes: ILIKE "{term}"'] = measure(lambda: legacy_search(term), repeat=args.repeat)
+        results[f'depois: GET ?search={term}'] = measure(
+            lambda: client.get('/api/properties', query_string={'search': term}), repeat=args.repeat
+        )
+
+    report(f'Busca de imóveis ({args.properties} imóveis)', results)
+
+
+if __name__ == '__main__':
+    main()
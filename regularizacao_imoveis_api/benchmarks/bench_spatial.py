@@ -0,0 +1,64 @@
+"""Benchmark das consultas espaciais: filtro no cliente x endpoints indexados.
+
+    python benchmarks/bench_spatial.py --properties 100000
+
+Sem BENCH_DATABASE_URL (SQLite) é medida a R-tree em memória; com PostGIS,
+os predicados ST_Intersects/ST_DWithin/<-> servidos pelos índices GIST.
+"""
+import argparse
+import time
+
+from common import create_benchmark_app, login, measure, report, seed
+
+BBOX = '-46.97,-22.44,-46.95,-22.42'
+CENTER = {'lat': -22.43, 'lng': -46.96}
+
+
+def client_side_filter():
+    """Abordagem anterior do mapa: carregar todos os imóveis e filtrar localmente"""
+    from src.models.property import Property
+    from src.services import wkb
+
+    min_lng, min_lat, max_lng, max_lat = [float(v) for v in BBOX.split(',')]
+    selected = []
+    for prop in Property.query.all():
+        geometry = wkb.decode(prop.geometry)
+        if geometry:
+            x, y = geometry['coordinates']
+            if min_lng <= x <= max_lng and min_lat <= y <= max_lat:
+                selected.append(prop.to_dict())
+    return selected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=0, with_geometry=True)
+    client = login(app)
+
+    started = time.perf_counter()
+    client.get('/api/properties/nearest', query_string=dict(CENTER, k=1))
+    print(f'Primeira consulta (inclui montagem do índice no fallback): {(time.perf_counter() - started) * 1000:.1f} ms')
+
+    results = {}
+    with app.app_context():
+        results['antes: todos os imóveis + filtro'] = measure(client_side_filter, repeat=3, warmup=0)
+    results['depois: GET /within'] = measure(
+        lambda: client.get('/api/properties/within', query_string={'bbox': BBOX}), repeat=args.repeat
+    )
+    results['depois: GET /near (500 m)'] = measure(
+        lambda: client.get('/api/properties/near', query_string=dict(CENTER, radius=500)), repeat=args.repeat
+    )
+    results['depois: GET /nearest (k=10)'] = measure(
+        lambda: client.get('/api/properties/nearest', query_string=dict(CENTER, k=10)), repeat=args.repeat
+    )
+
+    report(f'Consultas espaciais ({args.properties} imóveis)', results)
+
+
+if __name__ == '__main__':
+    main()
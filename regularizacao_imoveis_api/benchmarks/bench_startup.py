@@ -0,0 +1,119 @@
+"""Benchmark de inicialização: importação da aplicação e primeira requisição.
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --runs 10 --output startup.json
+
+Cada execução é um interpretador novo (como um worker do gunicorn) que mede:
+importação de ``src.main``, ``create_app()`` e a primeira requisição
+autenticada (``GET /api/dashboard/overview``, que abre a primeira conexão).
+O banco é criado e populado uma única vez antes das execuções.
+
+Com --output, o resultado é acrescentado (uma linha JSON por execução do
+benchmark, com o commit atual) ao arquivo indicado, para acompanhar a
+evolução entre versões.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from common import ROOT, create_benchmark_app, report, seed
+
+FIRST_REQUEST = '/api/dashboard/overview'
+
+
+def child():
+    """Executado no subprocesso: imprime os tempos de cada fase em JSON"""
+    timings = {}
+
+    started = time.perf_counter()
+    import src.main
+    timings['import src.main'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    app = src.main.create_app()
+    timings['create_app()'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['user_role'] = 'admin'
+    response = client.get(FIRST_REQUEST)
+    timings[f'primeira requisição ({FIRST_REQUEST})'] = time.perf_counter() - started
+    if response.status_code != 200:
+        raise SystemExit(f'{FIRST_REQUEST} retornou {response.status_code}')
+
+    modules = sorted(name for name in ('psycopg2', 'geoalchemy2', 'bcrypt') if name in sys.modules)
+    print(json.dumps({'timings': timings, 'modules': modules}))
+
+
+def summarize(samples):
+    samples = sorted(value * 1000 for value in samples)
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'mean_ms': round(statistics.mean(samples), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    if '--child' in sys.argv:
+        return child()
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--properties', type=int, default=1000)
+    parser.add_argument('--output', help='arquivo JSON Lines para acumular os resultados')
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=5)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+
+    samples = {}
+    modules = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child'],
+            cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        total = time.perf_counter() - started
+        if result.returncode != 0:
+            sys.exit(result.stderr)
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        for name, seconds in data['timings'].items():
+            samples.setdefault(name, []).append(seconds)
+        samples.setdefault('processo completo (interpretador + primeira resposta)', []).append(total)
+        modules = data['modules']
+
+    results = {name: summarize(values) for name, values in samples.items()}
+    report(f'Inicialização ({args.runs} processos, banco {app.config["SQLALCHEMY_DATABASE_URI"].split(":")[0]})', results)
+    print(f'  módulos opcionais carregados até a primeira resposta: {", ".join(modules) or "nenhum"}')
+
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as output:
+            output.write(json.dumps({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'runs': args.runs,
+                'results': results
+            }, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
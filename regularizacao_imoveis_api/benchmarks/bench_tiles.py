@@ -0,0 +1,44 @@
+"""Benchmark dos vector tiles do mapa: geração (cache vazio) x cache.
+
+    python benchmarks/bench_tiles.py --properties 100000
+"""
+import argparse
+
+from common import create_benchmark_app, login, measure, report, seed
+
+CENTER = (-46.96, -22.43)
+ZOOMS = [12, 14, 16]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--properties', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    seed(app, properties=args.properties, steps_per_property=0, with_geometry=True)
+    client = login(app)
+
+    from src.services import mvt, tiles
+
+    results = {}
+    for z in ZOOMS:
+        x, y = [int(value) for value in mvt.lnglat_to_tile_fraction(*CENTER, z)]
+        url = f'/api/properties/tiles/{z}/{x}/{y}.mvt'
+        client.get(url)
+
+        def cold():
+            with app.app_context():
+                tiles.clear_cache()
+            return client.get(url)
+
+        size = len(client.get(url).data)
+        results[f'z{z} sem cache ({size // 1024} KB)'] = measure(cold, repeat=args.repeat)
+        results[f'z{z} em cache'] = measure(lambda: client.get(url), repeat=args.repeat)
+
+    report(f'Vector tiles ({args.properties} imóveis)', results)
+
+
+if __name__ == '__main__':
+    main()
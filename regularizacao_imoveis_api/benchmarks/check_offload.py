@@ -0,0 +1,76 @@
+"""Confere os cabeçalhos da entrega de downloads pelo proxy (DOCUMENT_OFFLOAD).
+
+Para ``x-accel-redirect`` e ``x-sendfile``, o download autorizado deve responder
+200 sem corpo, com o cabeçalho de redirecionamento interno apontando para o
+blob, Content-Disposition, Content-Type e ETag (SHA-256); com ``If-None-Match``
+igual à ETag, 304 sem o cabeçalho de redirecionamento. Falha (código de saída 1)
+em qualquer divergência. Pode ser executado no CI:
+
+    python benchmarks/check_offload.py
+"""
+import io
+import os
+import sys
+
+from common import create_benchmark_app, login, seed
+
+CONTENT = b'%PDF-1.4 certidao de teste\n' * 100
+
+
+def check(label, condition, failures):
+    print(f'{"ok  " if condition else "FAIL"} {label}')
+    if not condition:
+        failures.append(label)
+
+
+def main():
+    app = create_benchmark_app()
+    seed(app, properties=1)
+    client = login(app)
+
+    response = client.post('/api/documents/upload', data={
+        'file': (io.BytesIO(CONTENT), 'certidao.pdf'),
+        'step_record_id': 1
+    }, content_type='multipart/form-data')
+    document = response.get_json()['document']
+    url = f"/api/documents/{document['id']}/download"
+
+    with app.app_context():
+        from src.services.storage import storage_root
+        relative = os.path.relpath(document['file_path'], storage_root()).replace(os.sep, '/')
+    expected = {
+        'x-accel-redirect': ('X-Accel-Redirect', f"{app.config['DOCUMENT_ACCEL_PREFIX']}/{relative}"),
+        'x-sendfile': ('X-Sendfile', os.path.abspath(document['file_path']))
+    }
+
+    failures = []
+    for offload, (header, value) in expected.items():
+        app.config['DOCUMENT_OFFLOAD'] = offload
+        response = client.get(url)
+        check(f'{offload}: 200', response.status_code == 200, failures)
+        check(f'{offload}: corpo vazio', response.data == b'', failures)
+        check(f'{offload}: {header}', response.headers.get(header) == value, failures)
+        check(f'{offload}: ETag', response.headers.get('ETag') == f'"{document["content_hash"]}"', failures)
+        check(f'{offload}: Content-Type', response.mimetype == 'application/pdf', failures)
+        check(f'{offload}: Content-Disposition',
+              'attachment' in response.headers.get('Content-Disposition', '')
+              and 'certidao.pdf' in response.headers.get('Content-Disposition', ''), failures)
+
+        response = client.get(url, headers={'If-None-Match': f'"{document["content_hash"]}"'})
+        check(f'{offload}: 304 com If-None-Match', response.status_code == 304, failures)
+        check(f'{offload}: 304 sem {header}', header not in response.headers, failures)
+        check(f'{offload}: 304 sem corpo', response.data == b'', failures)
+
+    # Sem offload, o Flask entrega os bytes
+    app.config['DOCUMENT_OFFLOAD'] = ''
+    response = client.get(url)
+    check('sem offload: conteúdo entregue pelo Flask', response.data == CONTENT, failures)
+    response.close()
+
+    if failures:
+        print(f'\n{len(failures)} verificação(ões) falharam')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Gerador determinístico de dados sintéticos em escala municipal.
+
+    python benchmarks/datagen.py --properties 50000 --users 80 --documents 20000
+
+Popula o banco de benchmark (BENCH_DATABASE_URL ou um SQLite temporário; o
+banco é recriado) com:
+
+* usuários (um administrador com id 1, gestores e operadores);
+* imóveis agrupados em bairros dentro de um retângulo como o de Mogi Mirim,
+  cada um com ponto e polígono do lote (retângulo girado, área plausível);
+* registros das cinco etapas padrão em sequência: etapas concluídas com datas
+  encadeadas em torno da duração estimada, uma etapa em andamento (ou
+  bloqueada) e as seguintes não iniciadas; o status do imóvel acompanha o
+  avanço das etapas;
+* documentos com arquivos reais no armazenamento por conteúdo
+  (``UPLOAD_FOLDER/documents``), parte deles com conteúdo repetido.
+
+A mesma semente e a mesma data de referência (``--reference-date``, padrão
+hoje) geram exatamente os mesmos dados.
+"""
+import argparse
+import hashlib
+import math
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from common import DEFAULT_STEPS, OWNERS, STREETS, advance_sequences, create_benchmark_app
+
+# Retângulo da área urbana (lng/lat)
+BBOX = (-47.02, -22.49, -46.90, -22.37)
+NEIGHBORHOODS = [
+    'Centro', 'Jardim Santa Helena', 'Parque da Imprensa', 'Jardim Planalto', 'Vila Dias',
+    'Jardim Guaçu Mirim', 'Saúde', 'Linda Chaib', 'Mirante', 'Jardim Bela Vista',
+    'Santa Cruz', 'Tucura', 'Jardim Paulista', 'Vila Santa Luzia', 'Parque das Laranjeiras',
+    'Jardim Murayama', 'Jardim Nazareth', 'Vila Bianchi', 'Jardim Scomparim', 'Parque do Estado',
+]
+PROPERTY_TYPES = ['Residencial', 'Comercial', 'Institucional', 'Área Verde', 'Escola', 'Unidade de Saúde']
+DOCUMENT_TYPES = [
+    ('Planta topográfica', 'application/pdf', '.pdf'),
+    ('Memorial descritivo', 'application/pdf', '.pdf'),
+    ('Certidão de matrícula', 'application/pdf', '.pdf'),
+    ('Parecer jurídico', 'application/pdf', '.pdf'),
+    ('Foto do imóvel', 'image/jpeg', '.jpg'),
+    ('Alvará', 'application/pdf', '.pdf'),
+]
+PASSWORD = 'benchmark'
+METERS_PER_DEGREE = 111320
+
+
+def _neighborhoods(rng, count):
+    """Centros e espalhamento (graus) dos bairros"""
+    names = NEIGHBORHOODS + [f'Loteamento {index}' for index in range(1, max(count - len(NEIGHBORHOODS), 0) + 1)]
+    return [(
+        names[index],
+        rng.uniform(BBOX[0] + 0.01, BBOX[2] - 0.01),
+        rng.uniform(BBOX[1] + 0.01, BBOX[3] - 0.01),
+        rng.uniform(0.002, 0.008)
+    ) for index in range(count)]
+
+
+def _lot(rng, lng, lat, area):
+    """Polígono (EWKT) de um lote retangular girado com a área informada em m²"""
+    depth = math.sqrt(area * rng.uniform(1.5, 3.0))
+    width = area / depth
+    angle = rng.uniform(0, math.pi)
+    cos_lat = math.cos(math.radians(lat))
+    corners = []
+    for dx, dy in ((-width / 2, -depth / 2), (width / 2, -depth / 2), (width / 2, depth / 2), (-width / 2, depth / 2)):
+        x = dx * math.cos(angle) - dy * math.sin(angle)
+        y = dx * math.sin(angle) + dy * math.cos(angle)
+        corners.append((lng + x / (METERS_PER_DEGREE * cos_lat), lat + y / METERS_PER_DEGREE))
+    corners.append(corners[0])
+    return 'SRID=4326;POLYGON((' + ', '.join(f'{x:.7f} {y:.7f}' for x, y in corners) + '))'
+
+
+def _progress(rng):
+    """Quantidade de etapas concluídas e status do imóvel"""
+    completed = rng.choices(range(len(DEFAULT_STEPS) + 1), weights=[22, 20, 18, 16, 12, 12])[0]
+    if completed == len(DEFAULT_STEPS):
+        return completed, 'registry_completed'
+    if completed >= 3:
+        return completed, 'municipal_registered'
+    if completed == 0 and rng.random() < 0.5:
+        return completed, 'pending'
+    return completed, 'in_progress'
+
+
+def _step_records(rng, property_id, completed, status, created_at, reference, operators, now):
+    """Registros das etapas de um imóvel com datas encadeadas"""
+    records = []
+    cursor = created_at.date() + timedelta(days=rng.randint(0, 30))
+    for index, (_, _, duration) in enumerate(DEFAULT_STEPS):
+        record = {
+            'property_id': property_id, 'step_id': index + 1, 'status': 'not_started',
+            'start_date': None, 'end_date': None, 'expected_end_date': None,
+            'responsible_user_id': rng.choice(operators), 'completion_percentage': 0,
+            'observations': None, 'created_by': 1, 'created_at': created_at, 'updated_at': now
+        }
+        started = index < completed or (index == completed and status != 'pending')
+        if started and cursor <= reference:
+            record['start_date'] = cursor
+            record['expected_end_date'] = cursor + timedelta(days=duration)
+            if index < completed:
+                end = cursor + timedelta(days=max(1, int(rng.gauss(duration, duration * 0.35))))
+                end = min(end, reference)
+                record.update(status='completed', end_date=end, completion_percentage=100)
+                cursor = end + timedelta(days=rng.randint(0, 15))
+            else:
+                record['status'] = 'blocked' if rng.random() < 0.1 else 'in_progress'
+                record['completion_percentage'] = rng.randrange(0, 100, 10)
+                if record['status'] == 'blocked':
+                    record['observations'] = 'Aguardando documentação complementar'
+        records.append(record)
+    return records
+
+
+def _content(rng, extension):
+    """Conteúdo de arquivo com cabeçalho do tipo e tamanho log-normal (~4 KB a 1 MB)"""
+    size = int(min(max(rng.lognormvariate(10.5, 1.0), 4096), 1048576))
+    header = b'%PDF-1.4\n' if extension == '.pdf' else b'\xff\xd8\xff\xe0'
+    return header + rng.randbytes(size - len(header))
+
+
+def generate(app, users=50, properties=10000, documents=2000, seed_value=42,
+             reference_date=None, chunk_size=5000, duplicate_ratio=0.1):
+    """Popula o banco da aplicação (já com schema vazio) e retorna as quantidades geradas"""
+    from src.models import db
+    from src.models.document import Document
+    from src.models.document_blob import DocumentBlob
+    from src.models.property import Property
+    from src.models.regularization_step import RegularizationStep
+    from src.models.step_record import StepRecord
+    from src.models.user import User
+    from src.services.progress import refresh_progress
+    from src.services.storage import blob_path
+
+    rng = random.Random(seed_value)
+    reference = reference_date or date.today()
+    now = datetime.combine(reference, datetime.min.time()) + timedelta(hours=12)
+
+    user_rows = [{
+        'id': 1, 'name': 'Benchmark', 'email': 'bench@mogimirim.sp.gov.br',
+        'role': 'admin', 'active': True
+    }]
+    for user_id in range(2, users + 1):
+        role = 'manager' if user_id % 10 == 2 else 'operator'
+        user_rows.append({
+            'id': user_id, 'name': f'Servidor {user_id}', 'email': f'servidor{user_id}@mogimirim.sp.gov.br',
+            'role': role, 'active': rng.random() > 0.05
+        })
+    # Um único hash (bcrypt) para todos: a senha de todos é PASSWORD
+    hasher = User()
+    hasher.set_password(PASSWORD)
+    for row in user_rows:
+        row.update(password_hash=hasher.password_hash, created_at=now - timedelta(days=1200), updated_at=now)
+    operators = [row['id'] for row in user_rows if row['role'] != 'admin'] or [1]
+
+    counts = {'users': len(user_rows), 'properties': 0, 'step_records': 0, 'documents': 0, 'document_blobs': 0, 'bytes': 0}
+    neighborhoods = _neighborhoods(rng, max(len(NEIGHBORHOODS), properties // 2500))
+
+    with app.app_context():
+        connection = db.session.connection()
+        connection.execute(User.__table__.insert(), user_rows)
+        connection.execute(RegularizationStep.__table__.insert(), [{
+            'id': index + 1, 'name': name, 'order_sequence': order,
+            'estimated_duration_days': days, 'active': True,
+            'created_at': now - timedelta(days=1200), 'updated_at': now - timedelta(days=1200)
+        } for index, (name, order, days) in enumerate(DEFAULT_STEPS)])
+
+        active_records = []
+        for start in range(0, properties, chunk_size):
+            property_rows, record_rows = [], []
+            for property_id in range(start + 1, min(start + chunk_size, properties) + 1):
+                name, center_lng, center_lat, spread = rng.choice(neighborhoods)
+                lng = min(max(rng.gauss(center_lng, spread), BBOX[0]), BBOX[2])
+                lat = min(max(rng.gauss(center_lat, spread), BBOX[1]), BBOX[3])
+                area = round(min(max(rng.lognormvariate(5.8, 0.6), 120), 20000), 2)
+                completed, status = _progress(rng)
+                created_at = now - timedelta(days=rng.randint(30, 1100), minutes=rng.randint(0, 1439))
+                property_rows.append({
+                    'id': property_id,
+                    'municipal_code': f'MM{property_id:07d}',
+                    'registry_number': f'{rng.randint(1000, 99999)}' if completed >= 4 else None,
+                    'address_street': rng.choice(STREETS),
+                    'address_number': str(rng.randint(1, 2500)),
+                    'address_neighborhood': name,
+                    'address_city': 'Mogi Mirim',
+                    'address_zipcode': f'13{rng.randint(800, 812)}-{rng.randint(0, 999):03d}',
+                    'area_total': area,
+                    'area_built': round(area * rng.uniform(0, 0.8), 2),
+                    'property_type': rng.choice(PROPERTY_TYPES),
+                    'current_owner': rng.choice(OWNERS),
+                    'regularization_status': status,
+                    'geometry': f'SRID=4326;POINT({lng:.7f} {lat:.7f})',
+                    'polygon_geometry': _lot(rng, lng, lat, area),
+                    'created_by': rng.choice(operators),
+                    'created_at': created_at,
+                    'updated_at': max(created_at, now - timedelta(days=rng.randint(0, 60)))
+                })
+                records = _step_records(rng, property_id, completed, status, created_at, reference, operators, now)
+                record_rows.extend(records)
+            connection.execute(Property.__table__.insert(), property_rows)
+            result = connection.execute(StepRecord.__table__.insert().returning(
+                StepRecord.__table__.c.id, StepRecord.__table__.c.status, StepRecord.__table__.c.step_id
+            ), record_rows)
+            active_records.extend((record_id, step_id) for record_id, status, step_id in result if status != 'not_started')
+            counts['properties'] += len(property_rows)
+            counts['step_records'] += len(record_rows)
+
+        # Resumo de progresso dos imóveis (os inserts em lote não passam pela sessão)
+        refresh_progress(connection)
+
+        # Documentos das etapas iniciadas, com arquivos no armazenamento por conteúdo
+        blobs = {}
+        contents = []
+        document_rows = []
+        root = os.path.join(app.config['UPLOAD_FOLDER'], 'documents')
+        active_records.sort()
+        for index in range(documents if active_records else 0):
+            record_id, step_id = rng.choice(active_records)
+            document_type, mimetype, extension = DOCUMENT_TYPES[(step_id + rng.randint(0, 1)) % len(DOCUMENT_TYPES)]
+            if contents and rng.random() < duplicate_ratio:
+                sha256, size = rng.choice(contents)
+            else:
+                content = _content(rng, extension)
+                sha256, size = hashlib.sha256(content).hexdigest(), len(content)
+                path = blob_path(sha256, root)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as blob_file:
+                    blob_file.write(content)
+                contents.append((sha256, size))
+                counts['bytes'] += size
+            blob = blobs.setdefault(sha256, {
+                'sha256': sha256, 'file_path': blob_path(sha256, root), 'file_size': size,
+                'ref_count': 0, 'created_at': now
+            })
+            blob['ref_count'] += 1
+            document_rows.append({
+                'step_record_id': record_id,
+                'filename': f'{document_type.lower().replace(" ", "_")}_{index + 1}{extension}',
+                'file_path': blob['file_path'], 'file_size': size, 'content_hash': sha256,
+                'file_type': mimetype, 'document_type': document_type,
+                'description': None, 'uploaded_by': rng.choice(operators),
+                'created_at': now - timedelta(days=rng.randint(0, 700), minutes=rng.randint(0, 1439))
+            })
+        if blobs:
+            connection.execute(DocumentBlob.__table__.insert(), list(blobs.values()))
+        for start in range(0, len(document_rows), chunk_size):
+            connection.execute(Document.__table__.insert(), document_rows[start:start + chunk_size])
+        counts['documents'] = len(document_rows)
+        counts['document_blobs'] = len(blobs)
+        # Sem isso, o próximo INSERT da aplicação repetiria o id 1
+        advance_sequences(connection, ['users', 'regularization_steps', 'properties'])
+        db.session.commit()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--properties', type=int, default=10000)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reference-date', type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    started = time.perf_counter()
+    counts = generate(
+        app, users=args.users, properties=args.properties, documents=args.documents,
+        seed_value=args.seed, reference_date=args.reference_date
+    )
+    print(f'Gerado em {time.perf_counter() - started:.1f} s em {app.config["SQLALCHEMY_DATABASE_URI"]}')
+    for name, value in counts.items():
+        print(f'  {name}: {value}')
+
+
+if __name__ == '__main__':
+    main()
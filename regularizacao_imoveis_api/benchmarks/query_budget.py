@@ -0,0 +1,51 @@
+"""Verifica o número máximo de instruções SQL por endpoint.
+
+Falha (código de saída 1) se algum endpoint ultrapassar o orçamento, o que
+denuncia regressões N+1 no carregamento de relações. Pode ser executado no CI:
+
+    python benchmarks/query_budget.py
+"""
+import sys
+
+from common import count_queries, create_benchmark_app, login, seed
+
+PAGE_SIZE = 100
+
+# (método, url, corpo, máximo de instruções SQL)
+BUDGETS = [
+    ('GET', f'/api/step-records?per_page={PAGE_SIZE}', None, 2),
+    ('GET', '/api/step-records/1', None, 1),
+    ('GET', '/api/step-records/property/1', None, 2),
+    ('GET', '/api/step-records/overdue', None, 2),
+    ('PUT', '/api/step-records/1', {'status': 'in_progress'}, 9),
+    ('GET', '/api/properties/1/progress', None, 2),
+    ('GET', '/api/properties/1/progress?include_steps=false', None, 1),
+    ('GET', f'/api/properties?per_page={PAGE_SIZE}&sort=completion_percentage&order=desc', None, 2),
+    ('GET', f'/api/documents?per_page={PAGE_SIZE}', None, 2),
+    ('GET', '/api/documents/step-record/1', None, 2),
+    ('GET', '/api/dashboard/overview', None, 1),
+]
+
+
+def main():
+    app = create_benchmark_app()
+    seed(app, properties=PAGE_SIZE)
+    client = login(app)
+    client.get('/api/dashboard/overview')  # inicializa os contadores
+
+    failures = 0
+    for method, url, body, budget in BUDGETS:
+        with count_queries(app) as statements:
+            response = client.open(url, method=method, json=body)
+        ok = response.status_code < 400 and len(statements) <= budget
+        failures += not ok
+        print(f'{"ok  " if ok else "FAIL"} {method:<4} {url:<40} {len(statements):>3} / {budget} '
+              f'(HTTP {response.status_code})')
+
+    if failures:
+        print(f'\n{failures} endpoint(s) acima do orçamento de consultas')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Suíte de benchmarks de todos os endpoints com dados em escala municipal.
+
+    python benchmarks/suite.py --properties 50000 --documents 5000 --output resultados.json
+    python benchmarks/suite.py --properties 50000 --compare resultados.json
+    python benchmarks/suite.py --only dashboard --repeat 50
+
+Gera os dados com ``datagen.generate`` (mesma semente, mesmos dados) e chama
+cada endpoint pelo test client do Flask, registrando p50/p95 da latência, o
+número de instruções SQL e o pico de memória (tracemalloc, em uma chamada
+separada das medidas de latência). Com --output, os resultados são gravados em
+JSON junto com o commit e os volumes; com --compare, cada endpoint é comparado
+com um arquivo anterior.
+
+Endpoints que alteram dados são repetidos com payloads equivalentes (códigos
+novos a cada criação); exclusões não fazem parte da suíte.
+"""
+import argparse
+import io
+import itertools
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from common import ROOT, count_queries, create_benchmark_app, login
+from datagen import BBOX, PASSWORD, generate
+
+CENTER = ((BBOX[0] + BBOX[2]) / 2, (BBOX[1] + BBOX[3]) / 2)
+
+
+def tile_at(lng, lat, zoom):
+    """Tile (x, y) que contém o ponto"""
+    scale = 2 ** zoom
+    x = int((lng + 180) / 360 * scale)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * scale)
+    return x, y
+
+
+def endpoints(volumes):
+    """(nome, método, caminho, função que devolve os argumentos da requisição)"""
+    sequence = itertools.count(1)
+    lng, lat = CENTER
+    bbox = f'{lng - 0.01},{lat - 0.01},{lng + 0.01},{lat + 0.01}'
+    city = ','.join(str(value) for value in BBOX)
+    tile_x, tile_y = tile_at(lng, lat, 15)
+    property_id = max(volumes['properties'] // 2, 1)
+    record_id = max(volumes['step_records'] // 2, 1)
+    document_id = max(volumes['documents'] // 2, 1)
+
+    def static(**kwargs):
+        return lambda: kwargs
+
+    def new_property():
+        return {'json': {
+            'municipal_code': f'BENCH{next(sequence):07d}', 'address_street': 'Rua do Benchmark',
+            'address_neighborhood': 'Centro', 'latitude': lat, 'longitude': lng
+        }}
+
+    def import_file():
+        start = next(sequence) * 1000
+        lines = ['municipal_code;address_street;address_neighborhood;area_total']
+        lines += [f'IMP{start + index:09d};Rua Importada;Centro;250.00' for index in range(100)]
+        return {'data': {'file': (io.BytesIO('\n'.join(lines).encode()), 'imoveis.csv')}, 'content_type': 'multipart/form-data'}
+
+    def upload():
+        content = b'%PDF-1.4\n' + str(next(sequence)).encode() * 2048
+        return {'data': {
+            'file': (io.BytesIO(content), 'planta.pdf'), 'step_record_id': str(record_id),
+            'document_type': 'Planta topográfica'
+        }, 'content_type': 'multipart/form-data'}
+
+    return [
+        ('auth: login', 'POST', '/api/auth/login', static(json={'email': 'bench@mogimirim.sp.gov.br', 'password': PASSWORD})),
+        ('auth: me', 'GET', '/api/auth/me', static()),
+        ('users: listagem', 'GET', '/api/users', static()),
+        ('users: detalhe', 'GET', '/api/users/2', static()),
+        ('users: papéis', 'GET', '/api/users/roles', static()),
+        ('steps: listagem', 'GET', '/api/steps', static()),
+        ('steps: detalhe', 'GET', '/api/steps/3', static()),
+        ('dashboard: overview', 'GET', '/api/dashboard/overview', static()),
+        ('dashboard: por status', 'GET', '/api/dashboard/properties-by-status', static()),
+        ('dashboard: por bairro', 'GET', '/api/dashboard/properties-by-neighborhood', static()),
+        ('dashboard: progresso das etapas', 'GET', '/api/dashboard/steps-progress', static()),
+        ('dashboard: progresso mensal', 'GET', '/api/dashboard/monthly-progress', static()),
+        ('dashboard: etapas atrasadas', 'GET', '/api/dashboard/overdue-steps', static()),
+        ('dashboard: atividades recentes', 'GET', '/api/dashboard/recent-activities', static()),
+        ('dashboard: métricas de desempenho', 'GET', '/api/dashboard/performance-metrics', static()),
+        ('properties: página 1', 'GET', '/api/properties', static(query_string={'per_page': 50})),
+        ('properties: página profunda', 'GET', '/api/properties', static(query_string={'per_page': 50, 'page': max(volumes['properties'] // 100, 1)})),
+        ('properties: cursor', 'GET', '/api/properties', static(query_string={'per_page': 50, 'cursor': ''})),
+        ('properties: com geometria', 'GET', '/api/properties', static(query_string={'per_page': 200, 'include_geometry': 'true'})),
+        ('properties: busca', 'GET', '/api/properties', static(query_string={'per_page': 50, 'search': 'brasil'})),
+        ('properties: ordenado por progresso', 'GET', '/api/properties', static(query_string={'per_page': 50, 'sort': 'completion_percentage', 'order': 'desc'})),
+        ('properties: filtro status+bairro', 'GET', '/api/properties', static(query_string={'per_page': 50, 'status': 'in_progress', 'neighborhood': 'Centro'})),
+        ('properties: detalhe', 'GET', f'/api/properties/{property_id}', static()),
+        ('properties: progresso', 'GET', f'/api/properties/{property_id}/progress', static()),
+        ('properties: resumo do progresso', 'GET', f'/api/properties/{property_id}/progress', static(query_string={'include_steps': 'false'})),
+        ('properties: bairros', 'GET', '/api/properties/neighborhoods', static()),
+        ('properties: opções de status', 'GET', '/api/properties/status-options', static()),
+        ('properties: within', 'GET', '/api/properties/within', static(query_string={'bbox': bbox})),
+        ('properties: near 300 m', 'GET', '/api/properties/near', static(query_string={'lat': lat, 'lng': lng, 'radius': 300})),
+        ('properties: nearest 10', 'GET', '/api/properties/nearest', static(query_string={'lat': lat, 'lng': lng, 'k': 10})),
+        ('properties: clusters cidade', 'GET', '/api/properties/clusters', static(query_string={'bbox': city, 'zoom': 12})),
+        ('properties: tile z15', 'GET', f'/api/properties/tiles/15/{tile_x}/{tile_y}.mvt', static()),
+        ('properties: exportação CSV (pending)', 'GET', '/api/properties/export', static(query_string={'format': 'csv', 'status': 'pending'})),
+        ('properties: criação', 'POST', '/api/properties', new_property),
+        ('properties: atualização', 'PUT', f'/api/properties/{property_id}', static(json={'description': 'Atualizado pelo benchmark'})),
+        ('properties: importação 100 linhas', 'POST', '/api/properties/import', import_file),
+        ('step-records: listagem', 'GET', '/api/step-records', static(query_string={'per_page': 50})),
+        ('step-records: por status', 'GET', '/api/step-records', static(query_string={'per_page': 50, 'status': 'in_progress'})),
+        ('step-records: detalhe', 'GET', f'/api/step-records/{record_id}', static()),
+        ('step-records: por imóvel', 'GET', f'/api/step-records/property/{property_id}', static()),
+        ('step-records: atrasados', 'GET', '/api/step-records/overdue', static(query_string={'per_page': 100})),
+        ('step-records: estatísticas', 'GET', '/api/step-records/statistics', static()),
+        ('step-records: opções de status', 'GET', '/api/step-records/status-options', static()),
+        ('step-records: atualização', 'PUT', f'/api/step-records/{record_id}', static(json={'observations': 'Benchmark'})),
+        ('step-records: lote por bairro', 'PATCH', '/api/step-records/bulk', static(json={
+            'filter': {'step_id': 2, 'neighborhood': 'Centro'}, 'changes': {'observations': 'Benchmark em lote'}
+        })),
+        ('documents: listagem', 'GET', '/api/documents', static(query_string={'per_page': 50})),
+        ('documents: detalhe', 'GET', f'/api/documents/{document_id}', static()),
+        ('documents: por etapa', 'GET', f'/api/documents/step-record/{record_id}', static()),
+        ('documents: tipos', 'GET', '/api/documents/types', static()),
+        ('documents: estatísticas', 'GET', '/api/documents/statistics', static()),
+        ('documents: download', 'GET', f'/api/documents/{document_id}/download', static()),
+        ('documents: upload', 'POST', '/api/documents/upload', upload),
+        ('admin: pool', 'GET', '/api/admin/db-pool', static()),
+        ('admin: outbox', 'GET', '/api/admin/outbox', static()),
+        ('metrics: prometheus', 'GET', '/api/metrics', static()),
+    ]
+
+
+def call(client, method, path, kwargs):
+    response = client.open(path, method=method, **kwargs)
+    response.get_data()
+    response.close()
+    return response.status_code
+
+
+def run_endpoint(app, client, method, path, build, repeat, warmup):
+    """Latência (p50/p95), instruções SQL e pico de memória de um endpoint"""
+    for _ in range(warmup):
+        call(client, method, path, build())
+
+    samples = []
+    status = None
+    for _ in range(repeat):
+        kwargs = build()
+        started = time.perf_counter()
+        status = call(client, method, path, kwargs)
+        samples.append((time.perf_counter() - started) * 1000)
+        if status >= 400:
+            break
+
+    kwargs = build()
+    with count_queries(app) as statements:
+        tracemalloc.start()
+        try:
+            call(client, method, path, kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    samples.sort()
+    return {
+        'status': status,
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'queries': len(statements),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f'\n{"endpoint":<42} {"status":>6} {"p50 ms":>10} {"p95 ms":>10} {"SQL":>5} {"pico KB":>9}' +
+          (f' {"p50 antes":>10} {"Δ p50":>8}' if baseline else ''))
+    for name, stats in results.items():
+        line = (f'{name:<42} {stats["status"]:>6} {stats["p50_ms"]:>10.3f} {stats["p95_ms"]:>10.3f} '
+                f'{stats["queries"]:>5} {stats["peak_memory_kb"]:>9.1f}')
+        previous = (baseline or {}).get(name)
+        if previous:
+            change = (stats['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100 if previous['p50_ms'] else 0
+            line += f' {previous["p50_ms"]:>10.3f} {change:>+7.1f}%'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--properties', type=int, default=10000)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reference-date', type=date.fromisoformat, default=date.today(),
+                        help='data de referência dos dados (fixe-a para comparar execuções)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', help='executa apenas endpoints cujo nome contém o texto')
+    parser.add_argument('--output', help='arquivo JSON para gravar os resultados')
+    parser.add_argument('--compare', help='arquivo JSON de uma execução anterior')
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    started = time.perf_counter()
+    volumes = generate(app, users=args.users, properties=args.properties, documents=args.documents,
+                       seed_value=args.seed, reference_date=args.reference_date)
+    print(f'Dados gerados em {time.perf_counter() - started:.1f} s: ' +
+          ', '.join(f'{name}={value}' for name, value in volumes.items()))
+
+    client = login(app)
+    results = {}
+    for name, method, path, build in endpoints(volumes):
+        if args.only and args.only not in name:
+            continue
+        results[name] = run_endpoint(app, client, method, path, build, args.repeat, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as previous:
+            baseline = json.load(previous)['results']
+    print_results(results, baseline)
+
+    failed = [name for name, stats in results.items() if stats['status'] >= 400]
+    if failed:
+        print(f'\nRespostas com erro: {", ".join(failed)}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0],
+                'seed': args.seed,
+                'reference_date': args.reference_date.isoformat(),
+                'repeat': args.repeat,
+                'volumes': volumes,
+                'results': results
+            }, output, ensure_ascii=False, indent=2)
+        print(f'\nResultados gravados em {args.output}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
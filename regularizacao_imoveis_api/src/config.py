@@ -3,17 +3,82 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def parse_timeouts(value):
+    """``dashboard=15000,properties.export_properties=300000`` -> dict"""
+    timeouts = {}
+    for item in (value or '').split(','):
+        if item.strip():
+            name, _, milliseconds = item.partition('=')
+            timeouts[name.strip()] = int(milliseconds)
+    return timeouts
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16777216))  # 16MB default
+    DOCUMENT_CHUNK_SIZE = int(os.environ.get('DOCUMENT_CHUNK_SIZE', 1048576))  # 1MB por bloco no upload
+    PROPERTY_IMPORT_CHUNK_SIZE = int(os.environ.get('PROPERTY_IMPORT_CHUNK_SIZE', 1000))  # linhas por lote na importação
     
-    # Criar diretório de upload se não existir
-    @staticmethod
-    def init_app(app):
-        upload_path = os.path.join(os.path.dirname(app.instance_path), app.config['UPLOAD_FOLDER'])
-        os.makedirs(upload_path, exist_ok=True)
-        os.makedirs(os.path.join(upload_path, 'documents'), exist_ok=True)
-
+    # Entrega de downloads pelo proxy: '' (Flask), 'x-accel-redirect' (nginx) ou 'x-sendfile'
+    DOCUMENT_OFFLOAD = os.environ.get('DOCUMENT_OFFLOAD', '').lower()
+    DOCUMENT_ACCEL_PREFIX = os.environ.get('DOCUMENT_ACCEL_PREFIX') or '/protected-documents'
+    
+    # Cache de vector tiles do mapa (TILE_CACHE_DIR vazio = apenas memória)
+    TILE_CACHE_SIZE = int(os.environ.get('TILE_CACHE_SIZE', 2048))
+    TILE_CACHE_TTL = int(os.environ.get('TILE_CACHE_TTL', 600))
+    TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR', '')
+    
+    # Pool de conexões por processo (workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) <= max_connections)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # segundos (inteiro) esperando conexão livre
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    # Timeout por instrução em ms (0 = sem limite): padrão e por blueprint/endpoint
+    DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))
+    DB_STATEMENT_TIMEOUTS = {
+        'properties': 10000,
+        'step_records': 10000,
+        'documents': 10000,
+        'users': 10000,
+        'steps': 10000,
+        'dashboard': 15000,
+        'properties.export_properties': 300000,
+        'properties.import_properties_file': 300000,
+        'step_records.bulk_update_step_records_route': 120000,
+        **parse_timeouts(os.environ.get('DB_STATEMENT_TIMEOUTS'))
+    }
+    
+    # Réplicas de leitura (URLs separadas por vírgula); após uma escrita o usuário
+    # lê do primário por DB_REPLICA_PIN_SECONDS para ver as próprias alterações
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    DB_REPLICA_PIN_SECONDS = float(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+    DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5))
+    DB_REPLICA_RETRY_SECONDS = float(os.environ.get('DB_REPLICA_RETRY_SECONDS', 30))
+    
+    # Métricas por endpoint em /api/metrics (Prometheus) e log de consultas lentas;
+    # com METRICS_TOKEN, o coletor se autentica com "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 500))  # 0 = sem log
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', '')
+    
+    # Profiler sob demanda (X-Profile: 1|sample, apenas administradores)
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'true').lower() == 'true'
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or 'profiles'
+    PROFILER_MAX_FILES = int(os.environ.get('PROFILER_MAX_FILES', 50))
+    PROFILER_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILER_SAMPLE_INTERVAL_MS', 5))
+    
+    # Outbox transacional (services/outbox.py): com OUTBOX_ENABLED os efeitos derivados das
+    # escritas ficam em outbox_events para o worker (`flask outbox-worker`); sem ele,
+    # rodam no próprio processo logo após o commit
+    OUTBOX_ENABLED = os.environ.get('OUTBOX_ENABLED', 'false').lower() == 'true'
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+    OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 1))  # segundos com a fila vazia
+    OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 300))  # reserva de um lote por um worker
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 10))
+    OUTBOX_RETRY_SECONDS = float(os.environ.get('OUTBOX_RETRY_SECONDS', 5))  # primeira espera, dobra a cada falha
+    OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS', 72))
@@ -16,20 +16,71 @@ from src.routes.regularization_steps import steps_bp
 from src.routes.step_records import step_records_bp
 from src.routes.documents import documents_bp
 from src.routes.dashboard import dashboard_bp
+from src.routes.admin import admin_bp
+from src.routes.metrics import metrics_bp
+from src.services import clusters, counters, database, metrics, outbox, overdue, profiler, progress, property_changes, replicas, rollups, search, spatial, storage, tiles
 
 def create_app():
     app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
     
     # Configuração
     app.config.from_object(Config)
-    Config.init_app(app)
     
     # CORS
     CORS(app, origins="*")
     
+    # Pool de conexões configurado por variáveis de ambiente e binds das réplicas
+    database.configure(app)
+    replicas.configure(app)
+    
     # Inicializar banco de dados
     db.init_app(app)
     
+    # Timeouts por instrução e métricas do pool
+    database.init_app(app)
+    
+    # Leituras de requisições GET nas réplicas, com retorno ao primário
+    replicas.init_app(app)
+    
+    # Latência e SQL por endpoint, consultas lentas e métricas Prometheus
+    metrics.init_app(app)
+    
+    # Profiler sob demanda para administradores (X-Profile / ?profile=)
+    profiler.init_app(app)
+    
+    # Contadores do dashboard mantidos na mesma transação das escritas
+    counters.init_app(app)
+    
+    # Outbox transacional: efeitos derivados das escritas entregues pelo worker
+    outbox.init_app(app)
+    
+    # Busca textual indexada de imóveis
+    search.init_app(app)
+    
+    # Versão das alterações de imóveis (invalidação dos índices em memória)
+    property_changes.init_app(app)
+    
+    # Consultas espaciais (índice geography no PostGIS, R-tree nos demais bancos)
+    spatial.init_app(app)
+    
+    # Vector tiles do mapa com cache invalidado por tile
+    tiles.init_app(app)
+    
+    # Clusters do mapa por zoom (índice em memória atualizado incrementalmente)
+    clusters.init_app(app)
+    
+    # Data prevista de conclusão das etapas (consultas de atraso)
+    overdue.init_app(app)
+    
+    # Resumo de progresso das etapas mantido em properties
+    progress.init_app(app)
+    
+    # Agregado mensal de etapas concluídas (progresso mensal do dashboard)
+    rollups.init_app(app)
+    
+    # Armazenamento de documentos por conteúdo com contagem de referências
+    storage.init_app(app)
+    
     # Registrar blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
@@ -38,30 +89,40 @@ def create_app():
     app.register_blueprint(step_records_bp, url_prefix='/api/step-records')
     app.register_blueprint(documents_bp, url_prefix='/api/documents')
     app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(metrics_bp, url_prefix='/api/metrics')
     
-    # Criar tabelas
-    with app.app_context():
-        db.create_all()
+    # Frontend estático (rota curinga registrada por último)
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
+        else:
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
     
+    # O schema não é criado aqui: use `flask --app src.main init-db` na implantação
     return app
 
-app = create_app()
+_app = None
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+def __getattr__(name):
+    # `src.main:app` (gunicorn, scripts) cria a aplicação no primeiro acesso,
+    # não na importação do módulo
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    create_app().run(host='0.0.0.0', port=5001, debug=True)
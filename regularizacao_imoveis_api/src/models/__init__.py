@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from geoalchemy2 import Geometry
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+# Leituras de requisições GET podem ir para réplicas (services/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Importar todos os modelos aqui para garantir que sejam registrados
 from .user import User
@@ -9,4 +11,10 @@ from .property import Property
 from .regularization_step import RegularizationStep
 from .step_record import StepRecord
 from .document import Document
-
+from .dashboard_counter import DashboardCounter
+from .document_blob import DocumentBlob
+from .monthly_completion import MonthlyCompletion
+from .step_duration_bucket import StepDurationBucket
+from .outbox_event import OutboxEvent
+from .change_version import ChangeVersion
+from .property_change import PropertyChange
@@ -0,0 +1,15 @@
+from src.models import db
+
+class ChangeVersion(db.Model):
+    """Contador de alterações de uma tabela (services/property_changes.py).
+
+    Incrementado na transação da escrita: o bloqueio da linha até o commit faz
+    com que as versões fiquem visíveis na ordem em que foram atribuídas.
+    """
+    __tablename__ = 'change_versions'
+
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ChangeVersion {self.name}={self.version}>'
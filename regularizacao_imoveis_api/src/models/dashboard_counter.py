@@ -0,0 +1,19 @@
+from datetime import datetime
+from src.models import db
+
+class DashboardCounter(db.Model):
+    __tablename__ = 'dashboard_counters'
+
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DashboardCounter {self.name}={self.value}>'
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'value': self.value,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
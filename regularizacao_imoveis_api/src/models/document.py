@@ -1,8 +1,6 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import os
-
-db = SQLAlchemy()
+from src.models import db
 
 class Document(db.Model):
     __tablename__ = 'documents'
@@ -12,11 +10,22 @@ class Document(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.BigInteger)
+    content_hash = db.Column(db.String(64))  # SHA-256 do blob em document_blobs
     file_type = db.Column(db.String(100))
     document_type = db.Column(db.String(100))
     description = db.Column(db.Text)
     uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Índices (mesmos nomes de database_schema.sql)
+    __table_args__ = (
+        db.Index('idx_documents_step_record', 'step_record_id'),
+        db.Index('idx_documents_type', 'document_type'),
+        db.Index('idx_documents_uploaded_by', 'uploaded_by'),
+        db.Index('idx_documents_content_hash', 'content_hash'),
+        # Paginação por cursor (chave de ordenação + desempate por id)
+        db.Index('idx_documents_created_at_id', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<Document {self.filename}>'
@@ -54,6 +63,7 @@ class Document(db.Model):
             'file_path': self.file_path,
             'file_size': self.file_size,
             'file_size_formatted': self.get_file_size_formatted(),
+            'content_hash': self.content_hash,
             'file_type': self.file_type,
             'file_extension': self.get_file_extension(),
             'document_type': self.document_type,
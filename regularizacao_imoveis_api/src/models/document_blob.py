@@ -0,0 +1,24 @@
+from datetime import datetime
+from src.models import db
+
+class DocumentBlob(db.Model):
+    __tablename__ = 'document_blobs'
+    
+    # SHA-256 do conteúdo; o arquivo fica em documents/<ab>/<cd>/<sha256>
+    sha256 = db.Column(db.String(64), primary_key=True)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DocumentBlob {self.sha256} refs={self.ref_count}>'
+
+    def to_dict(self):
+        return {
+            'sha256': self.sha256,
+            'file_path': self.file_path,
+            'file_size': self.file_size,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,26 @@
+from datetime import datetime
+from src.models import db
+
+class MonthlyCompletion(db.Model):
+    """Etapas concluídas por mês de conclusão, etapa e bairro do imóvel"""
+    __tablename__ = 'monthly_completions'
+
+    # Primeiro dia do mês de end_date
+    month = db.Column(db.Date, primary_key=True)
+    step_id = db.Column(db.Integer, db.ForeignKey('regularization_steps.id'), primary_key=True)
+    # Bairro do imóvel ('' quando não informado)
+    neighborhood = db.Column(db.String(100), primary_key=True, default='')
+    completed_steps = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MonthlyCompletion {self.month:%Y-%m} Step:{self.step_id} {self.neighborhood}={self.completed_steps}>'
+
+    def to_dict(self):
+        return {
+            'month': self.month.strftime('%Y-%m') if self.month else None,
+            'step_id': self.step_id,
+            'neighborhood': self.neighborhood,
+            'completed_steps': self.completed_steps,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,42 @@
+from datetime import datetime
+from src.models import db
+
+class OutboxEvent(db.Model):
+    """Evento gravado na mesma transação da escrita e processado pelo worker (services/outbox.py)"""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # Publicar de novo a mesma chave não cria outro evento
+    idempotency_key = db.Column(db.String(255), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # Próxima tentativa (também o fim da reserva por um worker)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Lote do worker: status = 'pending' AND available_at <= agora, em ordem de id
+        db.Index('idx_outbox_events_status_available', 'status', 'available_at', 'id'),
+        db.Index('idx_outbox_events_processed_at', 'processed_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} {self.event_type} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'payload': self.payload,
+            'idempotency_key': self.idempotency_key,
+            'status': self.status,
+            'attempts': self.attempts,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
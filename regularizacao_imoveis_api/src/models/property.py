@@ -1,8 +1,9 @@
-from flask_sqlalchemy import SQLAlchemy
-from geoalchemy2 import Geometry
+import json
+from geoalchemy2 import Geography, Geometry
 from datetime import datetime
-
-db = SQLAlchemy()
+from sqlalchemy.orm import query_expression
+from src.models import db
+from src.services import wkb
 
 class Property(db.Model):
     __tablename__ = 'properties'
@@ -28,8 +29,39 @@ class Property(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Resumo do progresso das etapas (mantido por services/progress.py)
+    total_steps = db.Column(db.Integer, nullable=False, default=0)
+    completed_steps = db.Column(db.Integer, nullable=False, default=0)
+    completion_percentage = db.Column(db.Numeric(5, 2), nullable=False, default=0)
+    current_step_id = db.Column(db.Integer, db.ForeignKey('regularization_steps.id'))
+    # Chave da paginação por cursor: nunca nula
+    last_activity_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.current_timestamp())
+    
+    # Coordenadas projetadas na consulta (ver services/coordinates.py)
+    longitude = query_expression()
+    latitude = query_expression()
+    polygon_geojson = query_expression()
+    
     # Relacionamentos
     step_records = db.relationship('StepRecord', backref='property', lazy='dynamic', cascade='all, delete-orphan')
+    
+    # Índices (mesmos nomes de database_schema.sql). Os GIST sobre geometry e
+    # polygon_geometry são declarados pelo GeoAlchemy2 (spatial_index) e os de
+    # busca textual são criados por services/search.py
+    __table_args__ = (
+        db.Index('idx_properties_municipal_code', 'municipal_code'),
+        db.Index('idx_properties_status', 'regularization_status'),
+        db.Index('idx_properties_created_by', 'created_by'),
+        db.Index('idx_properties_neighborhood', 'address_neighborhood'),
+        # Paginação por cursor (chave de ordenação + desempate por id)
+        db.Index('idx_properties_created_at_id', 'created_at', 'id'),
+        db.Index('idx_properties_updated_at_id', 'updated_at', 'id'),
+        # Ordenação da listagem pelo progresso (chave + desempate por id)
+        db.Index('idx_properties_completion_id', 'completion_percentage', 'id'),
+        db.Index('idx_properties_last_activity_id', 'last_activity_at', 'id'),
+        # ST_DWithin e <-> em metros; mesma expressão das consultas de services/spatial.py
+        db.Index('idx_properties_geography', db.cast(geometry, Geography), postgresql_using='gist').ddl_if(dialect='postgresql'),
+    )
 
     def __repr__(self):
         return f'<Property {self.municipal_code}>'
@@ -47,14 +79,24 @@ class Property(db.Model):
 
     def get_coordinates(self):
         """Retorna as coordenadas como dicionário"""
-        if self.geometry:
-            # Assumindo que geometry é um ponto
-            return {
-                'latitude': self.geometry.data.get('coordinates', [None, None])[1],
-                'longitude': self.geometry.data.get('coordinates', [None, None])[0]
-            }
+        if 'longitude' in self.__dict__:
+            # Projetadas pela consulta ou decodificadas em lote
+            if self.longitude is None:
+                return None
+            return {'latitude': self.latitude, 'longitude': self.longitude}
+        
+        point = wkb.decode(self.geometry)
+        if point:
+            return {'latitude': point['coordinates'][1], 'longitude': point['coordinates'][0]}
         return None
 
+    def get_polygon(self):
+        """Retorna o polígono do terreno em GeoJSON"""
+        if 'polygon_geojson' in self.__dict__:
+            value = self.polygon_geojson
+            return json.loads(value) if isinstance(value, str) else value
+        return wkb.decode(self.polygon_geometry)
+
     def to_dict(self, include_geometry=False):
         result = {
             'id': self.id,
@@ -75,11 +117,17 @@ class Property(db.Model):
             'description': self.description,
             'created_by': self.created_by,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'total_steps': self.total_steps,
+            'completed_steps': self.completed_steps,
+            'completion_percentage': float(self.completion_percentage) if self.completion_percentage is not None else None,
+            'current_step_id': self.current_step_id,
+            'last_activity_at': self.last_activity_at.isoformat() if self.last_activity_at else None
         }
         
         if include_geometry:
             result['coordinates'] = self.get_coordinates()
+            result['polygon'] = self.get_polygon()
             
         return result
 
@@ -0,0 +1,23 @@
+from src.models import db
+
+class PropertyChange(db.Model):
+    """Imóvel criado, excluído ou com geometria/status alterados em uma versão (services/property_changes.py)"""
+    __tablename__ = 'property_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+    # Sem chave estrangeira: registra também os imóveis excluídos
+    property_id = db.Column(db.Integer, nullable=False)
+    # Retângulo da geometria anterior (ponto e polígono); nulo para imóveis novos
+    previous_min_lng = db.Column(db.Float)
+    previous_min_lat = db.Column(db.Float)
+    previous_max_lng = db.Column(db.Float)
+    previous_max_lat = db.Column(db.Float)
+
+    __table_args__ = (
+        # Alterações posteriores à versão de um índice em memória
+        db.Index('idx_property_changes_version', 'version', 'property_id'),
+    )
+
+    def __repr__(self):
+        return f'<PropertyChange v{self.version} Property:{self.property_id}>'
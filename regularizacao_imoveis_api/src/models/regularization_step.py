@@ -1,7 +1,5 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-
-db = SQLAlchemy()
+from src.models import db
 
 class RegularizationStep(db.Model):
     __tablename__ = 'regularization_steps'
@@ -18,6 +16,12 @@ class RegularizationStep(db.Model):
     
     # Relacionamentos
     step_records = db.relationship('StepRecord', backref='step', lazy='dynamic')
+    
+    # Índices (mesmos nomes de database_schema.sql)
+    __table_args__ = (
+        db.Index('idx_regularization_steps_order', 'order_sequence'),
+        db.Index('idx_regularization_steps_active', 'active'),
+    )
 
     def __repr__(self):
         return f'<RegularizationStep {self.name}>'
@@ -0,0 +1,32 @@
+from flask import current_app, has_app_context
+from flask_sqlalchemy.session import Session
+
+# Chave em Session.info com o bind escolhido para a sessão (None = primário)
+ROUTE_KEY = 'db_route'
+PRIMARY = 'primary'
+
+
+class RoutingSession(Session):
+    """Sessão que envia leituras a uma réplica escolhida por ``services/replicas.py``.
+
+    A escolha é feita uma vez por sessão (por requisição). Flush e instruções
+    DML vão sempre para o primário, e a partir daí a sessão inteira fica no
+    primário para ler as próprias escritas.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info[ROUTE_KEY] = PRIMARY
+            else:
+                route = self.info.get(ROUTE_KEY)
+                if route is None:
+                    router = current_app.extensions.get('db_replicas') if has_app_context() else None
+                    route = self.info[ROUTE_KEY] = router.route() if router is not None else PRIMARY
+                if route != PRIMARY:
+                    return self._db.engines[route]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def use_primary(self):
+        """Fixa a sessão no primário (leituras que precisam do dado mais recente)"""
+        self.info[ROUTE_KEY] = PRIMARY
@@ -0,0 +1,64 @@
+"""Funções SQL de datas portáveis entre PostgreSQL e SQLite."""
+from sqlalchemy import Date, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class date_add_days(FunctionElement):
+    """``data + n dias``, retornando uma data"""
+    type = Date()
+    inherit_cache = True
+    name = 'date_add_days'
+
+
+@compiles(date_add_days)
+def _date_add_days_default(element, compiler, **kw):
+    date_expr, days_expr = list(element.clauses)
+    return f'({compiler.process(date_expr, **kw)} + {compiler.process(days_expr, **kw)})'
+
+
+@compiles(date_add_days, 'sqlite')
+def _date_add_days_sqlite(element, compiler, **kw):
+    date_expr, days_expr = list(element.clauses)
+    return f"date({compiler.process(date_expr, **kw)}, printf('%+d days', {compiler.process(days_expr, **kw)}))"
+
+
+class days_between(FunctionElement):
+    """Número inteiro de dias de ``inicio`` até ``fim`` (``fim - inicio``)"""
+    type = Integer()
+    inherit_cache = True
+    name = 'days_between'
+
+
+@compiles(days_between)
+def _days_between_default(element, compiler, **kw):
+    start_expr, end_expr = list(element.clauses)
+    return f'({compiler.process(end_expr, **kw)} - {compiler.process(start_expr, **kw)})'
+
+
+@compiles(days_between, 'sqlite')
+def _days_between_sqlite(element, compiler, **kw):
+    start_expr, end_expr = list(element.clauses)
+    return (
+        f'CAST(julianday({compiler.process(end_expr, **kw)}) - '
+        f'julianday({compiler.process(start_expr, **kw)}) AS INTEGER)'
+    )
+
+
+class month_start(FunctionElement):
+    """Primeiro dia do mês de uma data"""
+    type = Date()
+    inherit_cache = True
+    name = 'month_start'
+
+
+@compiles(month_start)
+def _month_start_default(element, compiler, **kw):
+    date_expr, = list(element.clauses)
+    return f"CAST(date_trunc('month', {compiler.process(date_expr, **kw)}) AS DATE)"
+
+
+@compiles(month_start, 'sqlite')
+def _month_start_sqlite(element, compiler, **kw):
+    date_expr, = list(element.clauses)
+    return f"date({compiler.process(date_expr, **kw)}, 'start of month')"
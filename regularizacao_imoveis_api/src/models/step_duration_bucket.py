@@ -0,0 +1,22 @@
+from src.models import db
+
+class StepDurationBucket(db.Model):
+    """Histograma da duração (end_date - start_date, em dias) das etapas concluídas.
+
+    Mesma chave de MonthlyCompletion mais a faixa de duração (services/histograms.py).
+    Faixas de várias chaves se combinam somando as contagens.
+    """
+    __tablename__ = 'step_duration_buckets'
+
+    # Primeiro dia do mês de end_date
+    month = db.Column(db.Date, primary_key=True)
+    step_id = db.Column(db.Integer, db.ForeignKey('regularization_steps.id'), primary_key=True)
+    # Bairro do imóvel ('' quando não informado)
+    neighborhood = db.Column(db.String(100), primary_key=True, default='')
+    bucket = db.Column(db.SmallInteger, primary_key=True)
+    records = db.Column(db.Integer, nullable=False, default=0)
+    # Soma das durações da faixa (média exata e interpolação dentro da faixa)
+    total_days = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StepDurationBucket {self.month:%Y-%m} Step:{self.step_id} {self.neighborhood} #{self.bucket}={self.records}>'
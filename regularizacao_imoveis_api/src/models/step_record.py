@@ -1,7 +1,6 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-
-db = SQLAlchemy()
+from datetime import date, datetime
+from sqlalchemy.orm import contains_eager, joinedload
+from src.models import db
 
 class StepRecord(db.Model):
     __tablename__ = 'step_records'
@@ -12,6 +11,8 @@ class StepRecord(db.Model):
     status = db.Column(db.String(50), default='not_started')
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
+    # start_date + estimated_duration_days da etapa (mantida por services/overdue.py)
+    expected_end_date = db.Column(db.Date)
     responsible_user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     observations = db.Column(db.Text)
     completion_percentage = db.Column(db.Integer, default=0)
@@ -23,11 +24,42 @@ class StepRecord(db.Model):
     documents = db.relationship('Document', backref='step_record', lazy='dynamic', cascade='all, delete-orphan')
     
     # Constraint única para evitar duplicação de etapa por imóvel
-    __table_args__ = (db.UniqueConstraint('property_id', 'step_id', name='unique_property_step'),)
+    __table_args__ = (
+        db.UniqueConstraint('property_id', 'step_id', name='unique_property_step'),
+        # Índices (mesmos nomes de database_schema.sql)
+        db.Index('idx_step_records_property', 'property_id'),
+        db.Index('idx_step_records_step', 'step_id'),
+        db.Index('idx_step_records_status', 'status'),
+        db.Index('idx_step_records_property_status', 'property_id', 'status'),
+        db.Index('idx_step_records_responsible', 'responsible_user_id'),
+        # Índices para a paginação por cursor (chave de ordenação + desempate por id)
+        db.Index('idx_step_records_created_at_id', 'created_at', 'id'),
+        db.Index('idx_step_records_updated_at_id', 'updated_at', 'id'),
+        # Consulta de etapas em atraso: status = 'in_progress' AND expected_end_date < hoje
+        db.Index('idx_step_records_status_expected_end', 'status', 'expected_end_date'),
+    )
 
     def __repr__(self):
         return f'<StepRecord Property:{self.property_id} Step:{self.step_id}>'
 
+    @classmethod
+    def query_with_relations(cls):
+        """Query com etapa e usuários carregados na mesma consulta.
+        
+        Evita o N+1 de to_dict(include_relations=True): a etapa vem do JOIN
+        (também usado para ordenar por order_sequence) e os usuários por
+        LEFT OUTER JOIN.
+        """
+        from src.models.regularization_step import RegularizationStep
+        
+        return cls.query\
+            .join(RegularizationStep, cls.step_id == RegularizationStep.id)\
+            .options(
+                contains_eager(cls.step),
+                joinedload(cls.responsible_user),
+                joinedload(cls.creator_user)
+            )
+
     def get_duration_days(self):
         """Calcula a duração em dias se ambas as datas estiverem definidas"""
         if self.start_date and self.end_date:
@@ -35,11 +67,9 @@ class StepRecord(db.Model):
         return None
 
     def is_overdue(self):
-        """Verifica se a etapa está atrasada baseado na duração estimada"""
-        if self.start_date and self.step and self.step.estimated_duration_days:
-            from datetime import date
-            expected_end = self.start_date + timedelta(days=self.step.estimated_duration_days)
-            return date.today() > expected_end and self.status != 'completed'
+        """Verifica se a etapa está atrasada baseado na data prevista de conclusão"""
+        if self.expected_end_date:
+            return date.today() > self.expected_end_date and self.status != 'completed'
         return False
 
     def to_dict(self, include_relations=False):
@@ -50,6 +80,7 @@ class StepRecord(db.Model):
             'status': self.status,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
+            'expected_end_date': self.expected_end_date.isoformat() if self.expected_end_date else None,
             'responsible_user_id': self.responsible_user_id,
             'observations': self.observations,
             'completion_percentage': self.completion_percentage,
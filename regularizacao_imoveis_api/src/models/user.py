@@ -1,8 +1,6 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import bcrypt
-
-db = SQLAlchemy()
+from src.models import db
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -21,6 +19,13 @@ class User(db.Model):
     responsible_step_records = db.relationship('StepRecord', foreign_keys='StepRecord.responsible_user_id', backref='responsible_user', lazy='dynamic')
     created_step_records = db.relationship('StepRecord', foreign_keys='StepRecord.created_by', backref='creator_user', lazy='dynamic')
     uploaded_documents = db.relationship('Document', backref='uploader', lazy='dynamic')
+    
+    # Índices (mesmos nomes de database_schema.sql)
+    __table_args__ = (
+        db.Index('idx_users_email', 'email'),
+        db.Index('idx_users_role', 'role'),
+        db.Index('idx_users_active', 'active'),
+    )
 
     def __repr__(self):
         return f'<User {self.name}>'
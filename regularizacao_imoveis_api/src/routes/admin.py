@@ -0,0 +1,107 @@
+import os
+from flask import Blueprint, request, jsonify, session, current_app, send_from_directory
+from src.models import db
+from src.services import outbox, profiler, replicas
+from src.services.database import pool_status
+
+admin_bp = Blueprint('admin', __name__)
+
+def require_auth(role_required=None):
+    """Decorator para verificar autenticação e autorização"""
+    def decorator(f):
+        def wrapper(*args, **kwargs):
+            if 'user_id' not in session:
+                return jsonify({'error': 'Usuário não autenticado'}), 401
+            
+            if role_required and session.get('user_role') not in role_required:
+                return jsonify({'error': 'Acesso negado'}), 403
+            
+            return f(*args, **kwargs)
+        wrapper.__name__ = f.__name__
+        return wrapper
+    return decorator
+
+@admin_bp.route('/db-pool', methods=['GET'])
+@require_auth(['admin'])
+def get_db_pool():
+    """Estado e métricas do pool de conexões (e das réplicas) deste processo"""
+    try:
+        engines = {
+            bind_key or 'default': pool_status(engine)
+            for bind_key, engine in db.engines.items()
+        }
+        
+        return jsonify({
+            'pid': os.getpid(),
+            'engines': engines,
+            'replicas': replicas.status(),
+            'statement_timeout_ms': current_app.config['DB_STATEMENT_TIMEOUT'],
+            'statement_timeouts_ms': current_app.config['DB_STATEMENT_TIMEOUTS']
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles', methods=['GET'])
+@require_auth(['admin'])
+def get_profiles():
+    """Perfis de requisições salvos pelo profiler (mais recentes primeiro)"""
+    try:
+        return jsonify({'profiles': profiler.list_profiles()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@require_auth(['admin'])
+def get_profile(profile_id):
+    """Funções mais custosas, pico de memória e linha do tempo de SQL de um perfil"""
+    try:
+        profile = profiler.load_profile(profile_id)
+        if profile is None:
+            return jsonify({'error': 'Perfil não encontrado'}), 404
+        
+        return jsonify(profile), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles/<profile_id>/download', methods=['GET'])
+@require_auth(['admin'])
+def download_profile(profile_id):
+    """Arquivo do perfil: .pstats (cProfile) ou .folded (amostragem)"""
+    profile = profiler.load_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Perfil não encontrado'}), 404
+    
+    return send_from_directory(os.path.abspath(profiler.profile_dir()), profile['file'], as_attachment=True)
+
+@admin_bp.route('/outbox', methods=['GET'])
+@require_auth(['admin'])
+def get_outbox():
+    """Eventos pendentes e com falha do outbox e atraso do worker"""
+    try:
+        return jsonify(outbox.outbox_status()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/outbox/retry', methods=['POST'])
+@require_auth(['admin'])
+def retry_outbox_events():
+    """Devolve à fila os eventos com falha (todos ou os ids informados)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        event_ids = data.get('ids')
+        if event_ids is not None and (not isinstance(event_ids, list)
+                                      or not all(isinstance(event_id, int) for event_id in event_ids)):
+            raise ValueError('ids deve ser uma lista de inteiros')
+        
+        retried = outbox.retry_failed(event_ids)
+        return jsonify({'message': f'{retried} eventos devolvidos à fila', 'retried': retried}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
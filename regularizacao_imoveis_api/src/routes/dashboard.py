@@ -1,11 +1,14 @@
 from flask import Blueprint, request, jsonify, session
-from sqlalchemy import func, text
+from sqlalchemy import func
 from src.models import db
 from src.models.property import Property
 from src.models.step_record import StepRecord
 from src.models.regularization_step import RegularizationStep
 from src.models.document import Document
 from src.models.user import User
+from src.services.counters import get_counters
+from src.services.overdue import overdue_ordering, overdue_steps_query
+from src.services.rollups import monthly_completions, months_back, step_durations
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -29,24 +32,27 @@ def require_auth(role_required=None):
 def get_dashboard_overview():
     """Obter visão geral do dashboard"""
     try:
+        # Contadores mantidos incrementalmente: uma única leitura
+        counters = get_counters()
+        
         # Estatísticas básicas de imóveis
-        total_properties = Property.query.count()
-        properties_in_progress = Property.query.filter_by(regularization_status='in_progress').count()
-        properties_municipal_registered = Property.query.filter_by(regularization_status='municipal_registered').count()
-        properties_registry_completed = Property.query.filter_by(regularization_status='registry_completed').count()
-        properties_pending = Property.query.filter_by(regularization_status='pending').count()
+        total_properties = counters['properties.total']
+        properties_in_progress = counters['properties.status.in_progress']
+        properties_municipal_registered = counters['properties.status.municipal_registered']
+        properties_registry_completed = counters['properties.status.registry_completed']
+        properties_pending = counters['properties.status.pending']
         
         # Estatísticas de etapas
-        total_step_records = StepRecord.query.count()
-        active_steps = StepRecord.query.filter_by(status='in_progress').count()
-        completed_steps = StepRecord.query.filter_by(status='completed').count()
-        blocked_steps = StepRecord.query.filter_by(status='blocked').count()
+        total_step_records = counters['step_records.total']
+        active_steps = counters['step_records.status.in_progress']
+        completed_steps = counters['step_records.status.completed']
+        blocked_steps = counters['step_records.status.blocked']
         
         # Estatísticas de documentos
-        total_documents = Document.query.count()
+        total_documents = counters['documents.total']
         
         # Estatísticas de usuários
-        total_users = User.query.filter_by(active=True).count()
+        total_users = counters['users.active']
         
         return jsonify({
             'properties': {
@@ -175,17 +181,18 @@ def get_steps_progress():
 def get_monthly_progress():
     """Obter progresso mensal de conclusão de etapas"""
     try:
-        # Buscar etapas concluídas nos últimos 12 meses
-        monthly_progress = db.session.query(
-            func.date_trunc('month', StepRecord.end_date).label('month'),
-            func.count(StepRecord.id).label('completed_steps')
-        ).filter(
-            StepRecord.status == 'completed',
-            StepRecord.end_date.isnot(None),
-            StepRecord.end_date >= func.current_date() - text("INTERVAL '12 months'")
-        ).group_by(func.date_trunc('month', StepRecord.end_date))\
-         .order_by(func.date_trunc('month', StepRecord.end_date))\
-         .all()
+        from datetime import date
+        
+        months = request.args.get('months', 12, type=int)
+        step_id = request.args.get('step_id', type=int)
+        neighborhood = request.args.get('neighborhood', '')
+        if not 1 <= months <= 120:
+            return jsonify({'error': 'months deve estar entre 1 e 120'}), 400
+        
+        # Etapas concluídas nos últimos meses (incluindo o atual), lidas do agregado mensal
+        monthly_progress = monthly_completions(
+            months_back(date.today(), months), step_id=step_id, neighborhood=neighborhood
+        )
         
         result = []
         for month, completed_steps in monthly_progress:
@@ -204,45 +211,46 @@ def get_monthly_progress():
 def get_overdue_steps():
     """Obter etapas em atraso"""
     try:
-        from datetime import date, timedelta
-        
-        # Buscar etapas em andamento com data estimada de conclusão vencida
-        overdue_query = db.session.query(
-            StepRecord,
-            RegularizationStep,
-            Property
-        ).join(RegularizationStep)\
-         .join(Property)\
-         .filter(
-            StepRecord.status == 'in_progress',
-            StepRecord.start_date.isnot(None),
-            RegularizationStep.estimated_duration_days.isnot(None)
-        ).all()
+        from datetime import date
         
-        overdue_steps = []
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 100, type=int)
+        sort = request.args.get('sort', 'days_overdue')
+        order = request.args.get('order', 'desc')
         today = date.today()
         
-        for step_record, step, property_obj in overdue_query:
-            expected_end = step_record.start_date + timedelta(days=step.estimated_duration_days)
-            if today > expected_end:
-                days_overdue = (today - expected_end).days
-                overdue_steps.append({
-                    'step_record_id': step_record.id,
-                    'property_id': property_obj.id,
-                    'property_code': property_obj.municipal_code,
-                    'property_address': property_obj.get_full_address(),
-                    'step_name': step.name,
-                    'start_date': step_record.start_date.isoformat(),
-                    'expected_end_date': expected_end.isoformat(),
-                    'days_overdue': days_overdue,
-                    'responsible_user_id': step_record.responsible_user_id
-                })
+        # Range indexado em (status, expected_end_date), dias de atraso calculados no SQL
+        query = overdue_steps_query(today)
+        total_overdue = query.order_by(None).count()
+        
+        overdue_query = query.order_by(*overdue_ordering(sort, order))\
+            .offset((page - 1) * per_page)\
+            .limit(per_page)\
+            .all()
+        
+        overdue_steps = []
+        for step_record, step, property_obj, days_overdue in overdue_query:
+            overdue_steps.append({
+                'step_record_id': step_record.id,
+                'property_id': property_obj.id,
+                'property_code': property_obj.municipal_code,
+                'property_address': property_obj.get_full_address(),
+                'step_name': step.name,
+                'start_date': step_record.start_date.isoformat(),
+                'expected_end_date': step_record.expected_end_date.isoformat(),
+                'days_overdue': days_overdue,
+                'responsible_user_id': step_record.responsible_user_id
+            })
         
         return jsonify({
             'overdue_steps': overdue_steps,
-            'total_overdue': len(overdue_steps)
+            'total_overdue': total_overdue,
+            'current_page': page,
+            'per_page': per_page
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -259,8 +267,8 @@ def get_recent_activities():
             RegularizationStep,
             Property,
             User
-        ).join(RegularizationStep)\
-         .join(Property)\
+        ).join(RegularizationStep, StepRecord.step_id == RegularizationStep.id)\
+         .join(Property, StepRecord.property_id == Property.id)\
          .outerjoin(User, StepRecord.responsible_user_id == User.id)\
          .order_by(StepRecord.updated_at.desc())\
          .limit(limit).all()
@@ -288,35 +296,35 @@ def get_recent_activities():
 def get_performance_metrics():
     """Obter métricas de performance"""
     try:
-        # Tempo médio de conclusão por etapa
-        avg_duration_query = db.session.query(
-            RegularizationStep.name,
-            func.avg(
-                func.extract('epoch', StepRecord.end_date - StepRecord.start_date) / 86400
-            ).label('avg_duration_days')
-        ).join(StepRecord)\
-         .filter(
-            StepRecord.status == 'completed',
-            StepRecord.start_date.isnot(None),
-            StepRecord.end_date.isnot(None)
-        ).group_by(RegularizationStep.name)\
-         .order_by(RegularizationStep.order_sequence)\
-         .all()
+        from datetime import date
+        
+        months = request.args.get('months', type=int)
+        step_id = request.args.get('step_id', type=int)
+        neighborhood = request.args.get('neighborhood', '')
+        if months is not None and not 1 <= months <= 120:
+            return jsonify({'error': 'months deve estar entre 1 e 120'}), 400
+        start_month = months_back(date.today(), months) if months else None
         
+        # Duração por etapa lida dos histogramas mensais (média exata, percentis aproximados)
         avg_durations = []
-        for step_name, avg_days in avg_duration_query:
+        percentiles = []
+        for (step, step_name), histogram in step_durations(start_month, step_id=step_id, neighborhood=neighborhood):
+            summary = histogram.summary()
             avg_durations.append({
                 'step_name': step_name,
-                'avg_duration_days': round(float(avg_days), 1) if avg_days else 0
+                'avg_duration_days': summary['mean_days'] or 0
             })
+            percentiles.append({'step_id': step, 'step_name': step_name, **summary})
         
-        # Taxa de conclusão geral
-        total_steps = StepRecord.query.count()
-        completed_steps = StepRecord.query.filter_by(status='completed').count()
+        # Taxa de conclusão geral (contadores mantidos incrementalmente)
+        counters = get_counters()
+        total_steps = counters['step_records.total']
+        completed_steps = counters['step_records.status.completed']
         completion_rate = (completed_steps / total_steps * 100) if total_steps > 0 else 0
         
         return jsonify({
             'avg_step_durations': avg_durations,
+            'step_duration_percentiles': percentiles,
             'completion_rate': round(completion_rate, 2),
             'total_steps': total_steps,
             'completed_steps': completed_steps
@@ -1,9 +1,12 @@
-from flask import Blueprint, request, jsonify, session, send_file, current_app
+from flask import Blueprint, request, jsonify, session
 import os
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
 from src.models import db
 from src.models.document import Document
 from src.models.step_record import StepRecord
+from src.services.storage import send_document, store_stream
+from src.services.pagination import InvalidCursorError, cursor_args, cursor_response, keyset_paginate
 
 documents_bp = Blueprint('documents', __name__)
 
@@ -42,7 +45,7 @@ def get_documents():
         step_record_id = request.args.get('step_record_id', type=int)
         document_type = request.args.get('document_type')
         
-        query = Document.query
+        query = Document.query.options(joinedload(Document.uploader))
         
         if step_record_id:
             query = query.filter(Document.step_record_id == step_record_id)
@@ -50,6 +53,16 @@ def get_documents():
         if document_type:
             query = query.filter(Document.document_type.ilike(f'%{document_type}%'))
         
+        # Modo cursor (keyset): ?cursor= vazio para a primeira página
+        if 'cursor' in request.args:
+            params = cursor_args(request.args, default_sort='created_at', default_order='desc')
+            page_data = keyset_paginate(query, Document, **params)
+            return jsonify(cursor_response(
+                'documents', page_data,
+                lambda doc: doc.to_dict(include_relations=True),
+                params['per_page']
+            )), 200
+        
         query = query.order_by(Document.created_at.desc())
         
         documents = query.paginate(
@@ -64,6 +77,8 @@ def get_documents():
             'per_page': per_page
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -72,7 +87,9 @@ def get_documents():
 def get_document(document_id):
     """Obter documento por ID"""
     try:
-        document = Document.query.get_or_404(document_id)
+        document = Document.query.options(joinedload(Document.uploader))\
+            .filter(Document.id == document_id)\
+            .first_or_404()
         return jsonify({'document': document.to_dict(include_relations=True)}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -106,24 +123,17 @@ def upload_document():
         # Gerar nome seguro para o arquivo
         filename = secure_filename(file.filename)
         
-        # Criar diretório se não existir
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Gerar nome único para evitar conflitos
-        import uuid
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        # Salvar arquivo
-        file.save(file_path)
+        # Gravar em blocos no armazenamento endereçado por conteúdo (SHA-256);
+        # conteúdos idênticos são armazenados uma única vez
+        content_hash, file_path, file_size = store_stream(file.stream)
         
-        # Criar registro no banco
+        # Criar registro no banco (a referência ao blob é contada no flush)
         document = Document(
             step_record_id=step_record_id,
             filename=filename,
             file_path=file_path,
-            file_size=os.path.getsize(file_path),
+            file_size=file_size,
+            content_hash=content_hash,
             file_type=file.content_type,
             document_type=document_type,
             description=description,
@@ -149,15 +159,11 @@ def download_document(document_id):
     try:
         document = Document.query.get_or_404(document_id)
         
-        if not os.path.exists(document.file_path):
-            return jsonify({'error': 'Arquivo não encontrado no servidor'}), 404
-        
-        return send_file(
-            document.file_path,
-            as_attachment=True,
-            download_name=document.filename
-        )
+        # ETag forte, Range e requisições condicionais; opcionalmente entregue pelo proxy
+        return send_document(document)
         
+    except FileNotFoundError:
+        return jsonify({'error': 'Arquivo não encontrado no servidor'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -194,11 +200,12 @@ def delete_document(document_id):
     try:
         document = Document.query.get_or_404(document_id)
         
-        # Remover arquivo físico
-        if os.path.exists(document.file_path):
+        # Documentos anteriores ao armazenamento por conteúdo têm arquivo próprio
+        if not document.content_hash and os.path.exists(document.file_path):
             os.remove(document.file_path)
         
-        # Remover registro do banco
+        # Remover registro do banco; o blob só é apagado após o commit
+        # quando nenhum outro documento o referencia
         db.session.delete(document)
         db.session.commit()
         
@@ -214,7 +221,9 @@ def get_step_record_documents(step_record_id):
     """Obter todos os documentos de um registro de etapa"""
     try:
         # Verificar se o registro de etapa existe
-        step_record = StepRecord.query.get_or_404(step_record_id)
+        step_record = StepRecord.query_with_relations()\
+            .filter(StepRecord.id == step_record_id)\
+            .first_or_404()
         
         documents = Document.query\
             .filter(Document.step_record_id == step_record_id)\
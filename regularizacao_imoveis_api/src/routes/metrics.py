@@ -0,0 +1,36 @@
+import hmac
+from flask import Blueprint, Response, jsonify, request, session, current_app
+from src.models import db
+from src.services.metrics import CONTENT_TYPE
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def require_metrics_auth(f):
+    """Decorator: token do coletor (METRICS_TOKEN) ou sessão de administrador"""
+    def wrapper(*args, **kwargs):
+        token = current_app.config['METRICS_TOKEN']
+        authorization = request.headers.get('Authorization', '')
+        # Comparação em bytes: com str, compare_digest rejeita caracteres não ASCII com TypeError
+        if token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            return f(*args, **kwargs)
+
+        if 'user_id' not in session:
+            return jsonify({'error': 'Usuário não autenticado'}), 401
+
+        if session.get('user_role') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+
+        return f(*args, **kwargs)
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+@metrics_bp.route('', methods=['GET'])
+@require_metrics_auth
+def get_metrics():
+    """Métricas deste processo no formato texto do Prometheus"""
+    try:
+        body = current_app.extensions['metrics'].render(db.engines)
+        return Response(body, content_type=CONTENT_TYPE)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,12 +1,22 @@
-from flask import Blueprint, request, jsonify, session
+from datetime import date
+from flask import Blueprint, Response, request, jsonify, session, current_app, stream_with_context
 from geoalchemy2.functions import ST_AsGeoJSON, ST_GeomFromText, ST_SetSRID
 from src.models import db
 from src.models.property import Property
 from src.models.step_record import StepRecord
 from src.models.regularization_step import RegularizationStep
+from src.services import clusters, spatial, tiles
+from src.services.coordinates import load_coordinates, with_coordinates
+from src.services.search import apply_search
+from src.services.export import FORMATS as EXPORT_FORMATS, generate_export
+from src.services.pagination import SORT_KEYS, InvalidCursorError, cursor_args, cursor_response, keyset_paginate, sort_ordering
+from src.services.property_import import ImportFormatError, detect_format, import_properties, iter_csv_rows, iter_geojson_rows
 
 properties_bp = Blueprint('properties', __name__)
 
+# Ordenações da listagem (o progresso vem das colunas mantidas em properties)
+PROPERTY_SORT_KEYS = SORT_KEYS + ['completion_percentage', 'last_activity_at']
+
 def require_auth(role_required=None):
     """Decorator para verificar autenticação e autorização"""
     def decorator(f):
@@ -22,6 +32,26 @@ def require_auth(role_required=None):
         return wrapper
     return decorator
 
+def filter_properties(args):
+    """Query de imóveis com os filtros da listagem (search, status, neighborhood)"""
+    search = args.get('search', '')
+    status = args.get('status', '')
+    neighborhood = args.get('neighborhood', '')
+    
+    query = Property.query
+    
+    if search:
+        # Busca indexada, ordenada por relevância
+        query = apply_search(query, search)
+    
+    if status:
+        query = query.filter(Property.regularization_status == status)
+    
+    if neighborhood:
+        query = query.filter(Property.address_neighborhood.ilike(f'%{neighborhood}%'))
+    
+    return query
+
 @properties_bp.route('', methods=['GET'])
 @require_auth()
 def get_properties():
@@ -30,28 +60,35 @@ def get_properties():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '')
-        status = request.args.get('status', '')
-        neighborhood = request.args.get('neighborhood', '')
         include_geometry = request.args.get('include_geometry', 'false').lower() == 'true'
         
-        query = Property.query
-        
-        if search:
-            query = query.filter(
-                (Property.municipal_code.ilike(f'%{search}%')) |
-                (Property.address_street.ilike(f'%{search}%')) |
-                (Property.current_owner.ilike(f'%{search}%'))
-            )
-        
-        if status:
-            query = query.filter(Property.regularization_status == status)
-        
-        if neighborhood:
-            query = query.filter(Property.address_neighborhood.ilike(f'%{neighborhood}%'))
+        query = filter_properties(request.args)
+        if include_geometry:
+            query = with_coordinates(query)
+        
+        # Modo cursor (keyset): ?cursor= vazio para a primeira página
+        if 'cursor' in request.args:
+            params = cursor_args(request.args)
+            page_data = keyset_paginate(query, Property, sort_keys=PROPERTY_SORT_KEYS, **params)
+            if include_geometry:
+                load_coordinates(page_data['items'])
+            return jsonify(cursor_response(
+                'properties', page_data,
+                lambda prop: prop.to_dict(include_geometry=include_geometry),
+                params['per_page']
+            )), 200
+        
+        # Ordenação estável para a paginação por página (a busca já ordena por relevância)
+        if 'sort' in request.args or not search:
+            query = query.order_by(None).order_by(*sort_ordering(
+                Property, request.args.get('sort', 'id'), request.args.get('order', 'asc'), PROPERTY_SORT_KEYS
+            ))
         
         properties = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
+        if include_geometry:
+            load_coordinates(properties.items)
         
         return jsonify({
             'properties': [prop.to_dict(include_geometry=include_geometry) for prop in properties.items],
@@ -61,6 +98,130 @@ def get_properties():
             'per_page': per_page
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/within', methods=['GET'])
+@require_auth()
+def get_properties_within():
+    """Listar imóveis dentro de um retângulo (bbox=min_lng,min_lat,max_lng,max_lat)"""
+    try:
+        bbox = spatial.parse_bbox(request.args.get('bbox'))
+        limit = min(request.args.get('limit', spatial.MAX_RESULTS, type=int), spatial.MAX_RESULTS)
+        
+        results = spatial.within(bbox, limit=limit)
+        
+        return jsonify({'properties': spatial.serialize(results), 'total': len(results)}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/near', methods=['GET'])
+@require_auth()
+def get_properties_near():
+    """Listar imóveis a até radius metros de um ponto, do mais próximo ao mais distante"""
+    try:
+        lat, lng = spatial.parse_point(request.args)
+        radius = request.args.get('radius', type=float)
+        if not radius or radius <= 0:
+            return jsonify({'error': 'Parâmetro radius (metros) deve ser positivo'}), 400
+        limit = min(request.args.get('limit', spatial.MAX_RESULTS, type=int), spatial.MAX_RESULTS)
+        
+        results = spatial.near(lat, lng, radius, limit=limit)
+        
+        return jsonify({'properties': spatial.serialize(results), 'total': len(results)}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/nearest', methods=['GET'])
+@require_auth()
+def get_nearest_properties():
+    """Listar os k imóveis mais próximos de um ponto"""
+    try:
+        lat, lng = spatial.parse_point(request.args)
+        k = request.args.get('k', 10, type=int)
+        if not 1 <= k <= spatial.MAX_NEIGHBOURS:
+            return jsonify({'error': f'Parâmetro k deve estar entre 1 e {spatial.MAX_NEIGHBOURS}'}), 400
+        
+        results = spatial.nearest(lat, lng, k=k)
+        
+        return jsonify({'properties': spatial.serialize(results), 'total': len(results)}), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/clusters', methods=['GET'])
+@require_auth()
+def get_property_clusters():
+    """Clusters de imóveis do mapa (bbox=min_lng,min_lat,max_lng,max_lat e zoom)"""
+    try:
+        bbox = spatial.parse_bbox(request.args.get('bbox'))
+        zoom = request.args.get('zoom', type=int)
+        if zoom is None:
+            return jsonify({'error': 'Parâmetro zoom é obrigatório'}), 400
+        
+        results = clusters.clusters(bbox, zoom)
+        
+        return jsonify({
+            'clusters': results,
+            'total': len(results),
+            'properties': sum(item['count'] for item in results)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+@require_auth()
+def get_property_tile(z, x, y):
+    """Vector tile (MVT) dos imóveis com municipal_code e status"""
+    try:
+        data = tiles.get_tile(z, x, y)
+        
+        response = Response(data, mimetype=tiles.TILE_MIMETYPE)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@properties_bp.route('/export', methods=['GET'])
+@require_auth()
+def export_properties():
+    """Exportar imóveis e progresso das etapas em CSV, XLSX ou GeoJSON"""
+    try:
+        file_format = request.args.get('format', 'csv').lower()
+        if file_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Formato inválido. Use csv, xlsx ou geojson'}), 400
+        
+        query = filter_properties(request.args)
+        if not request.args.get('search'):
+            query = query.order_by(Property.id)
+        
+        mimetype, extension = EXPORT_FORMATS[file_format]
+        filename = f'imoveis_{date.today().strftime("%Y%m%d")}.{extension}'
+        
+        # Resposta em fluxo: as linhas são lidas e enviadas em lotes
+        return Response(
+            stream_with_context(generate_export(query, file_format)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -69,8 +230,13 @@ def get_properties():
 def get_property(property_id):
     """Obter imóvel por ID"""
     try:
-        property_obj = Property.query.get_or_404(property_id)
         include_geometry = request.args.get('include_geometry', 'true').lower() == 'true'
+        query = Property.query.filter(Property.id == property_id)
+        if include_geometry:
+            query = with_coordinates(query)
+        property_obj = query.first_or_404()
+        if include_geometry:
+            load_coordinates([property_obj])
         
         return jsonify({'property': property_obj.to_dict(include_geometry=include_geometry)}), 200
     except Exception as e:
@@ -144,6 +310,39 @@ def create_property():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@properties_bp.route('/import', methods=['POST'])
+@require_auth(['admin', 'manager'])
+def import_properties_file():
+    """Importar imóveis em lote a partir de CSV ou GeoJSON"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+        
+        file_format = detect_format(file.filename, request.form.get('format'))
+        rows = iter_csv_rows(file.stream) if file_format == 'csv' else iter_geojson_rows(file.stream)
+        
+        report = import_properties(
+            rows,
+            user_id=session['user_id'],
+            chunk_size=current_app.config['PROPERTY_IMPORT_CHUNK_SIZE']
+        )
+        
+        return jsonify({
+            'message': f'{report["imported"]} imóveis importados, {report["failed"]} linhas com erro',
+            **report
+        }), 200
+        
+    except ImportFormatError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @properties_bp.route('/<int:property_id>', methods=['PUT'])
 @require_auth(['admin', 'manager', 'operator'])
 def update_property(property_id):
@@ -240,32 +439,30 @@ def get_neighborhoods():
 def get_property_progress(property_id):
     """Obter progresso das etapas de um imóvel"""
     try:
+        include_steps = request.args.get('include_steps', 'true').lower() == 'true'
         property_obj = Property.query.get_or_404(property_id)
         
-        step_records = StepRecord.query\
-            .join(RegularizationStep)\
-            .filter(StepRecord.property_id == property_id)\
-            .order_by(RegularizationStep.order_sequence)\
-            .all()
-        
-        progress_data = []
-        for record in step_records:
-            progress_data.append(record.to_dict(include_relations=True))
-        
-        # Calcular estatísticas gerais
-        total_steps = len(step_records)
-        completed_steps = len([r for r in step_records if r.status == 'completed'])
-        completion_percentage = (completed_steps / total_steps * 100) if total_steps > 0 else 0
-        
-        return jsonify({
+        # Resumo mantido em properties (services/progress.py)
+        result = {
             'property': property_obj.to_dict(),
-            'steps': progress_data,
             'summary': {
-                'total_steps': total_steps,
-                'completed_steps': completed_steps,
-                'completion_percentage': round(completion_percentage, 2)
+                'total_steps': property_obj.total_steps,
+                'completed_steps': property_obj.completed_steps,
+                'completion_percentage': float(property_obj.completion_percentage),
+                'current_step_id': property_obj.current_step_id,
+                'last_activity_at': property_obj.last_activity_at.isoformat() if property_obj.last_activity_at else None
             }
-        }), 200
+        }
+        
+        # Detalhe das etapas (?include_steps=false retorna apenas o resumo)
+        if include_steps:
+            step_records = StepRecord.query_with_relations()\
+                .filter(StepRecord.property_id == property_id)\
+                .order_by(RegularizationStep.order_sequence)\
+                .all()
+            result['steps'] = [record.to_dict(include_relations=True) for record in step_records]
+        
+        return jsonify(result), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -4,6 +4,9 @@ from src.models import db
 from src.models.step_record import StepRecord
 from src.models.property import Property
 from src.models.regularization_step import RegularizationStep
+from src.services.bulk_updates import bulk_update_step_records
+from src.services.overdue import days_overdue_column, overdue_filter, overdue_ordering
+from src.services.pagination import InvalidCursorError, cursor_args, cursor_response, keyset_paginate
 
 step_records_bp = Blueprint('step_records', __name__)
 
@@ -34,7 +37,7 @@ def get_step_records():
         status = request.args.get('status')
         responsible_user_id = request.args.get('responsible_user_id', type=int)
         
-        query = StepRecord.query
+        query = StepRecord.query_with_relations()
         
         if property_id:
             query = query.filter(StepRecord.property_id == property_id)
@@ -48,8 +51,18 @@ def get_step_records():
         if responsible_user_id:
             query = query.filter(StepRecord.responsible_user_id == responsible_user_id)
         
+        # Modo cursor (keyset): ?cursor= vazio para a primeira página
+        if 'cursor' in request.args:
+            params = cursor_args(request.args)
+            page_data = keyset_paginate(query, StepRecord, **params)
+            return jsonify(cursor_response(
+                'step_records', page_data,
+                lambda record: record.to_dict(include_relations=True),
+                params['per_page']
+            )), 200
+        
         # Ordenar por propriedade e ordem da etapa
-        query = query.join(RegularizationStep).order_by(
+        query = query.order_by(
             StepRecord.property_id, 
             RegularizationStep.order_sequence
         )
@@ -66,6 +79,8 @@ def get_step_records():
             'per_page': per_page
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -74,7 +89,9 @@ def get_step_records():
 def get_step_record(record_id):
     """Obter registro de etapa por ID"""
     try:
-        record = StepRecord.query.get_or_404(record_id)
+        record = StepRecord.query_with_relations()\
+            .filter(StepRecord.id == record_id)\
+            .first_or_404()
         return jsonify({'step_record': record.to_dict(include_relations=True)}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -133,6 +150,11 @@ def update_step_record(record_id):
         
         db.session.commit()
         
+        # Recarregar com relações em uma única consulta (o commit expira o objeto)
+        record = StepRecord.query_with_relations()\
+            .filter(StepRecord.id == record_id)\
+            .one()
+        
         return jsonify({
             'message': 'Registro de etapa atualizado com sucesso',
             'step_record': record.to_dict(include_relations=True)
@@ -142,6 +164,33 @@ def update_step_record(record_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@step_records_bp.route('/bulk', methods=['PATCH'])
+@require_auth(['admin', 'manager', 'operator'])
+def bulk_update_step_records_route():
+    """Atualizar em lote os registros de etapas selecionados"""
+    try:
+        data = request.get_json() or {}
+        
+        # Seleção por lista de ids ou por filtros (imóveis, etapa, bairro, status atual)
+        selection = data.get('filter') or {}
+        if 'ids' in data:
+            selection = dict(selection, ids=data['ids'])
+        
+        result = bulk_update_step_records(selection, data.get('changes') or {})
+        
+        return jsonify({
+            'message': f'{result["updated"]} registros de etapas atualizados',
+            'updated': result['updated'],
+            'previous_status': result['previous_status']
+        }), 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @step_records_bp.route('/property/<int:property_id>', methods=['GET'])
 @require_auth()
 def get_property_step_records(property_id):
@@ -150,8 +199,7 @@ def get_property_step_records(property_id):
         # Verificar se o imóvel existe
         property_obj = Property.query.get_or_404(property_id)
         
-        records = StepRecord.query\
-            .join(RegularizationStep)\
+        records = StepRecord.query_with_relations()\
             .filter(StepRecord.property_id == property_id)\
             .order_by(RegularizationStep.order_sequence)\
             .all()
@@ -182,33 +230,37 @@ def get_status_options():
 def get_overdue_records():
     """Listar registros de etapas em atraso"""
     try:
-        # Buscar registros em andamento que passaram da data estimada
-        from datetime import timedelta
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 100, type=int)
+        sort = request.args.get('sort', 'days_overdue')
+        order = request.args.get('order', 'desc')
+        today = date.today()
         
-        overdue_records = []
+        # Registros em andamento que passaram da data prevista (range indexado)
+        query = StepRecord.query_with_relations().filter(*overdue_filter(today))
+        total_overdue = query.order_by(None).count()
         
-        records = StepRecord.query\
-            .join(RegularizationStep)\
-            .filter(StepRecord.status == 'in_progress')\
-            .filter(StepRecord.start_date.isnot(None))\
-            .filter(RegularizationStep.estimated_duration_days.isnot(None))\
+        records = query.add_columns(days_overdue_column(today))\
+            .order_by(*overdue_ordering(sort, order))\
+            .offset((page - 1) * per_page)\
+            .limit(per_page)\
             .all()
         
-        today = date.today()
-        
-        for record in records:
-            expected_end = record.start_date + timedelta(days=record.step.estimated_duration_days)
-            if today > expected_end:
-                record_dict = record.to_dict(include_relations=True)
-                record_dict['expected_end_date'] = expected_end.isoformat()
-                record_dict['days_overdue'] = (today - expected_end).days
-                overdue_records.append(record_dict)
+        overdue_records = []
+        for record, days_overdue in records:
+            record_dict = record.to_dict(include_relations=True)
+            record_dict['days_overdue'] = days_overdue
+            overdue_records.append(record_dict)
         
         return jsonify({
             'overdue_records': overdue_records,
-            'total_overdue': len(overdue_records)
+            'total_overdue': total_overdue,
+            'current_page': page,
+            'per_page': per_page
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
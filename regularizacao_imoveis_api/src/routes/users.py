@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, session
 from src.models import db
 from src.models.user import User
+from src.services.pagination import InvalidCursorError, cursor_args, cursor_response, keyset_paginate
 
 users_bp = Blueprint('users', __name__)
 
@@ -40,6 +41,17 @@ def get_users():
         if role:
             query = query.filter(User.role == role)
         
+        # Modo cursor (keyset): ?cursor= vazio para a primeira página
+        if 'cursor' in request.args:
+            params = cursor_args(request.args)
+            page_data = keyset_paginate(query, User, **params)
+            return jsonify(cursor_response(
+                'users', page_data, lambda user: user.to_dict(), params['per_page']
+            )), 200
+        
+        # Ordenação estável para a paginação por página
+        query = query.order_by(User.id)
+        
         users = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
@@ -52,6 +64,8 @@ def get_users():
             'per_page': per_page
         }), 200
         
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,174 @@
+"""Atualização em lote de registros de etapas.
+
+Aplica as mesmas regras de ``PUT /api/step-records/<id>`` a todos os
+registros selecionados com um único ``UPDATE`` (as expressões do ``SET``
+enxergam os valores anteriores de cada linha):
+
+* ``in_progress`` sem data de início recebe a data de hoje;
+* ``completed`` sem data de fim recebe a data de hoje e 100% de conclusão;
+* ``expected_end_date`` é recalculada quando a data de início pode mudar;
+* os contadores do dashboard são ajustados pela contagem dos status anteriores;
+* o resumo de progresso dos imóveis afetados é recalculado;
+* o agregado mensal de conclusões é ajustado pela diferença entre a agregação
+  dos registros afetados antes e depois do ``UPDATE``.
+"""
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy import and_, case, func, literal, select
+
+from src.models import db
+from src.models.property import Property
+from src.models.regularization_step import RegularizationStep
+from src.models.sql_functions import date_add_days
+from src.models.step_record import StepRecord
+from src.services import rollups
+from src.services.counters import STEP_STATUSES, apply_deltas
+from src.services.progress import refresh_progress
+
+FILTER_KEYS = ['ids', 'property_ids', 'step_id', 'neighborhood', 'status']
+CHANGE_KEYS = ['status', 'start_date', 'end_date', 'responsible_user_id', 'observations', 'completion_percentage']
+
+
+def _int_list(value, name):
+    if not isinstance(value, list) or not all(isinstance(item, int) for item in value):
+        raise ValueError(f'{name} deve ser uma lista de inteiros')
+    return value
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def selection_criteria(selection):
+    """Critérios WHERE a partir de ``ids`` ou dos filtros (imóveis, etapa, bairro, status)"""
+    table = StepRecord.__table__
+    criteria = []
+
+    if selection.get('ids') is not None:
+        criteria.append(table.c.id.in_(_int_list(selection['ids'], 'ids')))
+    if selection.get('property_ids') is not None:
+        criteria.append(table.c.property_id.in_(_int_list(selection['property_ids'], 'property_ids')))
+    if selection.get('step_id'):
+        criteria.append(table.c.step_id == selection['step_id'])
+    if selection.get('neighborhood'):
+        properties = Property.__table__
+        criteria.append(table.c.property_id.in_(
+            select(properties.c.id)
+            .where(func.lower(properties.c.address_neighborhood) == selection['neighborhood'].lower())
+        ))
+    if selection.get('status'):
+        criteria.append(table.c.status == selection['status'])
+
+    if not criteria:
+        raise ValueError('Informe ids ou ao menos um filtro: ' + ', '.join(FILTER_KEYS[1:]))
+    return criteria
+
+
+def update_values(changes, today):
+    """Expressões do SET equivalentes às regras de update_step_record"""
+    table = StepRecord.__table__
+    unknown = set(changes) - set(CHANGE_KEYS)
+    if unknown:
+        raise ValueError(f'Campos não permitidos: {", ".join(sorted(unknown))}')
+    if not changes:
+        raise ValueError('Nenhuma alteração informada')
+
+    values = {}
+    status = changes.get('status')
+    if 'status' in changes:
+        if status not in STEP_STATUSES:
+            raise ValueError('Status inválido')
+        values['status'] = status
+        if status == 'in_progress':
+            values['start_date'] = func.coalesce(table.c.start_date, literal(today))
+        if status == 'completed':
+            values['end_date'] = func.coalesce(table.c.end_date, literal(today))
+            values['completion_percentage'] = case((table.c.end_date.is_(None), 100), else_=table.c.completion_percentage)
+
+    if 'start_date' in changes:
+        values['start_date'] = _parse_date(changes['start_date'])
+    if 'end_date' in changes:
+        values['end_date'] = _parse_date(changes['end_date'])
+    if 'responsible_user_id' in changes:
+        values['responsible_user_id'] = changes['responsible_user_id']
+    if 'observations' in changes:
+        values['observations'] = changes['observations']
+    if 'completion_percentage' in changes:
+        percentage = changes['completion_percentage']
+        if not isinstance(percentage, int) or not 0 <= percentage <= 100:
+            raise ValueError('Percentual deve estar entre 0 e 100')
+        values['completion_percentage'] = percentage
+
+    if 'start_date' in values:
+        steps = RegularizationStep.__table__
+        duration = select(steps.c.estimated_duration_days)\
+            .where(steps.c.id == table.c.step_id)\
+            .scalar_subquery()
+        values['expected_end_date'] = date_add_days(values['start_date'], duration)
+
+    values['updated_at'] = datetime.utcnow()
+    return values
+
+
+def _date_expression(values, name):
+    """Valor final da coluna de data após o UPDATE (None se for apagada)"""
+    if name not in values:
+        return StepRecord.__table__.c[name]
+    value = values[name]
+    return literal(value) if isinstance(value, date) else value
+
+
+def bulk_update_step_records(selection, changes):
+    """Atualiza os registros selecionados em uma transação e retorna as contagens.
+
+    Se alguma linha ficar com data de início posterior à data de fim, nada é
+    alterado e um ValueError é levantado.
+    """
+    table = StepRecord.__table__
+    criteria = selection_criteria(selection)
+    values = update_values(changes, date.today())
+    connection = db.session.connection()
+
+    start_date, end_date = _date_expression(values, 'start_date'), _date_expression(values, 'end_date')
+    if ('start_date' in values or 'end_date' in values) and start_date is not None and end_date is not None:
+        invalid = connection.execute(
+            select(func.count()).select_from(table)
+            .where(*criteria, and_(start_date.isnot(None), end_date.isnot(None), start_date > end_date))
+        ).scalar()
+        if invalid:
+            raise ValueError(f'Data de início não pode ser posterior à data de fim ({invalid} registros)')
+
+    previous_status = {}
+    if 'status' in values:
+        previous_status = {
+            status or 'not_started': count for status, count in connection.execute(
+                select(table.c.status, func.count()).where(*criteria).group_by(table.c.status)
+            )
+        }
+
+    # Imóveis afetados, lidos antes do UPDATE (os filtros podem deixar de corresponder)
+    property_ids = connection.execute(
+        select(table.c.property_id).where(*criteria).distinct()
+    ).scalars().all()
+
+    # Agregados mensais: status e datas mudam a chave ou a duração de um registro
+    record_ids, rollup_deltas = None, rollups.RollupDeltas()
+    if 'status' in values or 'start_date' in values or 'end_date' in values:
+        record_ids = connection.execute(select(table.c.id).where(*criteria)).scalars().all()
+        rollups.add_record_ids(connection, rollup_deltas, record_ids, -1)
+
+    updated = connection.execute(table.update().where(*criteria).values(**values)).rowcount
+    refresh_progress(connection, property_ids)
+
+    if record_ids:
+        rollups.add_record_ids(connection, rollup_deltas, record_ids, 1)
+        rollup_deltas.apply(connection)
+
+    if previous_status:
+        deltas = Counter({f'step_records.status.{status}': -count for status, count in previous_status.items()})
+        deltas[f'step_records.status.{values["status"]}'] += sum(previous_status.values())
+        apply_deltas(connection, deltas)
+
+    db.session.commit()
+    return {'updated': updated, 'previous_status': previous_status}
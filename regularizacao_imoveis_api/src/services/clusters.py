@@ -0,0 +1,381 @@
+"""Agrupamento (clusters) dos imóveis do mapa por nível de zoom.
+
+Índice hierárquico no estilo do supercluster sobre ``Property.geometry``: para
+cada zoom de 0 a ``MAX_CLUSTER_ZOOM`` os pontos são somados em células de
+``CLUSTER_RADIUS`` pixels (quantidade, soma das coordenadas e dos ids e
+quantidade por ``regularization_status``). Cada nível é um conjunto de arrays
+compactos ordenados pela chave da célula, de modo que a consulta de uma área
+visível percorre apenas as células dela — o custo não depende do total de
+imóveis. Na consulta, células vizinhas com centroides a menos de um raio são
+unidas, como no supercluster. Acima de ``MAX_CLUSTER_ZOOM`` os imóveis são
+devolvidos individualmente.
+
+O índice é mantido por processo e atualizado de forma incremental: quando a
+versão das alterações de imóveis (``services/property_changes.py``) muda,
+apenas os imóveis registrados nas versões posteriores à do índice são relidos
+e recolocados nos níveis (ou retirados, se foram excluídos). Com mais de
+``MAX_REFRESH_CHANGES`` imóveis alterados, ou se o registro já não cobre a
+versão do índice, ele é reconstruído.
+"""
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from flask import current_app
+from sqlalchemy import select
+
+from src.models import db
+from src.models.property import Property
+from src.services import mvt, property_changes, wkb
+from src.services.counters import PROPERTY_STATUSES
+
+TILE_SIZE = 256
+CLUSTER_RADIUS = 64
+CELL_BITS = (TILE_SIZE // CLUSTER_RADIUS).bit_length() - 1
+MAX_CLUSTER_ZOOM = 16
+MAX_ZOOM = 22
+MAX_POINTS = 5000
+MAX_REFRESH_CHANGES = 10000
+
+STATUS_INDEX = {status: index for index, status in enumerate(PROPERTY_STATUSES)}
+
+_lock = threading.Lock()
+
+
+def _project(lng, lat):
+    """Posição (x, y) em [0, 1) na projeção Web Mercator"""
+    return mvt.lnglat_to_tile_fraction(lng, lat, 0)
+
+
+def _cell(bits, x, y):
+    size = 1 << bits
+    return min(max(int(x * size), 0), size - 1), min(max(int(y * size), 0), size - 1)
+
+
+def _key_ranges(keys, bits, cx0, cy0, cx1, cy1):
+    """Posições das chaves na janela de células (uma busca binária por coluna)"""
+    if cx1 - cx0 + 1 > len(keys):
+        mask = (1 << bits) - 1
+        return [i for i, key in enumerate(keys)
+                if cx0 <= key >> bits <= cx1 and cy0 <= key & mask <= cy1]
+    positions = []
+    for cx in range(cx0, cx1 + 1):
+        start = bisect_left(keys, (cx << bits) | cy0)
+        end = bisect_right(keys, (cx << bits) | cy1, start)
+        positions.extend(range(start, end))
+    return positions
+
+
+class ClusterLevel:
+    """Células de um zoom: arrays paralelos ordenados pela chave (cx << bits) | cy"""
+
+    def __init__(self, bits, cells=None):
+        self.bits = bits
+        self.keys = array('q')
+        self.counts = array('q')
+        self.sum_x = array('d')
+        self.sum_y = array('d')
+        self.sum_ids = array('q')
+        self.statuses = array('q')
+        for key in sorted(cells or {}):
+            count, sum_x, sum_y, sum_ids, statuses = cells[key]
+            self.keys.append(key)
+            self.counts.append(count)
+            self.sum_x.append(sum_x)
+            self.sum_y.append(sum_y)
+            self.sum_ids.append(sum_ids)
+            self.statuses.extend(statuses)
+
+    def key(self, x, y):
+        cx, cy = _cell(self.bits, x, y)
+        return (cx << self.bits) | cy
+
+    def add(self, x, y, property_id, status, sign=1):
+        """Soma (sign=1) ou retira (sign=-1) um ponto da sua célula"""
+        key = self.key(x, y)
+        width = len(PROPERTY_STATUSES)
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            self.keys.insert(i, key)
+            self.counts.insert(i, 0)
+            self.sum_x.insert(i, 0.0)
+            self.sum_y.insert(i, 0.0)
+            self.sum_ids.insert(i, 0)
+            self.statuses[i * width:i * width] = array('q', [0] * width)
+
+        self.counts[i] += sign
+        if self.counts[i] == 0:
+            for values in (self.keys, self.counts, self.sum_x, self.sum_y, self.sum_ids):
+                del values[i]
+            del self.statuses[i * width:(i + 1) * width]
+            return
+        self.sum_x[i] += sign * x
+        self.sum_y[i] += sign * y
+        self.sum_ids[i] += sign * property_id
+        if status is not None:
+            self.statuses[i * width + status] += sign
+
+
+class ClusterIndex:
+    """Níveis de clusters de todos os zooms e os pontos individuais"""
+
+    def __init__(self, version, points):
+        self.version = version
+        # id -> (x, y, índice do status) ou None para imóveis sem geometria
+        self.points = points
+        self.levels = []
+        self._build()
+
+    def _build(self):
+        width = len(PROPERTY_STATUSES)
+        finest = MAX_CLUSTER_ZOOM + CELL_BITS
+        cells = {}
+        point_keys = []
+        for property_id, point in self.points.items():
+            if point is None:
+                continue
+            x, y, status = point
+            cx, cy = _cell(finest, x, y)
+            key = (cx << finest) | cy
+            point_keys.append((key, property_id))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0, 0.0, 0.0, 0, [0] * width]
+            cell[0] += 1
+            cell[1] += x
+            cell[2] += y
+            cell[3] += property_id
+            if status is not None:
+                cell[4][status] += 1
+
+        # Cada nível é a soma das quatro células filhas do nível seguinte
+        levels = [ClusterLevel(finest, cells)]
+        for bits in range(finest - 1, CELL_BITS - 1, -1):
+            mask = (1 << (bits + 1)) - 1
+            parents = {}
+            for key, (count, sum_x, sum_y, sum_ids, statuses) in cells.items():
+                parent_key = ((key >> (bits + 1)) >> 1 << bits) | ((key & mask) >> 1)
+                parent = parents.get(parent_key)
+                if parent is None:
+                    parents[parent_key] = [count, sum_x, sum_y, sum_ids, list(statuses)]
+                else:
+                    parent[0] += count
+                    parent[1] += sum_x
+                    parent[2] += sum_y
+                    parent[3] += sum_ids
+                    for i in range(width):
+                        parent[4][i] += statuses[i]
+            levels.append(ClusterLevel(bits, parents))
+            cells = parents
+        self.levels = levels[::-1]
+
+        point_keys.sort()
+        self.point_keys = array('q', [key for key, _ in point_keys])
+        self.point_ids = array('q', [property_id for _, property_id in point_keys])
+
+    # --- Atualização incremental ------------------------------------------------
+
+    def _remove_point(self, property_id):
+        point = self.points.get(property_id)
+        if point is None:
+            return
+        x, y, status = point
+        for level in self.levels:
+            level.add(x, y, property_id, status, sign=-1)
+        finest = self.levels[-1]
+        key = finest.key(x, y)
+        i = bisect_left(self.point_keys, key)
+        while self.point_ids[i] != property_id:
+            i += 1
+        del self.point_keys[i]
+        del self.point_ids[i]
+
+    def _add_point(self, property_id, point):
+        if point is None:
+            return
+        x, y, status = point
+        for level in self.levels:
+            level.add(x, y, property_id, status)
+        key = self.levels[-1].key(x, y)
+        i = bisect_right(self.point_keys, key)
+        self.point_keys.insert(i, key)
+        self.point_ids.insert(i, property_id)
+
+    def upsert(self, property_id, point):
+        """Recoloca o imóvel com a nova posição/status"""
+        if property_id in self.points:
+            if self.points[property_id] == point:
+                return
+            self._remove_point(property_id)
+        self.points[property_id] = point
+        self._add_point(property_id, point)
+
+    def remove(self, property_id):
+        """Retira um imóvel excluído"""
+        if property_id in self.points:
+            self._remove_point(property_id)
+            del self.points[property_id]
+
+    # --- Consulta -----------------------------------------------------------------
+
+    def _window(self, bits, bbox, margin):
+        min_lng, min_lat, max_lng, max_lat = bbox
+        x0, y0 = _project(min_lng, max_lat)
+        x1, y1 = _project(max_lng, min_lat)
+        cx0, cy0 = _cell(bits, x0, y0)
+        cx1, cy1 = _cell(bits, x1, y1)
+        size = 1 << bits
+        return (x0, y0, x1, y1), (max(cx0 - margin, 0), max(cy0 - margin, 0),
+                                  min(cx1 + margin, size - 1), min(cy1 + margin, size - 1))
+
+    def _single(self, property_id):
+        x, y, status = self.points[property_id]
+        lng, lat = mvt.tile_fraction_to_lnglat(x, y, 0)
+        return {
+            'cluster': False,
+            'id': property_id,
+            'count': 1,
+            'latitude': lat,
+            'longitude': lng,
+            'status': PROPERTY_STATUSES[status] if status is not None else None
+        }
+
+    def _points_in(self, bbox):
+        finest = self.levels[-1].bits
+        (x0, y0, x1, y1), window = self._window(finest, bbox, margin=0)
+        results = []
+        for i in _key_ranges(self.point_keys, finest, *window):
+            property_id = self.point_ids[i]
+            x, y, _ = self.points[property_id]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                results.append(self._single(property_id))
+                if len(results) >= MAX_POINTS:
+                    break
+        return results
+
+    def query(self, bbox, zoom):
+        """Clusters e imóveis isolados visíveis no retângulo, no zoom informado"""
+        if zoom > MAX_CLUSTER_ZOOM:
+            return self._points_in(bbox)
+
+        level = self.levels[zoom]
+        width = len(PROPERTY_STATUSES)
+        mask = (1 << level.bits) - 1
+        # Uma célula de margem: clusters da borda se formam igual nos dois lados
+        (x0, y0, x1, y1), window = self._window(level.bits, bbox, margin=1)
+
+        cells = []
+        for i in _key_ranges(level.keys, level.bits, *window):
+            count = level.counts[i]
+            cells.append([
+                level.keys[i], count, level.sum_x[i], level.sum_y[i], level.sum_ids[i],
+                list(level.statuses[i * width:(i + 1) * width])
+            ])
+        position = {cell[0]: index for index, cell in enumerate(cells)}
+
+        radius = 1.0 / (1 << level.bits)
+        merged = [False] * len(cells)
+        results = []
+        for index in sorted(range(len(cells)), key=lambda i: (-cells[i][1], cells[i][0])):
+            if merged[index]:
+                continue
+            merged[index] = True
+            key, count, sum_x, sum_y, sum_ids, statuses = cells[index]
+            center_x, center_y = sum_x / count, sum_y / count
+            cx, cy = key >> level.bits, key & mask
+
+            # Une as células vizinhas cujo centroide está a menos de um raio
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    neighbour = position.get(((cx + dx) << level.bits) | (cy + dy)) \
+                        if 0 <= cx + dx <= mask and 0 <= cy + dy <= mask else None
+                    if neighbour is None or merged[neighbour]:
+                        continue
+                    other = cells[neighbour]
+                    distance_x = other[2] / other[1] - center_x
+                    distance_y = other[3] / other[1] - center_y
+                    if distance_x * distance_x + distance_y * distance_y <= radius * radius:
+                        merged[neighbour] = True
+                        count += other[1]
+                        sum_x += other[2]
+                        sum_y += other[3]
+                        sum_ids += other[4]
+                        statuses = [a + b for a, b in zip(statuses, other[5])]
+
+            center_x, center_y = sum_x / count, sum_y / count
+            if not (x0 <= center_x <= x1 and y0 <= center_y <= y1):
+                continue
+            if count == 1:
+                results.append(self._single(sum_ids))
+                continue
+            lng, lat = mvt.tile_fraction_to_lnglat(center_x, center_y, 0)
+            results.append({
+                'cluster': True,
+                'count': count,
+                'latitude': lat,
+                'longitude': lng,
+                'statuses': {status: statuses[i] for i, status in enumerate(PROPERTY_STATUSES) if statuses[i]}
+            })
+        return results
+
+
+def _read_points(where=None):
+    """Posições projetadas dos imóveis: id -> (x, y, status) ou None"""
+    table = Property.__table__
+    statement = select(table.c.id, table.c.geometry, table.c.regularization_status)
+    if where is not None:
+        statement = statement.where(where)
+    points = {}
+    for property_id, geometry, status in db.session.execute(statement.execution_options(yield_per=5000)):
+        geometry = wkb.decode(geometry)
+        if geometry:
+            x, y = _project(*geometry['coordinates'])
+            points[property_id] = (x, y, STATUS_INDEX.get(status))
+        else:
+            points[property_id] = None
+    return points
+
+
+def build_index(version=None):
+    # A versão é lida antes dos pontos: uma alteração confirmada no meio da
+    # leitura é reaplicada na próxima atualização
+    version = property_changes.current_version() if version is None else version
+    return ClusterIndex(version, _read_points())
+
+
+def _refresh(index, version):
+    """Aplica as alterações das versões posteriores à do índice; False se precisar reconstruir"""
+    property_ids = property_changes.changed_since(index.version, version)
+    if property_ids is None or len(property_ids) > MAX_REFRESH_CHANGES:
+        return False
+    changed = _read_points(Property.__table__.c.id.in_(property_ids)) if property_ids else {}
+    for property_id in property_ids:
+        if property_id in changed:
+            index.upsert(property_id, changed[property_id])
+        else:
+            index.remove(property_id)
+    index.version = version
+    return True
+
+
+def cluster_index():
+    """Índice do processo atual, atualizado com as alterações da tabela (chamar com _lock)"""
+    version = property_changes.current_version()
+    index = current_app.extensions.get('cluster_index')
+    if index is None or (index.version != version and not _refresh(index, version)):
+        index = build_index(version)
+        current_app.extensions['cluster_index'] = index
+    return index
+
+
+def clusters(bbox, zoom):
+    """Clusters visíveis no retângulo; o índice é atualizado antes da consulta"""
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f'zoom deve estar entre 0 e {MAX_ZOOM}')
+    with _lock:
+        return cluster_index().query(bbox, zoom)
+
+
+def init_app(app):
+    """O índice é montado na primeira consulta"""
+    app.extensions['cluster_index'] = None
@@ -0,0 +1,46 @@
+"""Coordenadas dos imóveis nas listagens e no detalhe (``include_geometry``).
+
+* PostgreSQL/PostGIS: ``ST_X``/``ST_Y`` do ponto e ``ST_AsGeoJSON`` do
+  polígono são projetados como colunas na mesma consulta dos imóveis
+  (atributos ``query_expression`` de ``Property``), sem carregar as colunas
+  de geometria;
+* demais bancos: as geometrias (EWKB) carregadas com os imóveis são
+  decodificadas em lote por ``wkb.decode_points``.
+"""
+from sqlalchemy import func
+from sqlalchemy.orm import defer, with_expression
+
+from src.models import db
+from src.models.property import Property
+from src.services import wkb
+
+
+def with_coordinates(query):
+    """Acrescenta à consulta de imóveis a projeção das coordenadas (PostGIS)"""
+    if db.engine.dialect.name != 'postgresql':
+        return query
+    return query.options(
+        defer(Property.geometry),
+        defer(Property.polygon_geometry),
+        with_expression(Property.longitude, func.ST_X(Property.geometry)),
+        with_expression(Property.latitude, func.ST_Y(Property.geometry)),
+        with_expression(Property.polygon_geojson, func.ST_AsGeoJSON(Property.polygon_geometry))
+    )
+
+
+def load_coordinates(properties):
+    """Preenche em lote as coordenadas dos imóveis carregados sem a projeção"""
+    pending = [prop for prop in properties if 'longitude' not in prop.__dict__]
+    if not pending:
+        return properties
+
+    points = wkb.decode_points([prop.geometry for prop in pending])
+    for prop, point in zip(pending, points):
+        # Atributos só de leitura: gravados direto no estado carregado do objeto,
+        # como faria set_committed_value, sem o custo da instrumentação por chamada
+        prop.__dict__.update(
+            longitude=point[0] if point else None,
+            latitude=point[1] if point else None,
+            polygon_geojson=wkb.decode(prop.polygon_geometry)
+        )
+    return properties
@@ -0,0 +1,175 @@
+"""Contadores do dashboard mantidos incrementalmente.
+
+Cada escrita em imóveis, registros de etapas, documentos e usuários ajusta os
+contadores da tabela ``dashboard_counters`` na mesma transação (evento
+``after_flush`` da sessão), de modo que a visão geral do dashboard é respondida
+com uma única leitura pela chave primária em vez de onze ``COUNT(*)``.
+"""
+from collections import Counter
+
+import click
+from sqlalchemy import event, func, inspect
+
+from src.models import db
+from src.models.dashboard_counter import DashboardCounter
+from src.models.document import Document
+from src.models.property import Property
+from src.models.step_record import StepRecord
+from src.models.user import User
+
+PROPERTY_STATUSES = ['pending', 'in_progress', 'municipal_registered', 'registry_completed']
+STEP_STATUSES = ['not_started', 'in_progress', 'completed', 'blocked']
+
+_listener_registered = False
+
+
+def counter_names():
+    """Lista de todos os contadores conhecidos"""
+    names = ['properties.total', 'step_records.total', 'documents.total', 'users.active']
+    names += [f'properties.status.{status}' for status in PROPERTY_STATUSES]
+    names += [f'step_records.status.{status}' for status in STEP_STATUSES]
+    return names
+
+
+def _object_deltas(obj, sign):
+    """Contadores afetados pela inserção (sign=1) ou exclusão (sign=-1) de um objeto"""
+    deltas = Counter()
+    if isinstance(obj, Property):
+        deltas['properties.total'] += sign
+        deltas[f'properties.status.{obj.regularization_status or "pending"}'] += sign
+    elif isinstance(obj, StepRecord):
+        deltas['step_records.total'] += sign
+        deltas[f'step_records.status.{obj.status or "not_started"}'] += sign
+    elif isinstance(obj, Document):
+        deltas['documents.total'] += sign
+    elif isinstance(obj, User):
+        if obj.active is None or obj.active:
+            deltas['users.active'] += sign
+    return deltas
+
+
+def _history_deltas(obj, attribute, key_for):
+    """Contadores afetados pela alteração de um atributo de um objeto existente"""
+    deltas = Counter()
+    history = inspect(obj).attrs[attribute].history
+    if not history.has_changes():
+        return deltas
+    for old_value in history.deleted:
+        key = key_for(old_value)
+        if key:
+            deltas[key] -= 1
+    for new_value in history.added:
+        key = key_for(new_value)
+        if key:
+            deltas[key] += 1
+    return deltas
+
+
+def _dirty_deltas(obj):
+    if isinstance(obj, Property):
+        return _history_deltas(obj, 'regularization_status', lambda v: f'properties.status.{v}' if v else None)
+    if isinstance(obj, StepRecord):
+        return _history_deltas(obj, 'status', lambda v: f'step_records.status.{v}' if v else None)
+    if isinstance(obj, User):
+        return _history_deltas(obj, 'active', lambda v: 'users.active' if v else None)
+    return Counter()
+
+
+def apply_deltas(connection, deltas):
+    """Aplica os deltas com ``UPDATE ... SET value = value + :delta``.
+
+    Contadores ainda não inicializados são ignorados; serão calculados pela
+    reconciliação na primeira leitura.
+    """
+    table = DashboardCounter.__table__
+    for name, delta in deltas.items():
+        if delta:
+            connection.execute(
+                table.update()
+                .where(table.c.name == name)
+                .values(value=table.c.value + delta, updated_at=func.current_timestamp())
+            )
+
+
+def _after_flush(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        deltas.update(_object_deltas(obj, 1))
+    for obj in session.deleted:
+        deltas.update(_object_deltas(obj, -1))
+    for obj in session.dirty:
+        if obj not in session.deleted:
+            deltas.update(_dirty_deltas(obj))
+
+    if any(deltas.values()):
+        apply_deltas(session.connection(), deltas)
+
+
+def compute_counters():
+    """Calcula todos os contadores a partir das tabelas de origem"""
+    values = dict.fromkeys(counter_names(), 0)
+
+    for status, count in db.session.query(
+        Property.regularization_status, func.count(Property.id)
+    ).group_by(Property.regularization_status):
+        key = f'properties.status.{status or "pending"}'
+        values['properties.total'] += count
+        values[key] = values.get(key, 0) + count
+
+    for status, count in db.session.query(
+        StepRecord.status, func.count(StepRecord.id)
+    ).group_by(StepRecord.status):
+        key = f'step_records.status.{status or "not_started"}'
+        values['step_records.total'] += count
+        values[key] = values.get(key, 0) + count
+
+    values['documents.total'] = db.session.query(func.count(Document.id)).scalar() or 0
+    values['users.active'] = db.session.query(func.count(User.id)).filter(User.active == True).scalar() or 0
+
+    return values
+
+
+def rebuild_counters():
+    """Reconstrói a tabela de contadores do zero (não faz commit)"""
+    values = compute_counters()
+    table = DashboardCounter.__table__
+    connection = db.session.connection()
+    connection.execute(table.delete())
+    connection.execute(
+        table.insert(),
+        [{'name': name, 'value': value} for name, value in values.items()]
+    )
+    return values
+
+
+def get_counters():
+    """Lê todos os contadores em uma única consulta, reconstruindo-os se vazios"""
+    rows = db.session.query(DashboardCounter.name, DashboardCounter.value).all()
+    if not rows:
+        # A reconstrução escreve: nunca em uma réplica
+        db.session().use_primary()
+        values = rebuild_counters()
+        db.session.commit()
+        return values
+
+    values = dict.fromkeys(counter_names(), 0)
+    values.update({name: value for name, value in rows})
+    return values
+
+
+@click.command('rebuild-counters')
+def rebuild_counters_command():
+    """Reconstrói os contadores do dashboard a partir das tabelas."""
+    values = rebuild_counters()
+    db.session.commit()
+    for name in sorted(values):
+        click.echo(f'{name}: {values[name]}')
+
+
+def init_app(app):
+    """Registra o listener de manutenção dos contadores e o comando de reconciliação"""
+    global _listener_registered
+    if not _listener_registered:
+        event.listen(db.session, 'after_flush', _after_flush)
+        _listener_registered = True
+    app.cli.add_command(rebuild_counters_command)
@@ -0,0 +1,326 @@
+"""Pool de conexões, timeouts de instrução e métricas do banco.
+
+* ``configure(app)`` monta ``SQLALCHEMY_ENGINE_OPTIONS`` a partir das
+  variáveis ``DB_POOL_*`` (tamanho, overflow, espera, reciclagem e
+  pre-ping) antes da criação do engine;
+* timeouts por instrução resolvidos pelo endpoint da requisição
+  (``DB_STATEMENT_TIMEOUTS``: ``blueprint`` ou ``blueprint.função``, em ms):
+  ``SET statement_timeout`` na retirada da conexão no PostgreSQL e um
+  progress handler que interrompe a instrução no SQLite;
+* métricas do pool por processo (conexões em uso, overflow, tempo de espera,
+  esgotamentos e instruções canceladas), expostas em ``/api/admin/db-pool``;
+* ``flask --app src.main init-db``: criação explícita do schema e do diretório
+  de uploads (a aplicação não faz DDL ao iniciar);
+* ``flask --app src.main check-indexes``: compara os índices do banco com os
+  declarados nos modelos (bancos criados por versões anteriores ou por
+  ``create_all`` sobre tabelas já existentes não recebem índices novos).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import click
+from flask import current_app, has_request_context, request
+from sqlalchemy import event, exc, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from src.models import db
+from src.services import search, storage
+
+# Instruções da VM do SQLite entre verificações do prazo
+SQLITE_PROGRESS_STEPS = 10000
+
+# SQLSTATE query_canceled (statement_timeout do PostgreSQL)
+PG_QUERY_CANCELED = '57014'
+
+
+class PoolMetrics:
+    """Contadores do pool de um engine (por processo)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.statement_timeouts = 0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def increment(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'wait_ms_total': round(self.wait_total * 1000, 3),
+                'wait_ms_avg': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_ms_max': round(self.wait_max * 1000, 3),
+                'pool_timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidated': self.invalidated,
+                'statement_timeouts': self.statement_timeouts
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool que mede o tempo de espera para obter uma conexão"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(config):
+    """Opções do engine a partir de DB_POOL_* (bancos SQLite em memória ficam com StaticPool)"""
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+
+    options.setdefault('poolclass', MeteredQueuePool)
+    options.setdefault('pool_size', config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+    options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+    return options
+
+
+def configure(app):
+    """Define SQLALCHEMY_ENGINE_OPTIONS (chamar antes de db.init_app)"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+
+def statement_timeout(config):
+    """Timeout (ms) do endpoint atual: função, blueprint ou padrão; 0 = sem limite"""
+    timeouts = config['DB_STATEMENT_TIMEOUTS']
+    if has_request_context() and request.endpoint:
+        if request.endpoint in timeouts:
+            return timeouts[request.endpoint]
+        if request.blueprint in timeouts:
+            return timeouts[request.blueprint]
+    return config['DB_STATEMENT_TIMEOUT']
+
+
+def pool_status(engine):
+    """Estado atual do pool e métricas acumuladas do engine"""
+    pool = engine.pool
+    status = {
+        'dialect': engine.dialect.name,
+        'pool_class': type(pool).__name__
+    }
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'timeout_s': pool.timeout(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0)
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        status.update(metrics.to_dict())
+    return status
+
+
+def _metrics(engine):
+    return getattr(engine.pool, 'metrics', None)
+
+
+def _register(app, engine):
+    config = app.config
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        metrics = _metrics(engine)
+        if metrics is not None:
+            metrics.increment('connects')
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            # Prazo da instrução em andamento, verificado pelo SQLite a cada N passos
+            state = connection_record.info['statement_deadline'] = [None]
+            dbapi_connection.set_progress_handler(
+                lambda: 1 if state[0] is not None and time.perf_counter() > state[0] else 0,
+                SQLITE_PROGRESS_STEPS
+            )
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        milliseconds = statement_timeout(config)
+        connection_record.info['statement_timeout'] = milliseconds
+        if engine.dialect.name == 'postgresql':
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f'SET statement_timeout = {int(milliseconds)}')
+            finally:
+                cursor.close()
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics = _metrics(engine)
+        if metrics is not None:
+            metrics.increment('invalidated')
+
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_deadline(conn, cursor, statement, parameters, context, executemany):
+            state = conn.info.get('statement_deadline')
+            milliseconds = conn.info.get('statement_timeout')
+            if state is not None:
+                state[0] = time.perf_counter() + milliseconds / 1000 if milliseconds else None
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def clear_deadline(conn, cursor, statement, parameters, context, executemany):
+            state = conn.info.get('statement_deadline')
+            if state is not None:
+                state[0] = None
+
+    @event.listens_for(engine, 'handle_error')
+    def on_error(context):
+        original = context.original_exception
+        canceled = getattr(original, 'pgcode', None) == PG_QUERY_CANCELED or \
+            getattr(getattr(original, 'diag', None), 'sqlstate', None) == PG_QUERY_CANCELED or \
+            (isinstance(original, sqlite3.OperationalError) and str(original) == 'interrupted')
+        if canceled:
+            metrics = _metrics(engine)
+            if metrics is not None:
+                metrics.increment('statement_timeouts')
+            state = context.connection.info.get('statement_deadline') if context.connection is not None else None
+            if state is not None:
+                state[0] = None
+
+
+def init_db():
+    """Cria as tabelas ausentes (apenas no primário; réplicas recebem o schema pela replicação)"""
+    db.create_all(bind_key=None)
+    os.makedirs(os.path.join(storage.storage_root(), 'tmp'), exist_ok=True)
+
+
+@click.command('init-db')
+def init_db_command():
+    """Cria as tabelas e o diretório de uploads."""
+    init_db()
+    click.echo(f"Schema criado em {db.engine.url.render_as_string(hide_password=True)}")
+    click.echo(f"Uploads em {os.path.abspath(current_app.config['UPLOAD_FOLDER'])}")
+
+
+def declared_indexes(dialect_name):
+    """{(tabela, índice): colunas} declarados para o dialeto (None = expressão)
+
+    Índices GIST/GIN só existem no PostgreSQL; no SQLite as consultas espaciais
+    usam a R-tree em memória e a busca usa a tabela FTS5.
+    """
+    declared = {}
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.dialect_options['postgresql']['using'] and dialect_name != 'postgresql':
+                continue
+            declared[(table.name, index.name)] = [getattr(expression, 'name', None) for expression in index.expressions]
+    if dialect_name == 'postgresql':
+        for name in search.PG_SEARCH_INDEXES:
+            declared[('properties', name)] = [None]
+    return declared
+
+
+def live_indexes(connection):
+    """{(tabela, índice): colunas} existentes no banco (sem os criados por constraints)"""
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    live = {}
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        for index in inspector.get_indexes(table.name):
+            if index.get('duplicates_constraint') or index['name'] is None:
+                continue
+            live[(table.name, index['name'])] = list(index['column_names'])
+    return live
+
+
+def diff_indexes(connection):
+    """Índices faltando, sobrando e com colunas diferentes em relação aos modelos"""
+    declared = declared_indexes(connection.dialect.name)
+    live = live_indexes(connection)
+    different = []
+    for key in sorted(declared.keys() & live.keys()):
+        # Índices de expressão são comparados apenas pelo nome
+        if None not in declared[key] and declared[key] != live[key]:
+            different.append((key, declared[key], live[key]))
+    return {
+        'missing': sorted(declared.keys() - live.keys()),
+        'extra': sorted(live.keys() - declared.keys()),
+        'different': different
+    }
+
+
+def create_missing_indexes(connection, missing):
+    """Cria os índices declarados que faltam no banco (não faz commit)"""
+    indexes = {(table.name, index.name): index for table in db.metadata.sorted_tables for index in table.indexes}
+    for key in missing:
+        if key in indexes:
+            indexes[key].create(connection)
+    if any(name in search.PG_SEARCH_INDEXES for _, name in missing):
+        search.rebuild_search_index()
+
+
+@click.command('check-indexes')
+@click.option('--create-missing', is_flag=True, help='Cria os índices declarados que faltam.')
+@click.option('--drop-extra', is_flag=True, help='Remove os índices que não estão declarados nos modelos.')
+def check_indexes_command(create_missing, drop_extra):
+    """Compara os índices do banco com os declarados nos modelos."""
+    connection = db.session.connection()
+    diff = diff_indexes(connection)
+    for table, name in diff['missing']:
+        click.echo(f'faltando: {table}.{name}')
+    for table, name in diff['extra']:
+        click.echo(f'não declarado: {table}.{name}')
+    for (table, name), declared, live in diff['different']:
+        click.echo(f'diferente: {table}.{name} declarado ({", ".join(declared)}), banco ({", ".join(live)})')
+
+    if create_missing and diff['missing']:
+        create_missing_indexes(connection, diff['missing'])
+        click.echo(f"{len(diff['missing'])} índices criados")
+    if drop_extra and diff['extra']:
+        preparer = connection.dialect.identifier_preparer
+        for _, name in diff['extra']:
+            connection.execute(text(f'DROP INDEX {preparer.quote(name)}'))
+        click.echo(f"{len(diff['extra'])} índices removidos")
+    db.session.commit()
+
+    remaining = (not create_missing and diff['missing']) or (not drop_extra and diff['extra']) or diff['different']
+    if remaining:
+        raise click.exceptions.Exit(1)
+    click.echo('Índices de acordo com os modelos')
+
+
+def init_app(app):
+    """Registra timeouts e métricas em todos os engines da aplicação e os comandos de schema"""
+    with app.app_context():
+        for engine in db.engines.values():
+            _register(app, engine)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(check_indexes_command)
@@ -0,0 +1,224 @@
+"""Exportação de imóveis com o resumo de progresso das etapas.
+
+As linhas são lidas com ``yield_per`` (cursor do lado do servidor no
+PostgreSQL) e convertidas em blocos por geradores, de modo que a memória
+usada não depende do número de imóveis. O progresso de cada imóvel vem de
+um ``LEFT JOIN`` com a agregação dos registros de etapas, na mesma consulta.
+
+O XLSX é montado diretamente como um ZIP em fluxo (``zipfile`` da
+biblioteca padrão, células com texto inline), sem dependências adicionais.
+"""
+import csv
+import io
+import json
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from geoalchemy2.functions import ST_AsGeoJSON
+from sqlalchemy import case, func, select
+
+from src.models.property import Property
+from src.models.step_record import StepRecord
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'geojson': ('application/geo+json', 'geojson'),
+}
+
+PROPERTY_COLUMNS = [
+    'id', 'municipal_code', 'registry_number', 'address_street', 'address_number',
+    'address_neighborhood', 'address_city', 'address_zipcode', 'area_total', 'area_built',
+    'property_type', 'current_use', 'current_owner', 'regularization_status', 'description',
+    'created_at', 'updated_at'
+]
+PROGRESS_COLUMNS = ['total_steps', 'completed_steps', 'in_progress_steps', 'blocked_steps', 'completion_percentage']
+# Mesmos nomes de colunas aceitos pela importação (POST /api/properties/import)
+EXPORT_COLUMNS = PROPERTY_COLUMNS + ['latitude', 'longitude'] + PROGRESS_COLUMNS
+
+BATCH_SIZE = 1000
+XLSX_MAX_ROWS = 1048576
+
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def progress_subquery():
+    """Resumo das etapas por imóvel (uma agregação para todos os imóveis)"""
+    def count_status(status):
+        return func.sum(case((StepRecord.status == status, 1), else_=0))
+
+    return select(
+        StepRecord.property_id,
+        func.count(StepRecord.id).label('total_steps'),
+        count_status('completed').label('completed_steps'),
+        count_status('in_progress').label('in_progress_steps'),
+        count_status('blocked').label('blocked_steps')
+    ).group_by(StepRecord.property_id).subquery()
+
+
+def export_query(query):
+    """Colunas da exportação sobre a query de imóveis já filtrada"""
+    progress = progress_subquery()
+    geometry = func.coalesce(ST_AsGeoJSON(Property.geometry), ST_AsGeoJSON(Property.polygon_geometry))
+    return query.with_entities(
+        *[getattr(Property, name) for name in PROPERTY_COLUMNS],
+        geometry.label('geometry_geojson'),
+        func.coalesce(progress.c.total_steps, 0).label('total_steps'),
+        func.coalesce(progress.c.completed_steps, 0).label('completed_steps'),
+        func.coalesce(progress.c.in_progress_steps, 0).label('in_progress_steps'),
+        func.coalesce(progress.c.blocked_steps, 0).label('blocked_steps')
+    ).outerjoin(progress, progress.c.property_id == Property.id)
+
+
+def iter_records(query):
+    """Gera (registro, geometria GeoJSON) lendo a query em lotes"""
+    for row in query.yield_per(BATCH_SIZE):
+        record = {name: getattr(row, name) for name in PROPERTY_COLUMNS}
+        geometry = json.loads(row.geometry_geojson) if row.geometry_geojson else None
+
+        coordinates = geometry.get('coordinates') if geometry and geometry.get('type') == 'Point' else None
+        record['longitude'], record['latitude'] = coordinates[:2] if coordinates else (None, None)
+
+        for name in PROGRESS_COLUMNS[:-1]:
+            record[name] = int(getattr(row, name) or 0)
+        total = record['total_steps']
+        record['completion_percentage'] = round(record['completed_steps'] / total * 100, 2) if total else 0
+        yield record, geometry
+
+
+def _plain(value):
+    """Valor serializável (datas em ISO 8601, decimais como float)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def generate_csv(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que o Excel reconheça o UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    for index, (record, _) in enumerate(records, start=1):
+        writer.writerow([_plain(record[name]) for name in EXPORT_COLUMNS])
+        if index % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_geojson(records):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for record, geometry in records:
+        properties = {name: _plain(record[name]) for name in EXPORT_COLUMNS if name not in ('latitude', 'longitude')}
+        feature = {'type': 'Feature', 'id': record['id'], 'geometry': geometry, 'properties': properties}
+        yield separator + json.dumps(feature, ensure_ascii=False)
+        separator = ',\n'
+    yield ']}\n'
+
+
+class _ChunkBuffer:
+    """Destino sem seek para o ZipFile; os bytes escritos são drenados pelo gerador"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Imóveis" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value):
+    value = _plain(value)
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def generate_xlsx(records):
+    """Planilha XLSX em fluxo (limitada às 1.048.576 linhas do Excel)"""
+    output = _ChunkBuffer()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        yield output.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(EXPORT_COLUMNS).encode('utf-8'))
+            for index, (record, _) in enumerate(records, start=2):
+                if index > XLSX_MAX_ROWS:
+                    break
+                sheet.write(_xlsx_row(record[name] for name in EXPORT_COLUMNS).encode('utf-8'))
+                if index % BATCH_SIZE == 0:
+                    yield output.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield output.drain()
+
+
+GENERATORS = {'csv': generate_csv, 'xlsx': generate_xlsx, 'geojson': generate_geojson}
+
+
+def generate_export(query, file_format):
+    """Gerador com o conteúdo do arquivo no formato pedido"""
+    return GENERATORS[file_format](iter_records(export_query(query)))
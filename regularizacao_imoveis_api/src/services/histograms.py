@@ -0,0 +1,108 @@
+"""Histograma de faixas fixas para durações de etapas, em dias.
+
+As faixas são exatas de 0 a 30 dias e crescem 8% a cada faixa até 10 anos
+(erro relativo de no máximo ~4% nos percentis), com uma faixa final para o
+que passar disso. Como as faixas são as mesmas para todas as chaves, dois
+histogramas se combinam somando as contagens: o agregado por mês, etapa e
+bairro responde a qualquer período e filtro sem reler ``step_records``.
+"""
+from bisect import bisect_left
+from math import ceil
+
+EXACT_DAYS = 30
+GROWTH = 1.08
+MAX_DAYS = 3650
+PERCENTILES = [50, 90, 99]
+
+
+def _bounds():
+    bounds = list(range(EXACT_DAYS + 1))
+    while bounds[-1] < MAX_DAYS:
+        bounds.append(max(bounds[-1] + 1, ceil(bounds[-1] * GROWTH)))
+    return bounds
+
+
+# Limite superior (inclusivo) de cada faixa; a faixa len(BOUNDS) é a final
+BOUNDS = _bounds()
+
+
+def bucket_of(days):
+    """Índice da faixa de uma duração em dias"""
+    return bisect_left(BOUNDS, max(days, 0))
+
+
+def bucket_range(bucket):
+    """Menor e maior duração (dias) da faixa; None no limite superior da faixa final"""
+    lower = BOUNDS[bucket - 1] + 1 if bucket else 0
+    upper = BOUNDS[bucket] if bucket < len(BOUNDS) else None
+    return lower, upper
+
+
+class DurationHistogram:
+    """Contagens e somas por faixa, com percentis interpolados"""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, bucket, records, total_days):
+        current = self.buckets.get(bucket, (0, 0))
+        self.buckets[bucket] = (current[0] + records, current[1] + total_days)
+
+    @property
+    def count(self):
+        return sum(records for records, _ in self.buckets.values())
+
+    def _ordered(self):
+        return [(bucket,) + self.buckets[bucket] for bucket in sorted(self.buckets) if self.buckets[bucket][0] > 0]
+
+    def _span(self, bucket, records, total_days):
+        lower, upper = bucket_range(bucket)
+        if upper is None:
+            # Faixa final: a média da faixa como limite superior
+            upper = max(lower, total_days / records)
+        return lower, upper
+
+    def quantile(self, fraction):
+        """Duração no quantil ``fraction`` (0..1), interpolada dentro da faixa"""
+        total = self.count
+        if not total:
+            return None
+        target = fraction * total
+        seen = 0
+        for bucket, records, total_days in self._ordered():
+            if seen + records >= target:
+                lower, upper = self._span(bucket, records, total_days)
+                position = (target - seen) / records
+                return lower + (upper - lower) * position
+            seen += records
+        return None
+
+    def count_above(self, days):
+        """Quantidade estimada de durações acima de ``days``"""
+        above = 0.0
+        for bucket, records, total_days in self._ordered():
+            lower, upper = self._span(bucket, records, total_days)
+            if lower > days:
+                above += records
+            elif upper > days:
+                above += records * (upper - days) / (upper - lower + 1)
+        return round(above)
+
+    def summary(self):
+        """Contagem, média exata, percentis e outliers (acima de p75 + 1,5 x IQR)"""
+        total = self.count
+        if not total:
+            return {'count': 0, 'mean_days': None, 'outliers': 0, 'outlier_threshold_days': None,
+                    **{f'p{p}_days': None for p in PERCENTILES}}
+
+        p25, p75 = self.quantile(0.25), self.quantile(0.75)
+        threshold = p75 + 1.5 * (p75 - p25)
+        result = {
+            'count': total,
+            'mean_days': round(sum(days for _, days in self.buckets.values()) / total, 1),
+            'outliers': self.count_above(threshold),
+            'outlier_threshold_days': round(threshold, 1)
+        }
+        for percentile in PERCENTILES:
+            result[f'p{percentile}_days'] = round(self.quantile(percentile / 100), 1)
+        return result
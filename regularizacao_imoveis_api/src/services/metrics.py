@@ -0,0 +1,244 @@
+"""Instrumentação de requisições e SQL, log de consultas lentas e métricas Prometheus.
+
+* hooks do Flask medem a latência de cada requisição por endpoint
+  (``blueprint.função``), método e status;
+* eventos ``before_cursor_execute``/``after_cursor_execute`` de todos os
+  engines (primário e réplicas) contam as instruções e somam o tempo de banco
+  da requisição em andamento;
+* instruções acima de ``SLOW_QUERY_MS`` vão para o logger
+  ``src.services.metrics.slow_queries`` (e para ``SLOW_QUERY_LOG``, se
+  configurado) como uma linha JSON com o SQL normalizado (literais e listas
+  de parâmetros trocados por ``?``) e o endpoint de origem;
+* ``GET /api/metrics`` expõe os histogramas, contadores e o estado dos pools
+  no formato texto do Prometheus.
+
+As métricas são por processo, como as de ``/api/admin/db-pool``: com vários
+workers, cada um responde com os próprios valores (use o rótulo ``pid`` para
+distingui-los). O custo por requisição é medido por
+``benchmarks/bench_metrics.py``; ``METRICS_ENABLED=false`` desliga a coleta.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+from src.models import db
+from src.services.database import pool_status
+
+# Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Limites do histograma de instruções SQL por requisição (N+1 aparece aqui)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+slow_query_logger = logging.getLogger(__name__ + '.slow_queries')
+
+_NORMALIZE_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|(?<![:\w]):\w+|\$\d+|\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?, ...)'),
+    (re.compile(r'(?:\(\?, \.\.\.\)\s*,\s*)+\(\?, \.\.\.\)'), '(?, ...), ...'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(statement):
+    """SQL sem literais, com listas de parâmetros colapsadas e espaços simples"""
+    for pattern, replacement in _NORMALIZE_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class Histogram:
+    """Histograma cumulativo com rótulos (contagens por limite, soma e total)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+
+class RequestMetrics:
+    """Métricas acumuladas pelo processo"""
+
+    def __init__(self, slow_query_ms=500, enabled=True):
+        self.enabled = enabled
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms else None
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.statements_per_request = Histogram(STATEMENT_BUCKETS)
+        self.db_statements = {}
+        self.db_seconds = {}
+        self.slow_queries = {}
+
+    def record_request(self, endpoint, method, status, seconds, statements, db_seconds):
+        with self.lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.observe((endpoint, method), seconds)
+            self.statements_per_request.observe((endpoint,), statements)
+            self.db_statements[endpoint] = self.db_statements.get(endpoint, 0) + statements
+            self.db_seconds[endpoint] = self.db_seconds.get(endpoint, 0.0) + db_seconds
+
+    def record_slow_query(self, endpoint, statement, seconds):
+        with self.lock:
+            self.slow_queries[endpoint] = self.slow_queries.get(endpoint, 0) + 1
+        slow_query_logger.warning(json.dumps({
+            'duration_ms': round(seconds * 1000, 3),
+            'endpoint': endpoint,
+            'statement': normalize_sql(statement)
+        }, ensure_ascii=False))
+
+    def render(self, engines):
+        """Texto no formato de exposição do Prometheus"""
+        pid = str(os.getpid())
+        lines = []
+
+        def metric(name, kind, description):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def sample(name, labels, value):
+            labels = {'pid': pid, **labels}
+            rendered = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+            lines.append(f'{name}{{{rendered}}} {_number(value)}')
+
+        def histogram(name, histogram, label_names):
+            for labels, (counts, total) in sorted(histogram.series.items()):
+                labels = dict(zip(label_names, labels))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    sample(f'{name}_bucket', {**labels, 'le': bound}, cumulative)
+                sample(f'{name}_sum', labels, total)
+                sample(f'{name}_count', labels, cumulative)
+
+        with self.lock:
+            metric('app_http_requests_total', 'counter', 'Requisições por endpoint, método e status')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                sample('app_http_requests_total', {'endpoint': endpoint, 'method': method, 'status': status}, count)
+
+            metric('app_http_request_duration_seconds', 'histogram', 'Latência das requisições por endpoint')
+            histogram('app_http_request_duration_seconds', self.latency, ('endpoint', 'method'))
+
+            metric('app_db_statements_per_request', 'histogram', 'Instruções SQL por requisição')
+            histogram('app_db_statements_per_request', self.statements_per_request, ('endpoint',))
+
+            metric('app_db_statements_total', 'counter', 'Instruções SQL executadas por endpoint')
+            for endpoint, count in sorted(self.db_statements.items()):
+                sample('app_db_statements_total', {'endpoint': endpoint}, count)
+
+            metric('app_db_duration_seconds_total', 'counter', 'Tempo total no banco por endpoint')
+            for endpoint, seconds in sorted(self.db_seconds.items()):
+                sample('app_db_duration_seconds_total', {'endpoint': endpoint}, seconds)
+
+            metric('app_db_slow_queries_total', 'counter', 'Instruções acima de SLOW_QUERY_MS por endpoint')
+            for endpoint, count in sorted(self.slow_queries.items()):
+                sample('app_db_slow_queries_total', {'endpoint': endpoint}, count)
+
+        pools = {key: pool_status(engine) for key, engine in engines.items()}
+        for name, field, kind, description, scale in (
+            ('app_db_pool_checked_out', 'checked_out', 'gauge', 'Conexões em uso', 1),
+            ('app_db_pool_overflow', 'overflow', 'gauge', 'Conexões além de pool_size', 1),
+            ('app_db_pool_checkouts_total', 'checkouts', 'counter', 'Conexões obtidas do pool', 1),
+            ('app_db_pool_wait_seconds_total', 'wait_ms_total', 'counter', 'Tempo esperando conexão livre', 0.001),
+            ('app_db_pool_timeouts_total', 'pool_timeouts', 'counter', 'Esperas que esgotaram DB_POOL_TIMEOUT', 1),
+            ('app_db_statement_timeouts_total', 'statement_timeouts', 'counter', 'Instruções canceladas pelo timeout', 1),
+        ):
+            values = [(key, status[field]) for key, status in pools.items() if field in status]
+            if values:
+                metric(name, kind, description)
+                for key, value in values:
+                    sample(name, {'engine': key}, value * scale)
+
+        metric('app_process_start_time_seconds', 'gauge', 'Início do processo (epoch)')
+        sample('app_process_start_time_seconds', {}, self.started)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _before_request():
+    if current_app.extensions['metrics'].enabled:
+        g.metrics_started = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_db_seconds = 0.0
+
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        current_app.extensions['metrics'].record_request(
+            _endpoint(), request.method, str(response.status_code),
+            time.perf_counter() - started, g.metrics_statements, g.metrics_db_seconds
+        )
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'metrics_started', None)
+    if started is None or not has_app_context():
+        return
+    elapsed = time.perf_counter() - started
+    if 'metrics_started' in g:
+        g.metrics_statements += 1
+        g.metrics_db_seconds += elapsed
+    metrics = current_app.extensions['metrics']
+    if metrics.enabled and metrics.slow_query_seconds is not None and elapsed >= metrics.slow_query_seconds:
+        metrics.record_slow_query(_endpoint() if has_request_context() else 'cli', statement, elapsed)
+
+
+def init_app(app):
+    """Registra os hooks de requisição e de SQL e o log de consultas lentas"""
+    metrics = RequestMetrics(
+        slow_query_ms=app.config['SLOW_QUERY_MS'],
+        enabled=app.config['METRICS_ENABLED']
+    )
+    app.extensions['metrics'] = metrics
+
+    if app.config['SLOW_QUERY_LOG'] and not slow_query_logger.handlers:
+        handler = logging.FileHandler(app.config['SLOW_QUERY_LOG'], encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_query_logger.addHandler(handler)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
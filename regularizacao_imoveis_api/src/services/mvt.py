@@ -0,0 +1,179 @@
+"""Codificação de Mapbox Vector Tiles (especificação 2.1) em Python puro.
+
+Usada quando o banco não tem ``ST_AsMVT``. Implementa apenas o necessário
+para as camadas de imóveis: pontos e polígonos, atributos texto, projeção
+Web Mercator e a escrita direta do protobuf (sem dependências).
+"""
+import math
+
+EXTENT = 4096
+BUFFER = 64
+
+POINT = 1
+POLYGON = 3
+
+MOVE_TO = 1
+LINE_TO = 2
+CLOSE_PATH = 7
+
+
+# --- Projeção -----------------------------------------------------------------
+
+def tile_bounds(z, x, y, buffer=0):
+    """Retângulo (min_lng, min_lat, max_lng, max_lat) do tile, com margem em unidades do tile"""
+    n = 2 ** z
+    margin = buffer / EXTENT
+
+    def lng(tile_x):
+        return tile_x / n * 360.0 - 180.0
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lng(x - margin), lat(y + 1 + margin), lng(x + 1 + margin), lat(y - margin)
+
+
+def lnglat_to_tile_fraction(lng, lat, z):
+    """Posição fracionária (x, y) do ponto na grade de tiles do zoom z"""
+    n = 2 ** z
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = (lng + 180.0) / 360.0 * n
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return x, y
+
+
+def tile_fraction_to_lnglat(x, y, z):
+    """Inverso de ``lnglat_to_tile_fraction``: (lng, lat) da posição na grade do zoom z"""
+    n = 2 ** z
+    return x / n * 360.0 - 180.0, math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def tiles_covering(bounds, z, buffer=0):
+    """Tiles (x, y) do zoom z que contêm o retângulo, incluindo a margem dos vizinhos"""
+    min_lng, min_lat, max_lng, max_lat = bounds
+    margin = buffer / EXTENT
+    n = 2 ** z
+    min_x, min_y = lnglat_to_tile_fraction(min_lng, max_lat, z)
+    max_x, max_y = lnglat_to_tile_fraction(max_lng, min_lat, z)
+    x_range = range(max(int(math.floor(min_x - margin)), 0), min(int(math.floor(max_x + margin)), n - 1) + 1)
+    y_range = range(max(int(math.floor(min_y - margin)), 0), min(int(math.floor(max_y + margin)), n - 1) + 1)
+    return [(tile_x, tile_y) for tile_x in x_range for tile_y in y_range]
+
+
+# --- Geometria ------------------------------------------------------------------
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def _to_tile(coordinates, z, x, y):
+    points = []
+    for lng, lat in coordinates:
+        tile_x, tile_y = lnglat_to_tile_fraction(lng, lat, z)
+        point = (int(round((tile_x - x) * EXTENT)), int(round((tile_y - y) * EXTENT)))
+        if not points or points[-1] != point:
+            points.append(point)
+    return points
+
+
+def _ring_area(ring):
+    """Fórmula do agrimensor (positiva = horária com y para baixo)"""
+    return sum(ring[i][0] * ring[i + 1][1] - ring[i + 1][0] * ring[i][1] for i in range(len(ring) - 1)) + \
+        ring[-1][0] * ring[0][1] - ring[0][0] * ring[-1][1]
+
+
+def encode_point(lng, lat, z, x, y):
+    """Comandos do ponto, ou None se estiver fora do tile e da margem"""
+    (px, py), = _to_tile([(lng, lat)], z, x, y)
+    if not (-BUFFER <= px <= EXTENT + BUFFER and -BUFFER <= py <= EXTENT + BUFFER):
+        return None
+    return [_command(MOVE_TO, 1), _zigzag(px), _zigzag(py)]
+
+
+def encode_polygon(rings, z, x, y):
+    """Comandos do polígono (anel externo horário, internos anti-horários) ou None se degenerado"""
+    commands = []
+    cursor_x = cursor_y = 0
+    for index, coordinates in enumerate(rings):
+        ring = _to_tile(coordinates, z, x, y)
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring = ring[:-1]
+        if len(ring) < 3:
+            if index == 0:
+                return None
+            continue
+
+        area = _ring_area(ring)
+        if area == 0:
+            if index == 0:
+                return None
+            continue
+        if (index == 0) != (area > 0):
+            ring.reverse()
+
+        commands.append(_command(MOVE_TO, 1))
+        commands += [_zigzag(ring[0][0] - cursor_x), _zigzag(ring[0][1] - cursor_y)]
+        cursor_x, cursor_y = ring[0]
+        commands.append(_command(LINE_TO, len(ring) - 1))
+        for px, py in ring[1:]:
+            commands += [_zigzag(px - cursor_x), _zigzag(py - cursor_y)]
+            cursor_x, cursor_y = px, py
+        commands.append(_command(CLOSE_PATH, 1))
+    return commands
+
+
+# --- Protobuf -------------------------------------------------------------------
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field_varint(field, value):
+    return _varint(field << 3) + _varint(value)
+
+
+def _field_bytes(field, data):
+    return _varint((field << 3) | 2) + _varint(len(data)) + data
+
+
+def _field_packed(field, values):
+    return _field_bytes(field, b''.join(_varint(value) for value in values))
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """Camada MVT; features: (id, tipo, comandos, atributos texto)"""
+    keys, values = {}, {}
+    body = bytearray()
+    body += _field_varint(15, 2)
+    body += _field_bytes(1, name.encode('utf-8'))
+
+    for feature_id, geometry_type, commands, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            value = str(value)
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(value, len(values)))
+        feature = _field_varint(1, feature_id) + _field_packed(2, tags) + \
+            _field_varint(3, geometry_type) + _field_packed(4, commands)
+        body += _field_bytes(2, feature)
+
+    for key in keys:
+        body += _field_bytes(3, key.encode('utf-8'))
+    for value in values:
+        body += _field_bytes(4, _field_bytes(1, value.encode('utf-8')))
+    body += _field_varint(5, extent)
+    return _field_bytes(3, bytes(body))
@@ -0,0 +1,296 @@
+"""Outbox transacional para as atualizações derivadas das escritas.
+
+Efeitos que não precisam acontecer dentro da requisição (como remover do
+disco o blob que ficou sem referência) são publicados como eventos tipados na
+tabela ``outbox_events``, na
+mesma transação da escrita: se ela for desfeita o evento também é, e se for
+confirmada o evento não se perde mesmo que o processo termine logo após o
+commit.
+
+O worker (``flask --app src.main outbox-worker``) é um processo separado que
+usa apenas o banco da aplicação, sem broker externo:
+
+* reserva um lote de eventos pendentes adiando ``available_at`` por
+  ``OUTBOX_LEASE_SECONDS`` (``FOR UPDATE SKIP LOCKED`` no PostgreSQL, o que
+  permite vários workers); eventos de um worker interrompido voltam à fila
+  quando a reserva expira;
+* entrega cada evento ao handler registrado para o tipo, em uma transação que
+  também marca o evento como processado: efeitos no banco acontecem uma única
+  vez por chave de idempotência, e efeitos fora dele (arquivos, cache) devem
+  tolerar uma nova entrega do mesmo evento;
+* repete as falhas com espera exponencial a partir de ``OUTBOX_RETRY_SECONDS``
+  até ``OUTBOX_MAX_ATTEMPTS`` tentativas; depois o evento fica ``failed``;
+* remove os eventos processados há mais de ``OUTBOX_RETENTION_HOURS``.
+
+Com ``OUTBOX_ENABLED=false`` (padrão, instalação sem worker) nada é gravado:
+os handlers rodam no próprio processo logo após o commit. Eventos publicados
+com ``local=True`` (efeitos na memória do processo) sempre rodam assim.
+
+``GET /api/admin/outbox`` informa pendências, falhas e o atraso do worker.
+"""
+import logging
+import signal
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db
+from src.models.outbox_event import OutboxEvent
+
+# Eventos entregues no próprio processo após o commit (em session.info)
+INLINE_EVENTS_KEY = 'outbox_inline_events'
+MAX_RETRY_SECONDS = 3600
+PRUNE_INTERVAL = 60
+RECENT_FAILURES = 20
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_listeners_registered = False
+
+
+def register(event_type, handler):
+    """Registra ``handler(connection, payload, idempotency_key)`` para o tipo de evento"""
+    _handlers[event_type] = handler
+
+
+def _insert(connection):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(OutboxEvent.__table__)
+    if dialect == 'sqlite':
+        return sqlite.insert(OutboxEvent.__table__)
+    return None
+
+
+def publish(session, event_type, payload, idempotency_key=None, local=False):
+    """Publica um evento na transação da sessão (pode ser chamada nos eventos de flush).
+
+    Sem ``idempotency_key`` cada publicação é um evento novo; com a mesma chave,
+    publicações repetidas são ignoradas.
+    """
+    if event_type not in _handlers:
+        raise ValueError(f'Tipo de evento sem handler: {event_type}')
+    key = idempotency_key or f'{event_type}:{uuid.uuid4().hex}'
+
+    if local or not current_app.config['OUTBOX_ENABLED']:
+        session.info.setdefault(INLINE_EVENTS_KEY, {})[key] = (event_type, payload)
+        return
+
+    table = OutboxEvent.__table__
+    connection = session.connection()
+    now = datetime.utcnow()
+    values = {
+        'event_type': event_type, 'payload': payload, 'idempotency_key': key,
+        'status': 'pending', 'attempts': 0, 'available_at': now, 'created_at': now
+    }
+    insert = _insert(connection)
+    if insert is not None:
+        connection.execute(insert.values(**values).on_conflict_do_nothing(index_elements=[table.c.idempotency_key]))
+    elif connection.execute(select(table.c.id).where(table.c.idempotency_key == key)).first() is None:
+        connection.execute(table.insert().values(**values))
+
+
+def _after_commit(session):
+    events = session.info.pop(INLINE_EVENTS_KEY, None)
+    if not events:
+        return
+    for key, (event_type, payload) in events.items():
+        try:
+            with db.engine.begin() as connection:
+                _handlers[event_type](connection, payload, key)
+        except Exception:
+            # A escrita já foi confirmada: a falha do efeito derivado não desfaz a requisição
+            logger.exception('Falha ao processar o evento %s (%s)', event_type, key)
+
+
+def _after_rollback(session):
+    session.info.pop(INLINE_EVENTS_KEY, None)
+
+
+# --- Worker --------------------------------------------------------------------
+
+def claim(batch_size, lease_seconds):
+    """Reserva até ``batch_size`` eventos pendentes e retorna os ids, em ordem de publicação"""
+    table = OutboxEvent.__table__
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        ids = connection.execute(
+            select(table.c.id)
+            .where(table.c.status == 'pending', table.c.available_at <= now)
+            .order_by(table.c.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if ids:
+            connection.execute(table.update().where(table.c.id.in_(ids)).values(
+                available_at=now + timedelta(seconds=lease_seconds),
+                attempts=table.c.attempts + 1
+            ))
+    return ids
+
+
+def retry_delay(attempts, base_seconds):
+    """Espera até a próxima tentativa depois de ``attempts`` falhas"""
+    return min(base_seconds * 2 ** (attempts - 1), MAX_RETRY_SECONDS)
+
+
+def process_event(event_id):
+    """Entrega um evento reservado ao handler; retorna True se foi processado"""
+    config = current_app.config
+    table = OutboxEvent.__table__
+    with db.engine.connect() as connection:
+        row = connection.execute(select(table).where(table.c.id == event_id, table.c.status == 'pending')).first()
+        if row is None:
+            return False
+        try:
+            handler = _handlers.get(row.event_type)
+            if handler is None:
+                raise LookupError(f'Tipo de evento sem handler: {row.event_type}')
+            handler(connection, row.payload, row.idempotency_key)
+            marked = connection.execute(
+                table.update().where(table.c.id == event_id, table.c.status == 'pending')
+                .values(status='processed', processed_at=datetime.utcnow(), last_error=None)
+            ).rowcount
+            if not marked:
+                # Outro worker processou o evento após o fim da reserva
+                connection.rollback()
+                return False
+            connection.commit()
+            return True
+        except Exception as e:
+            connection.rollback()
+            failed = row.attempts >= config['OUTBOX_MAX_ATTEMPTS']
+            connection.execute(table.update().where(table.c.id == event_id).values(
+                status='failed' if failed else 'pending',
+                last_error=f'{type(e).__name__}: {e}'[:2000],
+                available_at=datetime.utcnow() + timedelta(
+                    seconds=retry_delay(row.attempts, config['OUTBOX_RETRY_SECONDS'])
+                )
+            ))
+            connection.commit()
+            logger.warning('Evento %s (%s) falhou na tentativa %s: %s', event_id, row.event_type, row.attempts, e)
+            return False
+
+
+def drain(batch_size=None):
+    """Processa um lote de eventos pendentes; retorna (processados, não processados)"""
+    config = current_app.config
+    ids = claim(batch_size or config['OUTBOX_BATCH_SIZE'], config['OUTBOX_LEASE_SECONDS'])
+    processed = sum(process_event(event_id) for event_id in ids)
+    return processed, len(ids) - processed
+
+
+def prune_processed(retention_hours):
+    """Remove os eventos processados há mais de ``retention_hours`` horas"""
+    table = OutboxEvent.__table__
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    with db.engine.begin() as connection:
+        return connection.execute(
+            table.delete().where(table.c.status == 'processed', table.c.processed_at < cutoff)
+        ).rowcount
+
+
+def retry_failed(event_ids=None):
+    """Devolve à fila os eventos com falha (todos com event_ids=None, ou só os informados); retorna quantos"""
+    query = OutboxEvent.query.filter(OutboxEvent.status == 'failed')
+    if event_ids is not None:
+        query = query.filter(OutboxEvent.id.in_(event_ids))
+    retried = query.update({
+        OutboxEvent.status: 'pending',
+        OutboxEvent.attempts: 0,
+        OutboxEvent.available_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    return retried
+
+
+def outbox_status():
+    """Pendências e falhas por tipo, atraso do evento pendente mais antigo e últimas falhas"""
+    now = datetime.utcnow()
+    rows = db.session.query(
+        OutboxEvent.event_type,
+        OutboxEvent.status,
+        func.count(OutboxEvent.id),
+        func.min(OutboxEvent.created_at)
+    ).filter(OutboxEvent.status.in_(['pending', 'failed']))\
+     .group_by(OutboxEvent.event_type, OutboxEvent.status)\
+     .all()
+
+    by_type = {}
+    oldest_pending = None
+    for event_type, status, count, oldest in rows:
+        entry = by_type.setdefault(event_type, {'pending': 0, 'failed': 0})
+        entry[status] = count
+        if status == 'pending' and (oldest_pending is None or oldest < oldest_pending):
+            oldest_pending = oldest
+
+    last_processed = db.session.query(func.max(OutboxEvent.processed_at)).scalar()
+    retrying = OutboxEvent.query.filter(
+        OutboxEvent.status == 'pending', OutboxEvent.last_error.isnot(None)
+    ).count()
+    failures = OutboxEvent.query.filter_by(status='failed')\
+        .order_by(OutboxEvent.id.desc())\
+        .limit(RECENT_FAILURES)\
+        .all()
+
+    return {
+        'enabled': current_app.config['OUTBOX_ENABLED'],
+        'handlers': sorted(_handlers),
+        'pending': sum(entry['pending'] for entry in by_type.values()),
+        'retrying': retrying,
+        'failed': sum(entry['failed'] for entry in by_type.values()),
+        'by_type': by_type,
+        'oldest_pending_at': oldest_pending.isoformat() if oldest_pending else None,
+        'lag_seconds': round((now - oldest_pending).total_seconds(), 1) if oldest_pending else 0,
+        'last_processed_at': last_processed.isoformat() if last_processed else None,
+        'recent_failures': [failure.to_dict() for failure in failures]
+    }
+
+
+@click.command('outbox-worker')
+@click.option('--batch-size', type=int, help='Eventos por lote (padrão OUTBOX_BATCH_SIZE).')
+@click.option('--interval', type=float, help='Segundos entre leituras com a fila vazia (padrão OUTBOX_POLL_INTERVAL).')
+@click.option('--once', is_flag=True, help='Processa os eventos disponíveis e termina.')
+def outbox_worker_command(batch_size, interval, once):
+    """Processa os eventos do outbox transacional."""
+    config = current_app.config
+    interval = config['OUTBOX_POLL_INTERVAL'] if interval is None else interval
+    stopping = []
+    # SIGTERM (systemd, supervisor): termina após o evento em andamento
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    total_processed = total_failed = 0
+    last_prune = 0.0
+    while not stopping:
+        processed, failed = drain(batch_size)
+        total_processed += processed
+        total_failed += failed
+        if processed or failed:
+            continue
+
+        if time.monotonic() - last_prune >= PRUNE_INTERVAL:
+            pruned = prune_processed(config['OUTBOX_RETENTION_HOURS'])
+            last_prune = time.monotonic()
+            if pruned:
+                logger.info('%s eventos processados removidos', pruned)
+        if once:
+            break
+        time.sleep(interval)
+
+    click.echo(f'{total_processed} eventos processados, {total_failed} falhas')
+
+
+def init_app(app):
+    """Registra a entrega dos eventos após o commit e o comando do worker"""
+    global _listeners_registered
+    if not _listeners_registered:
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+        _listeners_registered = True
+    app.cli.add_command(outbox_worker_command)
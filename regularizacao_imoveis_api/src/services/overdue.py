@@ -0,0 +1,127 @@
+"""Detecção de etapas em atraso no banco.
+
+``step_records.expected_end_date`` guarda ``start_date + estimated_duration_days``
+da etapa e é mantida:
+
+* na inserção/atualização de um registro cuja data de início ou etapa mudou;
+* em todos os registros de uma etapa quando ``estimated_duration_days`` muda.
+
+Com isso as consultas de atraso viram um range indexado em
+``(status, expected_end_date)``, com ``days_overdue`` calculado no SQL.
+"""
+from datetime import timedelta
+
+import click
+from sqlalchemy import Date, event, inspect, literal, select
+
+from src.models import db
+from src.models.property import Property
+from src.models.regularization_step import RegularizationStep
+from src.models.sql_functions import date_add_days, days_between
+from src.models.step_record import StepRecord
+
+SORT_OPTIONS = ['days_overdue', 'expected_end_date', 'start_date']
+
+_listeners_registered = False
+
+
+def _expected_end_date_value(record):
+    """Valor (ou expressão SQL) da data prevista de conclusão de um registro"""
+    if record.start_date is None or record.step_id is None:
+        return None
+
+    # Etapa já carregada na sessão: calcular em Python
+    step = inspect(record).dict.get('step')
+    if step is not None and step.id == record.step_id:
+        if step.estimated_duration_days is None:
+            return None
+        return record.start_date + timedelta(days=step.estimated_duration_days)
+
+    # Caso contrário, calcular no próprio INSERT/UPDATE
+    return select(
+        date_add_days(literal(record.start_date, Date), RegularizationStep.estimated_duration_days)
+    ).where(RegularizationStep.id == record.step_id).scalar_subquery()
+
+
+def _before_insert(mapper, connection, target):
+    target.expected_end_date = _expected_end_date_value(target)
+
+
+def _before_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.start_date.history.has_changes() or state.attrs.step_id.history.has_changes():
+        target.expected_end_date = _expected_end_date_value(target)
+
+
+def _after_step_update(mapper, connection, target):
+    """Propaga a mudança da duração estimada para os registros da etapa"""
+    if inspect(target).attrs.estimated_duration_days.history.has_changes():
+        recompute_expected_end_dates(connection, step_id=target.id)
+
+
+def recompute_expected_end_dates(connection, step_id=None):
+    """Recalcula expected_end_date em lote (todas as etapas ou apenas uma)"""
+    table = StepRecord.__table__
+    steps = RegularizationStep.__table__
+    duration = select(steps.c.estimated_duration_days)\
+        .where(steps.c.id == table.c.step_id)\
+        .scalar_subquery()
+
+    statement = table.update().values(expected_end_date=date_add_days(table.c.start_date, duration))
+    if step_id is not None:
+        statement = statement.where(table.c.step_id == step_id)
+    return connection.execute(statement).rowcount
+
+
+def overdue_filter(today):
+    """Critério de atraso servido pelo índice (status, expected_end_date)"""
+    return [StepRecord.status == 'in_progress', StepRecord.expected_end_date < today]
+
+
+def days_overdue_column(today):
+    return days_between(StepRecord.expected_end_date, literal(today, Date)).label('days_overdue')
+
+
+def overdue_ordering(sort, order):
+    """Ordenação das listagens de atraso (days_overdue desc = mais atrasadas primeiro)"""
+    if sort not in SORT_OPTIONS:
+        raise ValueError(f'Ordenação inválida: {sort}')
+
+    # Mais dias de atraso equivale a data prevista mais antiga
+    if sort == 'days_overdue':
+        column, descending = StepRecord.expected_end_date, order != 'desc'
+    else:
+        column, descending = getattr(StepRecord, sort), order == 'desc'
+
+    return [column.desc() if descending else column.asc(), StepRecord.id]
+
+
+def overdue_steps_query(today):
+    """Etapas em atraso com etapa e imóvel, em uma única consulta"""
+    return db.session.query(
+        StepRecord,
+        RegularizationStep,
+        Property,
+        days_overdue_column(today)
+    ).join(RegularizationStep, StepRecord.step_id == RegularizationStep.id)\
+     .join(Property, StepRecord.property_id == Property.id)\
+     .filter(*overdue_filter(today))
+
+
+@click.command('recompute-expected-end-dates')
+def recompute_expected_end_dates_command():
+    """Recalcula a data prevista de conclusão de todos os registros de etapas."""
+    updated = recompute_expected_end_dates(db.session.connection())
+    db.session.commit()
+    click.echo(f'{updated} registros de etapas atualizados')
+
+
+def init_app(app):
+    """Registra a manutenção de expected_end_date e o comando de recálculo"""
+    global _listeners_registered
+    if not _listeners_registered:
+        event.listen(StepRecord, 'before_insert', _before_insert)
+        event.listen(StepRecord, 'before_update', _before_update)
+        event.listen(RegularizationStep, 'after_update', _after_step_update)
+        _listeners_registered = True
+    app.cli.add_command(recompute_expected_end_dates_command)
@@ -0,0 +1,134 @@
+"""Paginação por cursor (keyset) para as listagens da API.
+
+Em vez de ``OFFSET`` + ``COUNT(*)``, cada página continua a partir da última
+linha da anterior com um predicado sobre a chave de ordenação indexada
+(``id``, ``created_at``, ``updated_at`` ou outra coluna indexada informada
+pela listagem, sempre desempatada por ``id``), de modo que páginas profundas custam o mesmo que a primeira. O cursor é opaco e
+assinado com a SECRET_KEY da aplicação.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, or_
+
+SORT_KEYS = ['id', 'created_at', 'updated_at']
+ORDERS = ['asc', 'desc']
+
+
+class InvalidCursorError(ValueError):
+    """Cursor adulterado, expirado ou incompatível com a ordenação pedida"""
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def encode_cursor(sort, order, value, last_id):
+    """Gera o cursor assinado a partir da última linha da página"""
+    if isinstance(value, (datetime, Decimal)):
+        value = value.isoformat() if isinstance(value, datetime) else str(value)
+    return _serializer().dumps({'s': sort, 'o': order, 'v': value, 'id': last_id})
+
+
+def decode_cursor(cursor, sort, order, column=None):
+    """Valida o cursor e retorna (valor da chave, id) da última linha"""
+    try:
+        data = _serializer().loads(cursor)
+    except BadSignature:
+        raise InvalidCursorError('Cursor inválido')
+
+    if data.get('s') != sort or data.get('o') != order:
+        raise InvalidCursorError('Cursor não corresponde à ordenação solicitada')
+
+    value = data.get('v')
+    if value is not None and column is not None:
+        python_type = column.type.python_type
+        if python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif python_type is Decimal:
+            value = Decimal(value)
+    return value, data.get('id')
+
+
+def sort_ordering(model, sort='id', order='asc', sort_keys=SORT_KEYS):
+    """ORDER BY da chave escolhida, desempatada por id"""
+    if sort not in sort_keys:
+        raise InvalidCursorError(f'Ordenação inválida: {sort}')
+    if order not in ORDERS:
+        raise InvalidCursorError(f'Direção inválida: {order}')
+
+    id_column = model.id
+    descending = order == 'desc'
+    if sort == 'id':
+        return [id_column.desc() if descending else id_column.asc()]
+    sort_column = getattr(model, sort)
+    return [sort_column.desc(), id_column.desc()] if descending else [sort_column.asc(), id_column.asc()]
+
+
+def keyset_paginate(query, model, cursor='', per_page=10, sort='id', order='asc', include_total=True,
+                    sort_keys=SORT_KEYS):
+    """Retorna uma página de ``query`` a partir do cursor informado.
+
+    ``cursor`` vazio indica a primeira página. A ordenação existente na query
+    é substituída pela ordenação da chave escolhida, que deve estar em
+    ``sort_keys`` (colunas não nulas e indexadas junto com ``id``).
+    """
+    ordering = sort_ordering(model, sort, order, sort_keys)
+    sort_column = getattr(model, sort)
+    id_column = model.id
+    descending = order == 'desc'
+
+    total = query.order_by(None).count() if include_total else None
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort, order, sort_column)
+        if sort == 'id':
+            predicate = id_column < last_id if descending else id_column > last_id
+        elif descending:
+            predicate = or_(sort_column < value, and_(sort_column == value, id_column < last_id))
+        else:
+            predicate = or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+        query = query.filter(predicate)
+
+    # Buscar uma linha a mais para saber se existe próxima página
+    rows = query.order_by(None).order_by(*ordering).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor(sort, order, getattr(last, sort), last.id)
+
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'total': total
+    }
+
+
+def cursor_args(args, default_sort='id', default_order='asc'):
+    """Extrai os parâmetros do modo cursor da query string"""
+    return {
+        'cursor': args.get('cursor', ''),
+        'per_page': args.get('per_page', 10, type=int),
+        'sort': args.get('sort', default_sort),
+        'order': args.get('order', default_order),
+        'include_total': args.get('include_total', 'true').lower() == 'true'
+    }
+
+
+def cursor_response(key, page, serialize, per_page):
+    """Monta o corpo da resposta no modo cursor"""
+    result = {
+        key: [serialize(item) for item in page['items']],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more'],
+        'per_page': per_page
+    }
+    if page['total'] is not None:
+        result['total'] = page['total']
+    return result
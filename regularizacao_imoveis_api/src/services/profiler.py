@@ -0,0 +1,272 @@
+"""Profiler sob demanda de requisições, restrito a administradores.
+
+Uma requisição com o cabeçalho ``X-Profile`` ou o parâmetro ``profile``,
+feita por uma sessão de administrador, é executada sob um profiler:
+
+* ``1``/``cprofile`` (padrão): cProfile determinístico, salvo em ``.pstats``
+  (``python -m pstats`` ou snakeviz);
+* ``sample``: amostragem da pilha da thread da requisição a cada
+  ``PROFILER_SAMPLE_INTERVAL_MS``, salva em ``.folded`` (pilhas colapsadas para
+  flamegraph.pl ou speedscope).
+
+Em ambos os modos são registrados o pico de memória (tracemalloc) e a linha do
+tempo das instruções SQL (início, duração e SQL normalizado). Os arquivos ficam
+em ``PROFILER_DIR`` (os ``PROFILER_MAX_FILES`` mais recentes) e são listados em
+``/api/admin/profiles``; a resposta traz o identificador em ``X-Profile-Id``.
+Apenas uma requisição por processo é perfilada por vez.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request, session
+from sqlalchemy import event
+
+from src.models import db
+from src.services.metrics import normalize_sql
+
+MODES = {'1': 'cprofile', 'true': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sample'}
+PROFILE_ID = re.compile(r'^[\w.-]+$')
+EXTENSIONS = {'cprofile': '.pstats', 'sample': '.folded'}
+TOP_FUNCTIONS = 30
+
+# Sessão de profiling em andamento neste processo (uma por vez)
+_lock = threading.Lock()
+_active = None
+
+
+class ProfileSession:
+    """Estado de uma requisição perfilada"""
+
+    def __init__(self, mode, sample_interval):
+        self.mode = mode
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self.statements = []
+        self.samples = Counter()
+        self.profile = None
+        self.sampler = None
+        self.stop_sampling = threading.Event()
+        self.sample_interval = sample_interval
+        self.tracing_memory = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing_memory = True
+        tracemalloc.reset_peak()
+        if self.mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.sampler is not None:
+            self.stop_sampling.set()
+            self.sampler.join()
+        self.duration = time.perf_counter() - self.started
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        if self.tracing_memory:
+            tracemalloc.stop()
+
+    def _sample(self):
+        while not self.stop_sampling.wait(self.sample_interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def top_functions(self):
+        """Funções com maior tempo acumulado (cProfile) ou mais amostras no topo da pilha"""
+        if self.profile is not None:
+            stats = pstats.Stats(self.profile).stats
+            rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+            return [{
+                'function': f'{name} ({os.path.basename(filename)}:{line})',
+                'calls': calls,
+                'total_ms': round(total * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3)
+            } for (filename, line, name), (_, calls, total, cumulative, _) in rows]
+
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{
+            'function': name,
+            'samples': count,
+            'percent': round(count * 100 / total, 1)
+        } for name, count in leaves.most_common(TOP_FUNCTIONS)]
+
+
+def profile_dir(app=None):
+    return (app or current_app).config['PROFILER_DIR']
+
+
+def list_profiles():
+    """Metadados dos perfis salvos, do mais recente para o mais antigo"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as metadata:
+                summary = json.load(metadata)
+            for key in ('top_functions', 'sql_timeline'):
+                summary.pop(key, None)
+            profiles.append(summary)
+    return profiles
+
+
+def load_profile(profile_id):
+    """Metadados completos de um perfil, ou None"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(profile_dir(), f'{profile_id}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as metadata:
+        return json.load(metadata)
+
+
+def _requested_mode():
+    value = request.headers.get('X-Profile') or request.args.get('profile')
+    return MODES.get(value.lower()) if value else None
+
+
+def _save(profile_session, response):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    endpoint = (request.endpoint or 'unmatched').replace('.', '-')
+    profile_id = f"{profile_session.started_at:%Y%m%d-%H%M%S}-{endpoint}-{uuid.uuid4().hex[:6]}"
+    output = os.path.join(directory, profile_id + EXTENSIONS[profile_session.mode])
+
+    if profile_session.profile is not None:
+        profile_session.profile.dump_stats(output)
+    else:
+        with open(output, 'w', encoding='utf-8') as folded:
+            for stack, count in profile_session.samples.most_common():
+                folded.write(f'{stack} {count}\n')
+
+    metadata = {
+        'id': profile_id,
+        'mode': profile_session.mode,
+        'file': os.path.basename(output),
+        'created_at': profile_session.started_at.isoformat(timespec='seconds'),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(profile_session.duration * 1000, 3),
+        'peak_memory_bytes': profile_session.peak_memory,
+        'sql_count': len(profile_session.statements),
+        'sql_ms': round(sum(duration for _, duration, _ in profile_session.statements), 3),
+        'top_functions': profile_session.top_functions(),
+        'sql_timeline': [
+            {'start_ms': start, 'duration_ms': duration, 'statement': statement}
+            for start, duration, statement in profile_session.statements
+        ]
+    }
+    with open(os.path.join(directory, profile_id + '.json'), 'w', encoding='utf-8') as output_file:
+        json.dump(metadata, output_file, ensure_ascii=False, indent=2)
+
+    _prune(directory, current_app.config['PROFILER_MAX_FILES'])
+    return profile_id
+
+
+def _prune(directory, keep):
+    """Mantém apenas os perfis mais recentes"""
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+    for profile_id in ids[:-keep] if keep else []:
+        for extension in ('.json',) + tuple(EXTENSIONS.values()):
+            path = os.path.join(directory, profile_id + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _before_request():
+    global _active
+    mode = _requested_mode()
+    if mode is None or session.get('user_role') != 'admin' or not current_app.config['PROFILER_ENABLED']:
+        return
+    if not _lock.acquire(blocking=False):
+        g.profile_skipped = 'busy'
+        return
+    _active = ProfileSession(mode, current_app.config['PROFILER_SAMPLE_INTERVAL_MS'] / 1000)
+    g.profile_session = _active
+    _active.start()
+
+
+def _after_request(response):
+    profile_session = g.pop('profile_session', None)
+    if profile_session is not None:
+        _finish(profile_session)
+        response.headers['X-Profile-Id'] = _save(profile_session, response)
+    elif 'profile_skipped' in g:
+        response.headers['X-Profile-Skipped'] = g.profile_skipped
+    return response
+
+
+def _teardown_request(exception):
+    # Requisição encerrada sem passar pelo after_request
+    profile_session = g.pop('profile_session', None)
+    if profile_session is not None:
+        _finish(profile_session)
+
+
+def _finish(profile_session):
+    global _active
+    try:
+        profile_session.stop()
+    finally:
+        _active = None
+        _lock.release()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile_session = _active
+    if profile_session is not None and context is not None and profile_session.thread_id == threading.get_ident():
+        context.profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile_session = _active
+    started = getattr(context, 'profile_started', None)
+    if profile_session is not None and started is not None:
+        now = time.perf_counter()
+        profile_session.statements.append((
+            round((started - profile_session.started) * 1000, 3),
+            round((now - started) * 1000, 3),
+            normalize_sql(statement)
+        ))
+
+
+def init_app(app):
+    """Registra os hooks do profiler e a linha do tempo de SQL"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,135 @@
+"""Resumo do progresso das etapas mantido na própria tabela de imóveis.
+
+``properties`` guarda ``total_steps``, ``completed_steps``,
+``completion_percentage``, ``current_step_id`` (primeira etapa não concluída na
+ordem do processo) e ``last_activity_at`` (última alteração de um registro de
+etapa). Os valores são recalculados a partir de ``step_records`` com um único
+``UPDATE`` para os imóveis afetados:
+
+* ao final de cada flush da sessão que inseriu, alterou ou removeu registros
+  de etapas (criação de imóvel, ``PUT /api/step-records/<id>``);
+* pela importação em lote e pela atualização em lote, na mesma transação;
+* nos imóveis com registros de uma etapa cuja ordem mudou.
+
+Com isso a listagem de imóveis exibe e ordena pelo progresso sem JOIN nem
+GROUP BY sobre ``step_records``.
+"""
+from itertools import chain
+
+import click
+from sqlalchemy import event, func, inspect, literal, select
+
+from src.models import db
+from src.models.property import Property
+from src.models.regularization_step import RegularizationStep
+from src.models.step_record import StepRecord
+
+PROGRESS_COLUMNS = ['total_steps', 'completed_steps', 'completion_percentage', 'current_step_id', 'last_activity_at']
+CHUNK_SIZE = 1000
+
+# Imóveis com registros alterados no flush em andamento (em session.info)
+_PENDING_KEY = 'progress_pending_properties'
+
+_listeners_registered = False
+
+
+def progress_values():
+    """Expressões do SET, correlacionadas com cada linha de properties"""
+    properties = Property.__table__
+    records = StepRecord.__table__
+    steps = RegularizationStep.__table__
+    of_property = records.c.property_id == properties.c.id
+
+    total = select(func.count()).select_from(records).where(of_property).scalar_subquery()
+    completed = select(func.count()).select_from(records)\
+        .where(of_property, records.c.status == 'completed')\
+        .scalar_subquery()
+    current = select(records.c.step_id)\
+        .select_from(records.join(steps, steps.c.id == records.c.step_id))\
+        .where(of_property, records.c.status.is_distinct_from('completed'))\
+        .order_by(steps.c.order_sequence, steps.c.id)\
+        .limit(1)\
+        .scalar_subquery()
+    last_activity = select(func.max(records.c.updated_at)).where(of_property).scalar_subquery()
+
+    return {
+        'total_steps': total,
+        'completed_steps': completed,
+        'completion_percentage': func.coalesce(
+            func.round(completed * literal(100.0) / func.nullif(total, 0), 2), 0
+        ),
+        'current_step_id': current,
+        'last_activity_at': func.coalesce(last_activity, properties.c.created_at, func.current_timestamp()),
+        # O recálculo não é uma edição do imóvel: manter updated_at (onupdate da coluna)
+        'updated_at': properties.c.updated_at
+    }
+
+
+def refresh_progress(connection, property_ids=None):
+    """Recalcula o resumo dos imóveis informados (ou de todos) e retorna quantos foram atualizados"""
+    table = Property.__table__
+    statement = table.update().values(**progress_values())
+    if property_ids is None:
+        return connection.execute(statement).rowcount
+
+    # Ordem fixa dos ids: transações concorrentes bloqueiam as linhas na mesma ordem
+    property_ids = sorted({property_id for property_id in property_ids if property_id is not None})
+    updated = 0
+    for start in range(0, len(property_ids), CHUNK_SIZE):
+        chunk = property_ids[start:start + CHUNK_SIZE]
+        updated += connection.execute(statement.where(table.c.id.in_(chunk))).rowcount
+    return updated
+
+
+def _after_flush(session, flush_context):
+    """Anota os imóveis cujos registros de etapas mudaram neste flush"""
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in chain(session.new, session.deleted):
+        if isinstance(obj, StepRecord):
+            pending.add(obj.property_id)
+    for obj in session.dirty:
+        if isinstance(obj, StepRecord) and session.is_modified(obj, include_collections=False):
+            pending.add(obj.property_id)
+            # Registro movido para outro imóvel: o anterior também muda
+            pending.update(inspect(obj).attrs.property_id.history.deleted)
+
+
+def _after_flush_postexec(session, flush_context):
+    property_ids = session.info.pop(_PENDING_KEY, None)
+    if not property_ids:
+        return
+    refresh_progress(session.connection(), property_ids)
+
+    # Imóveis já carregados na sessão passam a ler os valores recalculados
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Property) and obj.id in property_ids:
+            session.expire(obj, PROGRESS_COLUMNS)
+
+
+def _after_step_update(mapper, connection, target):
+    """A ordem das etapas define a etapa atual dos imóveis que têm registros da etapa"""
+    if inspect(target).attrs.order_sequence.history.has_changes():
+        records = StepRecord.__table__
+        property_ids = connection.execute(
+            select(records.c.property_id).where(records.c.step_id == target.id)
+        ).scalars().all()
+        refresh_progress(connection, property_ids)
+
+
+@click.command('recompute-progress')
+def recompute_progress_command():
+    """Recalcula o resumo de progresso das etapas de todos os imóveis."""
+    updated = refresh_progress(db.session.connection())
+    db.session.commit()
+    click.echo(f'{updated} imóveis atualizados')
+
+
+def init_app(app):
+    """Registra a manutenção do resumo de progresso e o comando de recálculo"""
+    global _listeners_registered
+    if not _listeners_registered:
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_flush_postexec', _after_flush_postexec)
+        event.listen(RegularizationStep, 'after_update', _after_step_update)
+        _listeners_registered = True
+    app.cli.add_command(recompute_progress_command)
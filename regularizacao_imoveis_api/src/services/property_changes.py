@@ -0,0 +1,183 @@
+"""Versão e registro das alterações de imóveis para os índices em memória.
+
+A R-tree das consultas espaciais (``services/spatial.py``), o índice de
+clusters (``services/clusters.py``) e o cache de tiles (``services/tiles.py``)
+ficam na memória de cada processo (os tiles também em disco) e precisam saber
+se a tabela ``properties`` mudou desde que foram montados.
+
+Cada transação que cria, exclui ou altera a geometria, o polígono ou o status
+de imóveis incrementa o contador ``properties`` da tabela ``change_versions``
+e grava os ids afetados em ``property_changes`` com a nova versão e o
+retângulo da geometria anterior (lido antes do flush), para que os tiles que
+exibiam a posição antiga também sejam descartados. O
+incremento bloqueia a linha do contador até o commit, de modo que a versão
+lida por um processo nunca deixa para trás uma alteração ainda não confirmada
+com versão menor (o que acontecia comparando ``updated_at`` e o maior id,
+atribuídos antes do commit). Os índices guardam a versão em que foram lidos e
+pedem apenas os ids alterados depois dela.
+
+O registro guarda as últimas ``LOG_VERSIONS`` versões; um índice mais
+atrasado que isso é remontado por inteiro. Escritas feitas fora da aplicação
+(SQL direto no banco) não passam por aqui: reinicie os processos depois delas.
+"""
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db
+from src.models.change_version import ChangeVersion
+from src.models.property import Property
+from src.models.property_change import PropertyChange
+from src.services import wkb
+
+VERSION_NAME = 'properties'
+INDEXED_FIELDS = ('geometry', 'polygon_geometry', 'regularization_status')
+LOG_VERSIONS = 10000
+PRUNE_INTERVAL = 100
+# Retângulos anteriores dos imóveis alterados no flush em andamento (em session.info)
+PREVIOUS_BOUNDS_KEY = 'property_changes_previous_bounds'
+
+_listener_registered = False
+
+
+def _upsert_insert(connection):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(ChangeVersion.__table__)
+    if dialect == 'sqlite':
+        return sqlite.insert(ChangeVersion.__table__)
+    return None
+
+
+def next_version(connection):
+    """Incrementa a versão dos imóveis e retorna o novo valor (linha bloqueada até o commit)"""
+    table = ChangeVersion.__table__
+    insert = _upsert_insert(connection)
+    if insert is not None:
+        return connection.execute(
+            insert.values(name=VERSION_NAME, version=1)
+            .on_conflict_do_update(index_elements=[table.c.name], set_={'version': table.c.version + 1})
+            .returning(table.c.version)
+        ).scalar()
+
+    updated = connection.execute(
+        table.update().where(table.c.name == VERSION_NAME).values(version=table.c.version + 1)
+    ).rowcount
+    if not updated:
+        connection.execute(table.insert().values(name=VERSION_NAME, version=1))
+    return connection.execute(select(table.c.version).where(table.c.name == VERSION_NAME)).scalar()
+
+
+def geometry_bounds(point, polygon):
+    """Retângulo que envolve o ponto e o polígono (WKB) ou None sem geometria"""
+    boxes = [wkb.bounds(geometry) for geometry in (wkb.decode(point), wkb.decode(polygon)) if geometry]
+    if not boxes:
+        return None
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+def record_changes(connection, property_ids, previous_bounds=None):
+    """Registra os imóveis alterados na transação em uma nova versão; retorna a versão.
+
+    previous_bounds: {id: retângulo da geometria anterior} dos imóveis alterados ou excluídos.
+    """
+    property_ids = sorted(set(property_ids))
+    if not property_ids:
+        return None
+    previous_bounds = previous_bounds or {}
+    version = next_version(connection)
+    table = PropertyChange.__table__
+    rows = []
+    for property_id in property_ids:
+        min_lng, min_lat, max_lng, max_lat = previous_bounds.get(property_id) or (None,) * 4
+        rows.append({
+            'version': version, 'property_id': property_id,
+            'previous_min_lng': min_lng, 'previous_min_lat': min_lat,
+            'previous_max_lng': max_lng, 'previous_max_lat': max_lat
+        })
+    connection.execute(table.insert(), rows)
+    if version % PRUNE_INTERVAL == 0:
+        connection.execute(table.delete().where(table.c.version <= version - LOG_VERSIONS))
+    return version
+
+
+def current_version():
+    """Versão confirmada mais recente da tabela de imóveis (0 antes da primeira alteração)"""
+    table = ChangeVersion.__table__
+    return db.session.execute(select(table.c.version).where(table.c.name == VERSION_NAME)).scalar() or 0
+
+
+def changed_since(version, until):
+    """Ids dos imóveis alterados nas versões (version, until]; None se o registro não cobre o intervalo"""
+    if until - version >= LOG_VERSIONS:
+        return None
+    table = PropertyChange.__table__
+    return set(db.session.execute(
+        select(table.c.property_id).where(table.c.version > version, table.c.version <= until).distinct()
+    ).scalars())
+
+
+def changes_since(version, until):
+    """Alterações das versões (version, until]: lista de (versão, id, retângulo anterior ou None).
+
+    None se o registro não cobre o intervalo.
+    """
+    if until - version >= LOG_VERSIONS:
+        return None
+    table = PropertyChange.__table__
+    rows = db.session.execute(
+        select(table.c.version, table.c.property_id, table.c.previous_min_lng, table.c.previous_min_lat,
+               table.c.previous_max_lng, table.c.previous_max_lat)
+        .where(table.c.version > version, table.c.version <= until)
+        .order_by(table.c.version)
+    )
+    return [(row[0], row[1], tuple(row[2:]) if row[2] is not None else None) for row in rows]
+
+
+def _indexed_fields_changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in INDEXED_FIELDS)
+
+
+def _before_flush(session, flush_context, instances):
+    """Guarda os imóveis que serão alterados ou excluídos, com o retângulo anterior.
+
+    Lido antes do flush: geometrias atribuídas como expressão SQL são expiradas
+    durante o flush e não deixam histórico para o after_flush.
+    """
+    property_ids = [obj.id for obj in session.deleted if isinstance(obj, Property) and obj.id]
+    property_ids += [obj.id for obj in session.dirty
+                     if isinstance(obj, Property) and obj.id and obj not in session.deleted
+                     and _indexed_fields_changed(obj)]
+    if not property_ids:
+        return
+
+    previous = session.info.setdefault(PREVIOUS_BOUNDS_KEY, {})
+    previous.update(dict.fromkeys(property_ids))
+    table = Property.__table__
+    rows = session.connection().execute(
+        select(table.c.id, table.c.geometry, table.c.polygon_geometry).where(table.c.id.in_(property_ids))
+    )
+    for property_id, point, polygon in rows:
+        previous[property_id] = geometry_bounds(point, polygon)
+
+
+def _after_flush(session, flush_context):
+    previous = session.info.pop(PREVIOUS_BOUNDS_KEY, None) or {}
+    property_ids = [obj.id for obj in session.new if isinstance(obj, Property)] + list(previous)
+    if property_ids:
+        record_changes(session.connection(), property_ids, previous)
+
+
+def _after_rollback(session):
+    session.info.pop(PREVIOUS_BOUNDS_KEY, None)
+
+
+def init_app(app):
+    """Registra os listeners que versionam as alterações de imóveis"""
+    global _listener_registered
+    if not _listener_registered:
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+        _listener_registered = True
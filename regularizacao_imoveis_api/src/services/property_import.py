@@ -0,0 +1,329 @@
+"""Importação em lote de imóveis (CSV e GeoJSON).
+
+O arquivo é lido linha a linha (CSV) ou feição a feição (GeoJSON), validado e
+gravado em lotes de ``PROPERTY_IMPORT_CHUNK_SIZE`` linhas. Para cada lote:
+
+* os códigos municipais já existentes são obtidos com uma única consulta;
+* os imóveis são inseridos com um ``INSERT`` em lote (executemany com
+  ``RETURNING``);
+* os registros das etapas ativas são criados com um único
+  ``INSERT ... SELECT`` (imóveis do lote x etapas ativas);
+* os contadores do dashboard, o resumo de progresso e a versão das
+  alterações de imóveis (``services/property_changes.py``) são ajustados
+  explicitamente, pois os inserts em lote não passam pelos eventos da sessão.
+
+Cada lote é confirmado separadamente; linhas inválidas (inclusive polígonos
+com coordenadas não numéricas, anéis abertos ou com menos de 4 pontos) são
+ignoradas e descritas no relatório de erros. Se o banco recusar o lote, ele é
+regravado linha a linha e apenas as linhas recusadas entram no relatório.
+"""
+import csv
+import io
+import json
+import math
+import re
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+from sqlalchemy import literal, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models import db
+from src.models.property import Property
+from src.models.regularization_step import RegularizationStep
+from src.models.step_record import StepRecord
+from src.services import property_changes
+from src.services.counters import PROPERTY_STATUSES, apply_deltas
+from src.services.progress import refresh_progress
+
+TEXT_FIELDS = [
+    'municipal_code', 'registry_number', 'address_street', 'address_number',
+    'address_neighborhood', 'address_city', 'address_zipcode', 'property_type',
+    'current_use', 'current_owner', 'regularization_status', 'description'
+]
+DECIMAL_FIELDS = ['area_total', 'area_built']
+FORMATS = ['csv', 'geojson']
+POLYGON_PATTERN = re.compile(r'^\s*POLYGON\s*\((.*)\)\s*$', re.IGNORECASE | re.DOTALL)
+RING_PATTERN = re.compile(r'\(([^()]*)\)')
+
+
+class ImportFormatError(ValueError):
+    """Arquivo ilegível ou em formato não suportado"""
+
+
+def detect_format(filename, requested=None):
+    """Formato do arquivo pelo parâmetro ``format`` ou pela extensão"""
+    file_format = (requested or '').lower()
+    if not file_format:
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        file_format = 'geojson' if extension in ('geojson', 'json') else extension
+    if file_format not in FORMATS:
+        raise ImportFormatError('Formato não suportado. Use CSV ou GeoJSON')
+    return file_format
+
+
+def iter_csv_rows(stream):
+    """Gera (linha, campos) de um CSV com cabeçalho, separado por vírgula ou ponto e vírgula"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        header = text.readline()
+    except UnicodeDecodeError:
+        raise ImportFormatError('O arquivo CSV deve estar codificado em UTF-8')
+    if not header.strip():
+        raise ImportFormatError('Arquivo CSV vazio')
+
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    reader = csv.DictReader(chain([header], text), delimiter=delimiter)
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ImportFormatError(f'CSV inválido na linha {reader.line_num}: {e}')
+
+
+def _ring_wkt(ring):
+    return '(' + ', '.join(f'{x} {y}' for x, y, *_ in ring) + ')'
+
+
+def iter_geojson_rows(stream):
+    """Gera (feição, campos) de uma FeatureCollection; Point e Polygon viram geometrias"""
+    try:
+        collection = json.load(stream)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ImportFormatError(f'GeoJSON inválido: {e}')
+    if not isinstance(collection, dict) or collection.get('type') != 'FeatureCollection':
+        raise ImportFormatError('O GeoJSON deve ser uma FeatureCollection')
+
+    for index, feature in enumerate(collection.get('features') or [], start=1):
+        row = dict((feature or {}).get('properties') or {})
+        geometry = (feature or {}).get('geometry') or {}
+        coordinates = geometry.get('coordinates')
+        try:
+            if geometry.get('type') == 'Point' and coordinates:
+                row['longitude'], row['latitude'] = coordinates[0], coordinates[1]
+            elif geometry.get('type') == 'Polygon' and coordinates:
+                row['polygon_wkt'] = 'POLYGON(' + ', '.join(_ring_wkt(ring) for ring in coordinates) + ')'
+            elif geometry:
+                row['_geometry_error'] = f'Geometria {geometry.get("type")} não suportada'
+        except (TypeError, ValueError, IndexError):
+            row['_geometry_error'] = 'Coordenadas inválidas'
+        yield index, row
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_polygon(wkt):
+    """Valida um POLYGON em WKT e retorna o WKT normalizado; ValueError com o motivo"""
+    match = POLYGON_PATTERN.match(wkt)
+    if not match:
+        raise ValueError('Polígono deve estar no formato POLYGON((x y, ...))')
+    body = match.group(1).strip()
+    rings = RING_PATTERN.findall(body)
+    if not rings or RING_PATTERN.sub('', body).replace(',', '').strip():
+        raise ValueError('Polígono com anéis malformados')
+
+    normalized = []
+    for number, ring in enumerate(rings, start=1):
+        points = []
+        for pair in ring.split(','):
+            parts = pair.split()
+            if len(parts) != 2:
+                raise ValueError(f'Anel {number} do polígono: cada ponto deve ter longitude e latitude')
+            try:
+                x, y = float(parts[0]), float(parts[1])
+            except ValueError:
+                raise ValueError(f'Anel {number} do polígono: coordenadas não numéricas')
+            if not (math.isfinite(x) and math.isfinite(y) and -180 <= x <= 180 and -90 <= y <= 90):
+                raise ValueError(f'Anel {number} do polígono: coordenadas fora do intervalo')
+            points.append((x, y))
+        if len(points) < 4:
+            raise ValueError(f'Anel {number} do polígono deve ter ao menos 4 pontos')
+        if points[0] != points[-1]:
+            raise ValueError(f'Anel {number} do polígono não está fechado')
+        normalized.append('(' + ', '.join(f'{x} {y}' for x, y in points) + ')')
+    return 'POLYGON(' + ', '.join(normalized) + ')'
+
+
+def validate_row(raw):
+    """Valida uma linha e retorna (valores para o INSERT, lista de erros)"""
+    errors = []
+    values = {}
+    columns = Property.__table__.c
+
+    for field in TEXT_FIELDS:
+        value = _clean(raw.get(field))
+        length = columns[field].type.length
+        if value and length and len(value) > length:
+            errors.append(f'Campo {field} excede {length} caracteres')
+        values[field] = value
+
+    if not values['address_street']:
+        errors.append('Campo address_street é obrigatório')
+    values['address_city'] = values['address_city'] or 'Mogi Mirim'
+    values['regularization_status'] = values['regularization_status'] or 'pending'
+    if values['regularization_status'] not in PROPERTY_STATUSES:
+        errors.append(f'Status inválido: {values["regularization_status"]}')
+
+    for field in DECIMAL_FIELDS:
+        value = _clean(raw.get(field))
+        values[field] = None
+        if value:
+            try:
+                values[field] = Decimal(value.replace(',', '.'))
+            except InvalidOperation:
+                errors.append(f'Campo {field} deve ser numérico')
+
+    values['geometry'] = None
+    latitude, longitude = _clean(raw.get('latitude')), _clean(raw.get('longitude'))
+    if latitude or longitude:
+        try:
+            latitude, longitude = float(latitude.replace(',', '.')), float(longitude.replace(',', '.'))
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError
+            values['geometry'] = f'SRID=4326;POINT({longitude} {latitude})'
+        except (AttributeError, ValueError):
+            errors.append('Latitude/longitude inválidas')
+
+    values['polygon_geometry'] = None
+    if raw.get('_geometry_error'):
+        errors.append(raw['_geometry_error'])
+    else:
+        polygon = _clean(raw.get('polygon_wkt'))
+        if polygon:
+            try:
+                values['polygon_geometry'] = f'SRID=4326;{parse_polygon(polygon)}'
+            except ValueError as e:
+                errors.append(str(e))
+
+    return values, errors
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _existing_codes(connection, codes):
+    """Códigos municipais do lote que já estão cadastrados (uma consulta)"""
+    if not codes:
+        return set()
+    table = Property.__table__
+    return set(connection.execute(
+        select(table.c.municipal_code).where(table.c.municipal_code.in_(codes))
+    ).scalars())
+
+
+def _insert_properties(connection, rows):
+    """Insere os imóveis em lote e retorna os ids na ordem das linhas"""
+    table = Property.__table__
+    if connection.dialect.insert_executemany_returning_sort_by_parameter_order:
+        statement = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+        return connection.execute(statement, rows).scalars().all()
+    return [connection.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+
+def _insert_step_records(connection, property_ids, user_id, now):
+    """Cria os registros das etapas ativas para os imóveis com um INSERT ... SELECT"""
+    properties = Property.__table__
+    steps = RegularizationStep.__table__
+    records = StepRecord.__table__
+    source = select(
+        properties.c.id,
+        steps.c.id,
+        literal('not_started'),
+        literal(0),
+        literal(user_id, records.c.created_by.type),
+        literal(now, records.c.created_at.type),
+        literal(now, records.c.updated_at.type)
+    ).select_from(properties.join(steps, steps.c.active == True))\
+     .where(properties.c.id.in_(property_ids))
+    insert = records.insert().from_select(
+        ['property_id', 'step_id', 'status', 'completion_percentage', 'created_by', 'created_at', 'updated_at'],
+        source
+    )
+    return connection.execute(insert).rowcount
+
+
+def _write_batch(connection, rows, user_id, now):
+    """Grava os imóveis, os registros de etapas, o progresso e os contadores; retorna os registros criados"""
+    property_ids = _insert_properties(connection, rows)
+    created = _insert_step_records(connection, property_ids, user_id, now)
+    refresh_progress(connection, property_ids)
+    property_changes.record_changes(connection, property_ids)
+
+    deltas = Counter(f'properties.status.{values["regularization_status"]}' for values in rows)
+    deltas['properties.total'] = len(rows)
+    deltas['step_records.total'] = created
+    deltas['step_records.status.not_started'] = created
+    apply_deltas(connection, deltas)
+    return created
+
+
+def import_properties(rows, user_id, chunk_size=1000):
+    """Importa as linhas (número, campos) e retorna o relatório da importação"""
+    report = {'total_rows': 0, 'imported': 0, 'failed': 0, 'step_records_created': 0, 'errors': []}
+    seen_codes = set()
+
+    def fail(row_number, code, errors):
+        report['failed'] += 1
+        report['errors'].append({'row': row_number, 'municipal_code': code, 'errors': errors})
+
+    for chunk in _chunks(rows, chunk_size):
+        report['total_rows'] += len(chunk)
+        connection = db.session.connection()
+        validated = [(row_number,) + validate_row(raw) for row_number, raw in chunk]
+        existing = _existing_codes(connection, {v['municipal_code'] for _, v, _ in validated if v['municipal_code']})
+
+        now = datetime.utcnow()
+        batch = []
+        for row_number, values, errors in validated:
+            code = values['municipal_code']
+            if code and code in existing:
+                errors.append('Código municipal já está em uso')
+            elif code and code in seen_codes:
+                errors.append('Código municipal repetido no arquivo')
+            if errors:
+                fail(row_number, code, errors)
+                continue
+            if code:
+                seen_codes.add(code)
+            batch.append((row_number, dict(values, created_by=user_id, created_at=now, updated_at=now)))
+
+        if not batch:
+            continue
+
+        try:
+            created = _write_batch(connection, [values for _, values in batch], user_id, now)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            # Regrava o lote linha a linha para relatar apenas as linhas recusadas pelo banco
+            created = 0
+            imported = []
+            for row_number, values in batch:
+                try:
+                    created += _write_batch(db.session.connection(), [values], user_id, now)
+                    db.session.commit()
+                    imported.append((row_number, values))
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    fail(row_number, values['municipal_code'], [f'Erro ao gravar a linha: {e.__class__.__name__}'])
+            batch = imported
+
+        report['imported'] += len(batch)
+        report['step_records_created'] += created
+
+    return report
@@ -0,0 +1,144 @@
+"""Roteamento de leituras para réplicas do banco.
+
+As URLs de ``DATABASE_REPLICA_URLS`` viram binds ``replica_1``, ``replica_2``…
+do Flask-SQLAlchemy. A ``RoutingSession`` (``models/routing.py``) consulta o
+``ReplicaRouter`` uma vez por requisição:
+
+* requisições GET/HEAD/OPTIONS leem de uma réplica, em rodízio;
+* demais métodos, flush e instruções DML ficam no primário;
+* após uma escrita bem-sucedida o usuário fica ``DB_REPLICA_PIN_SECONDS``
+  segundos lendo do primário (marca na sessão Flask), para ver as próprias
+  alterações apesar do atraso de replicação;
+* uma réplica que falha na verificação de conexão (feita no máximo a cada
+  ``DB_REPLICA_CHECK_INTERVAL`` segundos) ou perde a conexão sai do rodízio
+  por ``DB_REPLICA_RETRY_SECONDS``; sem réplicas disponíveis, lê-se do primário.
+
+Para testar localmente basta uma cópia do SQLite como réplica, por exemplo
+``sqlite3 app.db ".backup replica.db"`` e ``DATABASE_REPLICA_URLS=sqlite:///replica.db``.
+"""
+import itertools
+import threading
+import time
+
+from flask import current_app, has_request_context, request, session
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models import db
+from src.models.routing import PRIMARY
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Marca na sessão Flask: ler do primário até este instante (epoch)
+PIN_KEY = 'db_primary_until'
+
+
+class ReplicaRouter:
+    """Escolhe a réplica de cada requisição e acompanha a disponibilidade"""
+
+    def __init__(self, keys, check_interval=5, retry_seconds=30):
+        self.keys = list(keys)
+        self.check_interval = check_interval
+        self.retry_seconds = retry_seconds
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.down_until = {}
+        self.checked_at = {}
+
+    def mark_down(self, key):
+        with self.lock:
+            self.down_until[key] = time.monotonic() + self.retry_seconds
+            self.checked_at.pop(key, None)
+
+    def _check(self, key):
+        """Verifica a conexão com a réplica, no máximo a cada check_interval"""
+        now = time.monotonic()
+        if now - self.checked_at.get(key, float('-inf')) < self.check_interval:
+            return True
+        try:
+            with db.engines[key].connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+        except SQLAlchemyError:
+            self.mark_down(key)
+            return False
+        with self.lock:
+            self.checked_at[key] = now
+        return True
+
+    def choose(self):
+        """Próxima réplica disponível no rodízio, ou None"""
+        now = time.monotonic()
+        start = next(self.counter)
+        for offset in range(len(self.keys)):
+            key = self.keys[(start + offset) % len(self.keys)]
+            if self.down_until.get(key, 0) > now:
+                continue
+            if self._check(key):
+                return key
+        return None
+
+    def route(self):
+        """Bind das leituras da requisição atual"""
+        if not has_request_context() or request.method not in SAFE_METHODS:
+            return PRIMARY
+        if session.get(PIN_KEY, 0) > time.time():
+            return PRIMARY
+        return self.choose() or PRIMARY
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            key: {
+                'available': self.down_until.get(key, 0) <= now,
+                'retry_in_s': round(max(self.down_until.get(key, 0) - now, 0), 1)
+            }
+            for key in self.keys
+        }
+
+
+def replica_keys(app):
+    return [f'replica_{index}' for index in range(1, len(app.config['DATABASE_REPLICA_URLS']) + 1)]
+
+
+def configure(app):
+    """Acrescenta as réplicas a SQLALCHEMY_BINDS (chamar antes de db.init_app)"""
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds.update(zip(replica_keys(app), app.config['DATABASE_REPLICA_URLS']))
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def status():
+    """Disponibilidade das réplicas neste processo"""
+    router = current_app.extensions.get('db_replicas')
+    return router.status() if router is not None else {}
+
+
+def init_app(app):
+    """Ativa o roteamento se houver réplicas configuradas"""
+    keys = replica_keys(app)
+    if not keys:
+        app.extensions['db_replicas'] = None
+        return
+
+    router = ReplicaRouter(
+        keys,
+        check_interval=app.config['DB_REPLICA_CHECK_INTERVAL'],
+        retry_seconds=app.config['DB_REPLICA_RETRY_SECONDS']
+    )
+    app.extensions['db_replicas'] = router
+
+    with app.app_context():
+        for key in keys:
+            def on_error(context, key=key):
+                if context.is_disconnect:
+                    router.mark_down(key)
+            event.listen(db.engines[key], 'handle_error', on_error)
+
+    pin_seconds = app.config['DB_REPLICA_PIN_SECONDS']
+
+    @app.after_request
+    def pin_after_write(response):
+        # Leitura das próprias escritas: próximas requisições do usuário no primário
+        if request.method not in SAFE_METHODS and response.status_code < 400 and pin_seconds > 0:
+            session[PIN_KEY] = time.time() + pin_seconds
+        return response
@@ -0,0 +1,343 @@
+"""Agregados mensais de etapas concluídas mantidos incrementalmente.
+
+A tabela ``monthly_completions`` guarda, por (mês de ``end_date``, etapa, bairro
+do imóvel), quantos registros de etapas estão concluídos. Cada registro com
+``status = 'completed'`` e ``end_date`` preenchida conta uma vez na chave
+correspondente; a chave muda quando o registro entra ou sai de ``completed``,
+quando ``end_date`` muda de mês ou quando o bairro do imóvel muda.
+
+Na mesma chave, ``step_duration_buckets`` guarda o histograma da duração
+(``end_date - start_date``, em dias) dos registros concluídos com
+``start_date``, em faixas fixas (``services/histograms.py``): somando as faixas
+das chaves selecionadas obtém-se média, percentis e outliers por etapa sem
+reler os registros. Os ajustes são aplicados na mesma transação da escrita:
+
+* pelos eventos da sessão (``after_flush``), com os valores anteriores obtidos
+  do histórico dos atributos;
+* pela atualização em lote, reagregando os registros afetados antes e depois
+  do ``UPDATE``.
+
+O progresso mensal e as métricas de performance do dashboard passam a ser
+leituras de poucas linhas pela chave primária, em PostgreSQL e SQLite, com
+filtros por período, etapa e bairro.
+"""
+from collections import Counter
+from datetime import date
+
+import click
+from sqlalchemy import event, func, inspect, literal_column, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db
+from src.models.monthly_completion import MonthlyCompletion
+from src.models.property import Property
+from src.models.regularization_step import RegularizationStep
+from src.models.sql_functions import days_between, month_start
+from src.models.step_duration_bucket import StepDurationBucket
+from src.models.step_record import StepRecord
+from src.services.histograms import DurationHistogram, bucket_of
+
+CHUNK_SIZE = 1000
+
+# Atributos que mudam a chave ou a duração de um registro concluído
+WATCHED_ATTRIBUTES = ('status', 'start_date', 'end_date', 'step_id', 'property_id')
+
+_listener_registered = False
+
+
+def month_of(value):
+    """Primeiro dia do mês de uma data"""
+    return date(value.year, value.month, 1)
+
+
+def months_back(today, months):
+    """Primeiro dia do mês ``months - 1`` meses antes do mês de ``today``"""
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class RollupDeltas:
+    """Ajustes das conclusões mensais e do histograma de durações"""
+
+    def __init__(self):
+        self.completions = Counter()
+        self.duration_records = Counter()
+        self.duration_days = Counter()
+
+    def add(self, key, days, count):
+        """Soma ``count`` registros (negativo para remover) com a duração informada na chave"""
+        self.completions[key] += count
+        if days is not None and days >= 0:
+            bucket = key + (bucket_of(days),)
+            self.duration_records[bucket] += count
+            self.duration_days[bucket] += count * days
+
+    def add_record(self, status, start_date, end_date, step_id, neighborhood, count):
+        """Soma um registro se ele estiver concluído (status completed e end_date preenchida)"""
+        if status != 'completed' or end_date is None or step_id is None:
+            return
+        days = (end_date - start_date).days if start_date is not None else None
+        self.add((month_of(end_date), step_id, neighborhood or ''), days, count)
+
+    def apply(self, connection):
+        """Grava os ajustes não nulos.
+
+        Linhas que chegam a zero são mantidas (ignoradas na leitura) para que cada
+        ajuste custe uma única instrução; a reconstrução as remove.
+        """
+        now = func.current_timestamp()
+        for (month, step_id, neighborhood), delta in sorted(self.completions.items()):
+            if delta:
+                _upsert(connection, MonthlyCompletion.__table__,
+                        {'month': month, 'step_id': step_id, 'neighborhood': neighborhood},
+                        {'completed_steps': delta}, {'updated_at': now})
+        for (month, step_id, neighborhood, bucket), delta in sorted(self.duration_records.items()):
+            days = self.duration_days[(month, step_id, neighborhood, bucket)]
+            if delta or days:
+                _upsert(connection, StepDurationBucket.__table__,
+                        {'month': month, 'step_id': step_id, 'neighborhood': neighborhood, 'bucket': bucket},
+                        {'records': delta, 'total_days': days})
+
+
+def _upsert_insert(connection, table):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    return None
+
+
+def _upsert(connection, table, key, increments, values=None):
+    """Soma ``increments`` à linha da chave, criando-a se não existir"""
+    values = values or {}
+    insert = _upsert_insert(connection, table)
+    if insert is not None:
+        connection.execute(insert.values(**key, **increments, **values).on_conflict_do_update(
+            index_elements=[table.c[name] for name in key],
+            set_={**{name: table.c[name] + delta for name, delta in increments.items()}, **values}
+        ))
+        return
+
+    criteria = [table.c[name] == value for name, value in key.items()]
+    updated = connection.execute(table.update().where(*criteria).values(
+        **{name: table.c[name] + delta for name, delta in increments.items()}, **values
+    )).rowcount
+    if not updated:
+        connection.execute(table.insert().values(**key, **increments, **values))
+
+
+def _previous(obj, attribute):
+    """Valor do atributo antes deste flush"""
+    history = inspect(obj).attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(obj, attribute)
+
+
+def _neighborhoods(session, property_ids):
+    """Bairro anterior e atual de cada imóvel: {id: (antes, depois)}"""
+    result = {}
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Property) and obj.id in property_ids:
+            result[obj.id] = (_previous(obj, 'address_neighborhood'), obj.address_neighborhood)
+
+    missing = [property_id for property_id in property_ids if property_id not in result]
+    if missing:
+        table = Property.__table__
+        for property_id, neighborhood in session.connection().execute(
+            select(table.c.id, table.c.address_neighborhood).where(table.c.id.in_(missing))
+        ):
+            result[property_id] = (neighborhood, neighborhood)
+    return result
+
+
+def _moved_deltas(connection, moved, flushed_ids, deltas):
+    """Registros concluídos de imóveis que mudaram de bairro (exceto os já tratados no flush)"""
+    table = StepRecord.__table__
+    criteria = [table.c.property_id.in_(list(moved)), table.c.id.notin_(flushed_ids or [0])]
+    for month, step_id, _, days, property_id, count in completed_rows(connection, criteria, table.c.property_id):
+        old, new = moved[property_id]
+        deltas.add((month, step_id, old or ''), days, -count)
+        deltas.add((month, step_id, new or ''), days, count)
+
+
+def _counted(status, end_date):
+    return status == 'completed' and end_date is not None
+
+
+def _after_flush(session, flush_context):
+    # (registro, contava antes do flush, conta depois do flush)
+    records = []
+    for obj in session.new:
+        if isinstance(obj, StepRecord):
+            records.append((obj, False, _counted(obj.status, obj.end_date)))
+    for obj in session.deleted:
+        if isinstance(obj, StepRecord):
+            records.append((obj, _counted(_previous(obj, 'status'), _previous(obj, 'end_date')), False))
+    for obj in session.dirty:
+        if isinstance(obj, StepRecord) and obj not in session.deleted:
+            state = inspect(obj).attrs
+            if any(state[name].history.has_changes() for name in WATCHED_ATTRIBUTES):
+                records.append((
+                    obj,
+                    _counted(_previous(obj, 'status'), _previous(obj, 'end_date')),
+                    _counted(obj.status, obj.end_date)
+                ))
+    records = [record for record in records if record[1] or record[2]]
+
+    changed_properties = [
+        obj for obj in session.dirty
+        if isinstance(obj, Property) and obj not in session.deleted
+        and inspect(obj).attrs.address_neighborhood.history.has_changes()
+    ]
+    if not records and not changed_properties:
+        return
+
+    property_ids = {obj.property_id for obj, _, has_new in records if has_new}
+    property_ids.update(_previous(obj, 'property_id') for obj, had_old, _ in records if had_old)
+    property_ids.update(obj.id for obj in changed_properties)
+    neighborhoods = _neighborhoods(session, property_ids)
+
+    deltas = RollupDeltas()
+    for obj, had_old, has_new in records:
+        if had_old:
+            deltas.add_record(
+                _previous(obj, 'status'), _previous(obj, 'start_date'), _previous(obj, 'end_date'),
+                _previous(obj, 'step_id'), neighborhoods.get(_previous(obj, 'property_id'), (None, None))[0], -1
+            )
+        if has_new:
+            deltas.add_record(
+                obj.status, obj.start_date, obj.end_date, obj.step_id,
+                neighborhoods.get(obj.property_id, (None, None))[1], 1
+            )
+
+    moved = {obj.id: neighborhoods[obj.id] for obj in changed_properties if obj.id in neighborhoods}
+    if moved:
+        _moved_deltas(session.connection(), moved, [obj.id for obj, _, _ in records if obj.id], deltas)
+
+    deltas.apply(session.connection())
+
+
+def completed_rows(connection, criteria, *group_by):
+    """Registros concluídos que satisfazem ``criteria``, contados por
+    (mês, etapa, bairro, duração em dias, *group_by)"""
+    records = StepRecord.__table__
+    properties = Property.__table__
+    month = month_start(records.c.end_date)
+    # Literal no próprio SQL: a mesma expressão no SELECT e no GROUP BY
+    neighborhood = func.coalesce(properties.c.address_neighborhood, literal_column("''"))
+    days = days_between(records.c.start_date, records.c.end_date)
+    columns = [month, records.c.step_id, neighborhood, days, *group_by]
+    statement = select(*columns, func.count())\
+        .select_from(records.join(properties, properties.c.id == records.c.property_id))\
+        .where(*criteria, records.c.status == 'completed', records.c.end_date.isnot(None))\
+        .group_by(*columns)
+    return connection.execute(statement).all()
+
+
+def add_record_ids(connection, deltas, record_ids, sign):
+    """Soma (sign=1) ou subtrai (sign=-1) a contribuição atual dos registros informados"""
+    table = StepRecord.__table__
+    for start in range(0, len(record_ids), CHUNK_SIZE):
+        chunk = record_ids[start:start + CHUNK_SIZE]
+        for month, step_id, neighborhood, days, count in completed_rows(connection, [table.c.id.in_(chunk)]):
+            deltas.add((month, step_id, neighborhood), days, sign * count)
+
+
+def rebuild_monthly_completions():
+    """Reconstrói os agregados (conclusões e durações) a partir dos registros de etapas (não faz commit)"""
+    connection = db.session.connection()
+    totals = RollupDeltas()
+    for month, step_id, neighborhood, days, count in completed_rows(connection, []):
+        totals.add((month, step_id, neighborhood), days, count)
+
+    completions, durations = MonthlyCompletion.__table__, StepDurationBucket.__table__
+    connection.execute(completions.delete())
+    connection.execute(durations.delete())
+    if totals.completions:
+        connection.execute(completions.insert(), [
+            {'month': month, 'step_id': step_id, 'neighborhood': neighborhood, 'completed_steps': count}
+            for (month, step_id, neighborhood), count in sorted(totals.completions.items())
+        ])
+    if totals.duration_records:
+        connection.execute(durations.insert(), [
+            {'month': month, 'step_id': step_id, 'neighborhood': neighborhood, 'bucket': bucket,
+             'records': count, 'total_days': totals.duration_days[(month, step_id, neighborhood, bucket)]}
+            for (month, step_id, neighborhood, bucket), count in sorted(totals.duration_records.items())
+        ])
+    return totals
+
+
+def _read_or_rebuild(query, model):
+    rows = query.all()
+    if not rows and db.session.query(model.month).first() is None:
+        # A reconstrução escreve: nunca em uma réplica
+        db.session().use_primary()
+        rebuild_monthly_completions()
+        db.session.commit()
+        rows = query.all()
+    return rows
+
+
+def _filter_key(query, model, start_month, step_id, neighborhood):
+    if start_month:
+        query = query.filter(model.month >= start_month)
+    if step_id:
+        query = query.filter(model.step_id == step_id)
+    if neighborhood:
+        query = query.filter(func.lower(model.neighborhood) == neighborhood.lower())
+    return query
+
+
+def monthly_completions(start_month, step_id=None, neighborhood=None):
+    """Etapas concluídas por mês a partir de ``start_month``, reconstruindo o agregado se vazio"""
+    query = db.session.query(
+        MonthlyCompletion.month,
+        func.sum(MonthlyCompletion.completed_steps)
+    ).filter(MonthlyCompletion.completed_steps > 0)
+    query = _filter_key(query, MonthlyCompletion, start_month, step_id, neighborhood)
+    query = query.group_by(MonthlyCompletion.month).order_by(MonthlyCompletion.month)
+    return _read_or_rebuild(query, MonthlyCompletion)
+
+
+def step_durations(start_month=None, step_id=None, neighborhood=None):
+    """Histograma de duração de cada etapa (concluídas a partir de ``start_month``).
+
+    Retorna [(etapa, DurationHistogram)] na ordem do processo.
+    """
+    query = db.session.query(
+        RegularizationStep.id,
+        RegularizationStep.name,
+        StepDurationBucket.bucket,
+        func.sum(StepDurationBucket.records),
+        func.sum(StepDurationBucket.total_days)
+    ).join(RegularizationStep, StepDurationBucket.step_id == RegularizationStep.id)\
+     .filter(StepDurationBucket.records > 0)
+    query = _filter_key(query, StepDurationBucket, start_month, step_id, neighborhood)
+    query = query.group_by(
+        RegularizationStep.id, RegularizationStep.name, RegularizationStep.order_sequence, StepDurationBucket.bucket
+    ).order_by(RegularizationStep.order_sequence, RegularizationStep.id)
+
+    histograms = {}
+    for step, name, bucket, records, total_days in _read_or_rebuild(query, StepDurationBucket):
+        histograms.setdefault((step, name), DurationHistogram()).add(bucket, int(records), int(total_days))
+    return list(histograms.items())
+
+
+@click.command('rebuild-monthly-completions')
+def rebuild_monthly_completions_command():
+    """Reconstrói os agregados mensais de etapas concluídas e de durações a partir dos registros."""
+    totals = rebuild_monthly_completions()
+    db.session.commit()
+    click.echo(
+        f'{len(totals.completions)} linhas, {sum(totals.completions.values())} etapas concluídas, '
+        f'{sum(totals.duration_records.values())} com duração'
+    )
+
+
+def init_app(app):
+    """Registra a manutenção dos agregados mensais e o comando de reconstrução"""
+    global _listener_registered
+    if not _listener_registered:
+        event.listen(db.session, 'after_flush', _after_flush)
+        _listener_registered = True
+    app.cli.add_command(rebuild_monthly_completions_command)
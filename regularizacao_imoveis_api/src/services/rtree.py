@@ -0,0 +1,94 @@
+"""R-tree estática em Python puro (carga em lote Sort-Tile-Recursive).
+
+Índice espacial de retângulos (pontos são retângulos degenerados) usado
+quando o banco não tem índices espaciais. A árvore é montada de uma vez a
+partir de todas as entradas e consultada por interseção com retângulo e por
+vizinhos mais próximos (busca best-first com fila de prioridade).
+"""
+import heapq
+import math
+
+NODE_CAPACITY = 16
+
+
+class RTree:
+    """Entradas: sequência de (min_x, min_y, max_x, max_y, item)"""
+
+    def __init__(self, entries, node_capacity=NODE_CAPACITY):
+        self.node_capacity = node_capacity
+        self.size = len(entries)
+        # Nós: (min_x, min_y, max_x, max_y, filhos, folha); filhos de folhas são entradas
+        level = self._pack([(e[0], e[1], e[2], e[3], e) for e in entries], leaf=True)
+        while len(level) > 1:
+            level = self._pack(level, leaf=False)
+        self.root = level[0] if level else None
+
+    def __len__(self):
+        return self.size
+
+    def _pack(self, boxes, leaf):
+        """Agrupa os retângulos em nós: fatias por x, depois blocos por y"""
+        capacity = self.node_capacity
+        node_count = math.ceil(len(boxes) / capacity)
+        slice_count = math.ceil(math.sqrt(node_count))
+        slice_size = slice_count * capacity
+
+        boxes = sorted(boxes, key=lambda box: box[0] + box[2])
+        nodes = []
+        for start in range(0, len(boxes), slice_size):
+            vertical_slice = sorted(boxes[start:start + slice_size], key=lambda box: box[1] + box[3])
+            for offset in range(0, len(vertical_slice), capacity):
+                group = vertical_slice[offset:offset + capacity]
+                children = [box[4] for box in group] if leaf else group
+                nodes.append((
+                    min(box[0] for box in group), min(box[1] for box in group),
+                    max(box[2] for box in group), max(box[3] for box in group),
+                    children, leaf
+                ))
+        return nodes
+
+    def search(self, min_x, min_y, max_x, max_y):
+        """Itens cujo retângulo intersecta a janela"""
+        if self.root is None:
+            return []
+        results = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node[0] > max_x or node[2] < min_x or node[1] > max_y or node[3] < min_y:
+                continue
+            if node[5]:
+                results.extend(
+                    entry[4] for entry in node[4]
+                    if not (entry[0] > max_x or entry[2] < min_x or entry[1] > max_y or entry[3] < min_y)
+                )
+            else:
+                stack.extend(node[4])
+        return results
+
+    def nearest(self, x, y, k=1, x_scale=1.0):
+        """Os k itens mais próximos de (x, y), como (distância², item).
+
+        ``x_scale`` corrige a distância no eixo x (cos da latitude para
+        coordenadas geográficas).
+        """
+        if self.root is None or k <= 0:
+            return []
+
+        def box_distance(box):
+            dx = max(box[0] - x, 0.0, x - box[2]) * x_scale
+            dy = max(box[1] - y, 0.0, y - box[3])
+            return dx * dx + dy * dy
+
+        results = []
+        counter = 0
+        heap = [(box_distance(self.root), counter, self.root, False)]
+        while heap and len(results) < k:
+            distance, _, element, is_entry = heapq.heappop(heap)
+            if is_entry:
+                results.append((distance, element[4]))
+                continue
+            for child in element[4]:
+                counter += 1
+                heapq.heappush(heap, (box_distance(child), counter, child, element[5]))
+        return results
@@ -0,0 +1,224 @@
+"""Busca textual indexada de imóveis.
+
+Substitui os três ``ILIKE '%termo%'`` (que sempre fazem varredura sequencial)
+por índices próprios de cada banco, com normalização sem acentos:
+
+* PostgreSQL: índices GIN ``pg_trgm`` e ``tsvector`` (configuração
+  ``portuguese``) sobre ``unaccent(lower(código || logradouro || proprietário))``,
+  com ranking por ``word_similarity``/``ts_rank``;
+* SQLite: duas tabelas FTS5 mantidas por triggers de insert/update/delete.
+  ``properties_fts`` (conteúdo externo, ``unicode61`` sem acentos) casa as
+  palavras por prefixo e dá o ranking por ``bm25``; ``properties_trgm``
+  (sem conteúdo, tokenizador ``trigram``) indexa o documento sem acentos e
+  encontra trechos no meio de palavras e códigos ("1234" em "MM0001234"), como
+  o ``LIKE`` do PostgreSQL, sem varrer a tabela. O SQLite não remove acentos
+  no ``trigram``: o documento é normalizado nos triggers com ``replace()``
+  (``SQLITE_ACCENTS``) e o termo com a mesma tabela;
+* demais bancos: ``ILIKE`` sem ranking.
+
+Os objetos são criados junto com a tabela ``properties`` (``db.create_all()``)
+e podem ser reconstruídos com ``flask rebuild-search-index``.
+"""
+import re
+import unicodedata
+
+import click
+from sqlalchemy import DDL, column, event, func, literal, literal_column, or_, select, table, text, union
+
+from src.models import db
+from src.models.property import Property
+
+# Expressão indexada no PostgreSQL; deve ser idêntica à dos índices abaixo
+PG_SEARCH_DOCUMENT = (
+    "immutable_unaccent(lower("
+    "coalesce(properties.municipal_code, '') || ' ' || "
+    "coalesce(properties.address_street, '') || ' ' || "
+    "coalesce(properties.current_owner, '')))"
+)
+
+# Índices criados por PG_SEARCH_DDL (conferidos por `flask check-indexes`)
+PG_SEARCH_INDEXES = ('idx_properties_search_trgm', 'idx_properties_search_tsv')
+
+PG_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() não é IMMUTABLE e não pode ser usada diretamente em índices
+    "CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text AS "
+    "$$ SELECT public.unaccent('public.unaccent', $1) $$ "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT",
+    f"CREATE INDEX IF NOT EXISTS idx_properties_search_trgm ON properties "
+    f"USING GIN ({PG_SEARCH_DOCUMENT} gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS idx_properties_search_tsv ON properties "
+    f"USING GIN (to_tsvector('portuguese'::regconfig, {PG_SEARCH_DOCUMENT}))",
+]
+
+# Letras acentuadas do português e a letra sem acento. Cada uma é um replace()
+# aninhado no trigger: o parser do SQLite não aceita muito mais que estas 24
+SQLITE_ACCENTS = {
+    'a': 'áàâãÁÀÂÃ', 'e': 'éêÉÊ', 'i': 'íÍ', 'o': 'óôõÓÔÕ', 'u': 'úÚ', 'c': 'çÇ',
+}
+_ACCENT_TABLE = str.maketrans({accented: plain for plain, letters in SQLITE_ACCENTS.items() for accented in letters})
+
+
+def _sqlite_document(row):
+    """Documento da tabela trigram para a linha ``new``/``old`` do trigger, sem acentos"""
+    document = (f"coalesce({row}.municipal_code, '') || ' ' || coalesce({row}.address_street, '') "
+                f"|| ' ' || coalesce({row}.current_owner, '')")
+    for plain, letters in SQLITE_ACCENTS.items():
+        for accented in letters:
+            document = f"replace({document}, '{accented}', '{plain}')"
+    return document
+
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5("
+    "municipal_code, address_street, current_owner, "
+    "content='properties', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS properties_fts_insert AFTER INSERT ON properties BEGIN "
+    "INSERT INTO properties_fts(rowid, municipal_code, address_street, current_owner) "
+    "VALUES (new.id, new.municipal_code, new.address_street, new.current_owner); END",
+    "CREATE TRIGGER IF NOT EXISTS properties_fts_delete AFTER DELETE ON properties BEGIN "
+    "INSERT INTO properties_fts(properties_fts, rowid, municipal_code, address_street, current_owner) "
+    "VALUES ('delete', old.id, old.municipal_code, old.address_street, old.current_owner); END",
+    "CREATE TRIGGER IF NOT EXISTS properties_fts_update "
+    "AFTER UPDATE OF municipal_code, address_street, current_owner ON properties BEGIN "
+    "INSERT INTO properties_fts(properties_fts, rowid, municipal_code, address_street, current_owner) "
+    "VALUES ('delete', old.id, old.municipal_code, old.address_street, old.current_owner); "
+    "INSERT INTO properties_fts(rowid, municipal_code, address_street, current_owner) "
+    "VALUES (new.id, new.municipal_code, new.address_street, new.current_owner); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS properties_trgm USING fts5("
+    "document, content='', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS properties_trgm_insert AFTER INSERT ON properties BEGIN "
+    f"INSERT INTO properties_trgm(rowid, document) VALUES (new.id, {_sqlite_document('new')}); END",
+    "CREATE TRIGGER IF NOT EXISTS properties_trgm_delete AFTER DELETE ON properties BEGIN "
+    "INSERT INTO properties_trgm(properties_trgm, rowid, document) "
+    f"VALUES ('delete', old.id, {_sqlite_document('old')}); END",
+    "CREATE TRIGGER IF NOT EXISTS properties_trgm_update "
+    "AFTER UPDATE OF municipal_code, address_street, current_owner ON properties BEGIN "
+    "INSERT INTO properties_trgm(properties_trgm, rowid, document) "
+    f"VALUES ('delete', old.id, {_sqlite_document('old')}); "
+    f"INSERT INTO properties_trgm(rowid, document) VALUES (new.id, {_sqlite_document('new')}); END",
+]
+
+# Tabelas FTS5 do SQLite (fora do metadata do SQLAlchemy)
+properties_fts = table('properties_fts', column('rowid'), column('rank'))
+properties_trgm = table('properties_trgm', column('rowid'))
+
+_listeners_registered = False
+
+
+def normalize(term):
+    """Remove acentos e converte para minúsculas (mesma normalização dos índices)"""
+    decomposed = unicodedata.normalize('NFKD', term or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+
+def _fts_match_expression(term):
+    """Converte o termo em consulta FTS5: todos os tokens, cada um como prefixo"""
+    tokens = re.findall(r'\w+', normalize(term))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _trigram_match_expression(term):
+    """Termo sem acentos como frase da tabela trigram (trechos de 3 caracteres ou mais)"""
+    normalized = ' '.join(term.translate(_ACCENT_TABLE).lower().split())
+    if len(normalized) < 3:
+        return ''
+    return '"' + normalized.replace('"', '""') + '"'
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def apply_search(query, term):
+    """Filtra a query de imóveis pelo termo e ordena por relevância"""
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        normalized = normalize(term)
+        document = literal_column(PG_SEARCH_DOCUMENT)
+        config = literal_column("'portuguese'::regconfig")
+        ts_vector = func.to_tsvector(config, document)
+        ts_query = func.plainto_tsquery(config, normalized)
+        rank = func.greatest(func.word_similarity(normalized, document), func.ts_rank(ts_vector, ts_query))
+        return query.filter(
+            or_(document.like(f'%{_escape_like(normalized)}%', escape='\\'), ts_vector.op('@@')(ts_query))
+        ).order_by(rank.desc(), Property.id)
+
+    if dialect == 'sqlite':
+        match, trigram_match = _fts_match_expression(term), _trigram_match_expression(term)
+        if not match and not trigram_match:
+            return query.filter(literal(False))
+        # Palavras por prefixo (com ranking) ou trecho em qualquer posição: as duas
+        # consultas são buscas nos índices FTS5, sem varrer properties
+        matches = []
+        if match:
+            matches.append(select(properties_fts.c.rowid)
+                           .where(literal_column('properties_fts').op('MATCH')(match)))
+        if trigram_match:
+            matches.append(select(properties_trgm.c.rowid)
+                           .where(literal_column('properties_trgm').op('MATCH')(trigram_match)))
+        query = query.filter(Property.id.in_(union(*matches) if len(matches) > 1 else matches[0]))
+        if not match:
+            return query.order_by(Property.id)
+        hits = select(properties_fts.c.rowid, properties_fts.c.rank)\
+            .where(literal_column('properties_fts').op('MATCH')(match))\
+            .subquery('fts_hits')
+        # rank da FTS5 equivale a bm25(): menor é mais relevante; trechos sem palavra casada por último
+        return query\
+            .outerjoin(hits, hits.c.rowid == Property.id)\
+            .order_by(hits.c.rank.is_(None), hits.c.rank, Property.id)
+
+    return query.filter(
+        (Property.municipal_code.ilike(f'%{term}%')) |
+        (Property.address_street.ilike(f'%{term}%')) |
+        (Property.current_owner.ilike(f'%{term}%'))
+    ).order_by(Property.id)
+
+
+def _create_search_objects(target, connection, **kw):
+    statements = {'postgresql': PG_SEARCH_DDL, 'sqlite': SQLITE_SEARCH_DDL}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.execute(DDL(statement))
+
+
+def _drop_search_objects(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(DDL('DROP TABLE IF EXISTS properties_fts'))
+        connection.execute(DDL('DROP TABLE IF EXISTS properties_trgm'))
+
+
+def rebuild_search_index():
+    """Recria os objetos de busca e reindexa todos os imóveis (não faz commit)"""
+    connection = db.session.connection()
+    _create_search_objects(Property.__table__, connection)
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("INSERT INTO properties_fts(properties_fts) VALUES ('rebuild')"))
+        # Tabela sem conteúdo: não há 'rebuild', o documento é recalculado a partir de properties
+        connection.execute(text("INSERT INTO properties_trgm(properties_trgm) VALUES ('delete-all')"))
+        connection.execute(text(
+            f"INSERT INTO properties_trgm(rowid, document) SELECT id, {_sqlite_document('properties')} FROM properties"
+        ))
+    elif connection.dialect.name == 'postgresql':
+        for name in PG_SEARCH_INDEXES:
+            connection.execute(text(f'REINDEX INDEX {name}'))
+
+
+@click.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Recria e reindexa a busca textual de imóveis."""
+    rebuild_search_index()
+    db.session.commit()
+    click.echo('Índice de busca de imóveis reconstruído')
+
+
+def init_app(app):
+    """Registra a criação dos objetos de busca junto com a tabela e o comando de reconstrução"""
+    global _listeners_registered
+    if not _listeners_registered:
+        event.listen(Property.__table__, 'after_create', _create_search_objects)
+        event.listen(Property.__table__, 'before_drop', _drop_search_objects)
+        _listeners_registered = True
+    app.cli.add_command(rebuild_search_index_command)
@@ -0,0 +1,228 @@
+"""Consultas espaciais de imóveis: retângulo, raio e vizinhos mais próximos.
+
+* PostgreSQL/PostGIS: predicados servidos pelos índices GIST —
+  ``ST_Intersects`` sobre ``geometry``/``polygon_geometry`` e ``ST_DWithin``/KNN
+  ``<->`` sobre o índice de expressão ``CAST(geometry AS geography)``
+  (distâncias em metros; declarado no modelo com a mesma expressão);
+* demais bancos (SQLite): R-tree em memória (``services/rtree.py``) com os
+  pontos e os retângulos envolventes dos polígonos, reconstruída quando a
+  versão das alterações de imóveis (``services/property_changes.py``) muda.
+  Para polígonos, o filtro por retângulo usa o retângulo envolvente.
+"""
+import math
+
+from flask import current_app
+from geoalchemy2 import Geography
+from sqlalchemy import cast, func, or_
+
+from src.models import db
+from src.models.property import Property
+from src.services import property_changes, wkb
+from src.services.rtree import RTree
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+MAX_RESULTS = 5000
+MAX_NEIGHBOURS = 100
+
+
+def parse_bbox(value):
+    """Converte ``min_lng,min_lat,max_lng,max_lat`` em tupla de floats"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = [float(part) for part in (value or '').split(',')]
+    except ValueError:
+        raise ValueError('bbox deve ser min_lng,min_lat,max_lng,max_lat')
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ValueError('bbox com limites invertidos')
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_point(args):
+    """Latitude e longitude obrigatórias da query string"""
+    lat, lng = args.get('lat', type=float), args.get('lng', type=float)
+    if lat is None or lng is None:
+        raise ValueError('Parâmetros lat e lng são obrigatórios')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Latitude/longitude inválidas')
+    return lat, lng
+
+
+def haversine(lng1, lat1, lng2, lat2):
+    """Distância em metros entre dois pontos"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _use_postgis():
+    return db.engine.dialect.name == 'postgresql'
+
+
+# --- PostGIS ---------------------------------------------------------------
+
+def _pg_point(lat, lng):
+    return cast(func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326), Geography)
+
+
+def _pg_query(*columns):
+    return db.session.query(
+        Property,
+        func.ST_X(Property.geometry).label('longitude'),
+        func.ST_Y(Property.geometry).label('latitude'),
+        *columns
+    )
+
+
+def _pg_results(rows, with_distance):
+    results = []
+    for row in rows:
+        coordinates = {'latitude': row.latitude, 'longitude': row.longitude} if row.latitude is not None else None
+        results.append((row[0], row.distance if with_distance else None, coordinates))
+    return results
+
+
+# --- Fallback (R-tree em memória) -------------------------------------------
+
+class SpatialIndex:
+    """R-trees dos imóveis (pontos e polígonos) e só dos pontos, com coordenadas por id"""
+
+    def __init__(self, version, entries, points):
+        self.version = version
+        self.tree = RTree(entries)
+        self.point_tree = RTree([(x, y, x, y, property_id) for property_id, (x, y) in points.items()])
+        self.points = points
+
+
+def build_index(version=None):
+    """Lê as geometrias de todos os imóveis e monta a R-tree"""
+    # A versão é lida antes das linhas: uma alteração confirmada no meio da
+    # leitura apenas provoca outra reconstrução
+    version = property_changes.current_version() if version is None else version
+    entries = []
+    points = {}
+    rows = db.session.query(Property.id, Property.geometry, Property.polygon_geometry)\
+        .order_by(Property.id)\
+        .yield_per(5000)
+    for property_id, point, polygon in rows:
+        point, polygon = wkb.decode(point), wkb.decode(polygon)
+        if point:
+            points[property_id] = tuple(point['coordinates'])
+            entries.append(wkb.bounds(point) + (property_id,))
+        if polygon:
+            entries.append(wkb.bounds(polygon) + (property_id,))
+    return SpatialIndex(version, entries, points)
+
+
+def fallback_index():
+    """Índice do processo atual, reconstruído se a tabela mudou"""
+    version = property_changes.current_version()
+    index = current_app.extensions.get('spatial_index')
+    if index is None or index.version != version:
+        index = build_index(version)
+        current_app.extensions['spatial_index'] = index
+    return index
+
+
+def _distance_to(index, property_id, lat, lng):
+    point = index.points[property_id]
+    return haversine(lng, lat, point[0], point[1])
+
+
+def _load_in_order(index, ranked):
+    """Carrega os imóveis de [(id, distância)] preservando a ordem"""
+    ids = [property_id for property_id, _ in ranked]
+    properties = {prop.id: prop for prop in Property.query.filter(Property.id.in_(ids))} if ids else {}
+    results = []
+    for property_id, distance in ranked:
+        point = index.points.get(property_id)
+        coordinates = {'latitude': point[1], 'longitude': point[0]} if point else None
+        if property_id in properties:
+            results.append((properties[property_id], distance, coordinates))
+    return results
+
+
+# --- Consultas ---------------------------------------------------------------
+
+def within(bbox, limit=MAX_RESULTS):
+    """Imóveis cujo ponto ou polígono intersecta o retângulo"""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if _use_postgis():
+        envelope = func.ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+        rows = _pg_query()\
+            .filter(or_(
+                func.ST_Intersects(Property.geometry, envelope),
+                func.ST_Intersects(Property.polygon_geometry, envelope)
+            ))\
+            .order_by(Property.id)\
+            .limit(limit)\
+            .all()
+        return _pg_results(rows, with_distance=False)
+
+    index = fallback_index()
+    ids = sorted(set(index.tree.search(min_lng, min_lat, max_lng, max_lat)))[:limit]
+    return _load_in_order(index, [(property_id, None) for property_id in ids])
+
+
+def near(lat, lng, radius, limit=MAX_RESULTS):
+    """Imóveis até ``radius`` metros do ponto, do mais próximo ao mais distante"""
+    if _use_postgis():
+        point = _pg_point(lat, lng)
+        geography = cast(Property.geometry, Geography)
+        rows = _pg_query(func.ST_Distance(geography, point).label('distance'))\
+            .filter(func.ST_DWithin(geography, point, radius))\
+            .order_by(geography.op('<->')(point), Property.id)\
+            .limit(limit)\
+            .all()
+        return _pg_results(rows, with_distance=True)
+
+    index = fallback_index()
+    # Pré-filtro pelo retângulo que contém o círculo, depois distância exata
+    d_lat = radius / METERS_PER_DEGREE
+    d_lng = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+    ranked = []
+    for property_id in index.point_tree.search(lng - d_lng, lat - d_lat, lng + d_lng, lat + d_lat):
+        distance = _distance_to(index, property_id, lat, lng)
+        if distance <= radius:
+            ranked.append((property_id, distance))
+    ranked.sort(key=lambda item: (item[1], item[0]))
+    return _load_in_order(index, ranked[:limit])
+
+
+def nearest(lat, lng, k=10):
+    """Os k imóveis (com ponto) mais próximos do ponto"""
+    if _use_postgis():
+        point = _pg_point(lat, lng)
+        geography = cast(Property.geometry, Geography)
+        rows = _pg_query(func.ST_Distance(geography, point).label('distance'))\
+            .filter(Property.geometry.isnot(None))\
+            .order_by(geography.op('<->')(point), Property.id)\
+            .limit(k)\
+            .all()
+        return _pg_results(rows, with_distance=True)
+
+    index = fallback_index()
+    candidates = index.point_tree.nearest(lng, lat, k=k, x_scale=math.cos(math.radians(lat)))
+    ranked = sorted(
+        ((property_id, _distance_to(index, property_id, lat, lng)) for _, property_id in candidates),
+        key=lambda item: (item[1], item[0])
+    )
+    return _load_in_order(index, ranked)
+
+
+def serialize(results):
+    """Imóveis com coordenadas e, quando houver, distância em metros"""
+    serialized = []
+    for property_obj, distance, coordinates in results:
+        data = property_obj.to_dict()
+        data['coordinates'] = coordinates
+        if distance is not None:
+            data['distance_m'] = round(distance, 1)
+        serialized.append(data)
+    return serialized
+
+
+def init_app(app):
+    """A R-tree é montada na primeira consulta (o índice geography é declarado no modelo)"""
+    app.extensions['spatial_index'] = None
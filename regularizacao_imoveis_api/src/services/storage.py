@@ -0,0 +1,263 @@
+"""Armazenamento de documentos endereçado por conteúdo.
+
+O upload é copiado em blocos de tamanho fixo para um arquivo temporário
+enquanto o SHA-256 é calculado; em seguida o arquivo é renomeado atomicamente
+para ``documents/<ab>/<cd>/<sha256>``. Conteúdos idênticos (as mesmas certidões
+e plantas anexadas a vários imóveis) são gravados uma única vez.
+
+A tabela ``document_blobs`` guarda a contagem de referências de cada blob,
+ajustada na mesma transação em que documentos são inseridos ou excluídos
+(inclusive por cascata a partir de imóveis e registros de etapas). O arquivo
+é apagado pelo evento ``document_blob.orphaned`` do outbox, publicado na
+transação que remove a última referência (``services/outbox.py``). O upload e
+a remoção bloqueiam a linha do blob antes de mexer no arquivo, de modo que um
+upload do mesmo conteúdo em andamento nunca perde o arquivo.
+
+Os downloads usam o SHA-256 como ETag forte e respondem a ``Range``,
+``If-None-Match`` e ``If-Modified-Since``; opcionalmente a entrega dos bytes é
+delegada ao proxy (``X-Accel-Redirect``/``X-Sendfile``) após a autorização.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+from collections import Counter
+
+import click
+from flask import current_app, request, send_file
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db
+from src.models.document import Document
+from src.models.document_blob import DocumentBlob
+from src.services import outbox
+
+_listeners_registered = False
+
+
+def storage_root():
+    """Diretório raiz dos blobs de documentos"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents')
+
+
+def blob_path(sha256, root=None):
+    """Caminho fragmentado do blob: <raiz>/ab/cd/<sha256>"""
+    return os.path.join(root or storage_root(), sha256[:2], sha256[2:4], sha256)
+
+
+def store_stream(stream, chunk_size=None):
+    """Grava o conteúdo do stream no armazenamento e retorna (sha256, caminho, tamanho)"""
+    root = storage_root()
+    chunk_size = chunk_size or current_app.config.get('DOCUMENT_CHUNK_SIZE', 1048576)
+    temp_dir = os.path.join(root, 'tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                temp_file.write(chunk)
+                size += len(chunk)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256, root)
+        # Com a linha do blob bloqueada até o commit, a remoção de um blob órfão
+        # com o mesmo conteúdo espera esta transação e passa a ver a nova referência
+        lock_blob(db.session.connection(), sha256, path, size)
+        if os.path.exists(path):
+            # Conteúdo já armazenado: descartar a cópia temporária
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return sha256, path, size
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _upsert_insert(connection):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(DocumentBlob.__table__)
+    if dialect == 'sqlite':
+        return sqlite.insert(DocumentBlob.__table__)
+    return None
+
+
+def add_references(connection, references):
+    """Incrementa a contagem de referências; references: {sha256: (caminho, tamanho, n)}"""
+    table = DocumentBlob.__table__
+    insert = _upsert_insert(connection)
+    for sha256, (path, size, count) in references.items():
+        if insert is not None:
+            statement = insert.values(sha256=sha256, file_path=path, file_size=size, ref_count=count)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.sha256],
+                set_={'ref_count': table.c.ref_count + count}
+            ))
+            continue
+
+        updated = connection.execute(
+            table.update().where(table.c.sha256 == sha256).values(ref_count=table.c.ref_count + count)
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(sha256=sha256, file_path=path, file_size=size, ref_count=count))
+
+
+def lock_blob(connection, sha256, path, size=0):
+    """Bloqueia a linha do blob até o fim da transação (criando-a sem referências) e retorna ref_count.
+
+    O upload que reaproveita ou grava o arquivo e a remoção de um arquivo órfão
+    passam por este bloqueio, e portanto nunca acontecem ao mesmo tempo.
+    """
+    add_references(connection, {sha256: (path, size, 0)})
+    table = DocumentBlob.__table__
+    return connection.execute(
+        table.select().with_only_columns(table.c.ref_count).where(table.c.sha256 == sha256)
+    ).scalar()
+
+
+def remove_unreferenced_blob(connection, sha256, path):
+    """Apaga o arquivo se nenhum documento o referencia, sob o bloqueio da linha; retorna True se apagou"""
+    if lock_blob(connection, sha256, path) > 0:
+        return False
+    table = DocumentBlob.__table__
+    connection.execute(table.delete().where(table.c.sha256 == sha256))
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def release_references(connection, releases):
+    """Decrementa referências; retorna os caminhos dos blobs que ficaram sem referência"""
+    table = DocumentBlob.__table__
+    orphans = []
+    for sha256, count in releases.items():
+        connection.execute(
+            table.update().where(table.c.sha256 == sha256).values(ref_count=table.c.ref_count - count)
+        )
+        path = connection.execute(
+            table.select().with_only_columns(table.c.file_path)
+            .where(table.c.sha256 == sha256, table.c.ref_count <= 0)
+        ).scalar()
+        if path:
+            connection.execute(table.delete().where(table.c.sha256 == sha256))
+            orphans.append((sha256, path))
+    return orphans
+
+
+def _after_flush(session, flush_context):
+    references = {}
+    releases = Counter()
+    for obj in session.new:
+        if isinstance(obj, Document) and obj.content_hash:
+            path, size, count = references.get(obj.content_hash, (obj.file_path, obj.file_size, 0))
+            references[obj.content_hash] = (path, size, count + 1)
+    for obj in session.deleted:
+        if isinstance(obj, Document) and obj.content_hash:
+            releases[obj.content_hash] += 1
+
+    if not references and not releases:
+        return
+
+    connection = session.connection()
+    if references:
+        add_references(connection, references)
+    if releases:
+        for sha256, path in release_references(connection, releases):
+            outbox.publish(session, 'document_blob.orphaned', {'sha256': sha256, 'path': path})
+
+
+def delete_orphan_blob(connection, payload, idempotency_key=None):
+    """Apaga o arquivo de um blob que ficou sem referência (evento document_blob.orphaned)"""
+    # Um novo upload do mesmo conteúdo pode ter recriado a referência
+    remove_unreferenced_blob(connection, payload['sha256'], payload['path'])
+
+
+def _offloaded_response(document, offload):
+    """Resposta sem corpo: o proxy entrega o arquivo (e trata Range)"""
+    response = current_app.response_class(status=200)
+    response.mimetype = document.file_type or 'application/octet-stream'
+    response.headers.set('Content-Disposition', 'attachment', filename=document.filename)
+    if document.content_hash:
+        response.set_etag(document.content_hash)
+    if document.created_at:
+        response.last_modified = document.created_at
+
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        return response
+
+    if offload == 'x-accel-redirect':
+        relative = os.path.relpath(document.file_path, storage_root()).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = posixpath.join(current_app.config['DOCUMENT_ACCEL_PREFIX'], relative)
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(document.file_path)
+    return response
+
+
+def send_document(document):
+    """Resposta de download do documento (206 para Range, 304 para requisições condicionais)"""
+    offload = current_app.config.get('DOCUMENT_OFFLOAD')
+    if offload in ('x-accel-redirect', 'x-sendfile'):
+        return _offloaded_response(document, offload)
+
+    # Blobs são imutáveis: o SHA-256 é uma ETag forte; documentos antigos usam a ETag padrão
+    return send_file(
+        os.path.abspath(document.file_path),
+        mimetype=document.file_type or None,
+        as_attachment=True,
+        download_name=document.filename,
+        conditional=True,
+        etag=document.content_hash or True
+    )
+
+
+@click.command('gc-document-blobs')
+@click.option('--min-age-minutes', default=60, show_default=True,
+              help='Ignora arquivos mais recentes (uploads ainda em andamento).')
+def gc_document_blobs_command(min_age_minutes):
+    """Remove do disco os blobs de documentos sem referência no banco."""
+    root = storage_root()
+    known = {sha256 for (sha256,) in db.session.query(DocumentBlob.sha256)}
+    cutoff = time.time() - min_age_minutes * 60
+    candidates = []
+    for directory, subdirectories, files in os.walk(root):
+        if os.path.relpath(directory, root).split(os.sep)[0] == 'tmp':
+            continue
+        for name in files:
+            path = os.path.join(directory, name)
+            if len(name) == 64 and name not in known and os.path.getmtime(path) < cutoff:
+                candidates.append((name, path))
+
+    # Conferência sob o bloqueio da linha: um upload pode ter reaproveitado o arquivo
+    removed = 0
+    connection = db.session.connection()
+    for sha256, path in candidates:
+        removed += remove_unreferenced_blob(connection, sha256, path)
+    db.session.commit()
+    click.echo(f'{removed} blobs sem referência removidos')
+
+
+def init_app(app):
+    """Registra a contagem de referências dos blobs e o comando de limpeza"""
+    global _listeners_registered
+    if not _listeners_registered:
+        event.listen(db.session, 'after_flush', _after_flush)
+        _listeners_registered = True
+    outbox.register('document_blob.orphaned', delete_orphan_blob)
+    app.cli.add_command(gc_document_blobs_command)
@@ -0,0 +1,315 @@
+"""Vector tiles (MVT) do mapa de imóveis com cache de tiles.
+
+Cada tile tem duas camadas com os atributos ``municipal_code`` e ``status``:
+``properties`` (pontos) e ``property_polygons`` (limites dos terrenos).
+
+* PostgreSQL/PostGIS: ``ST_AsMVT``/``ST_AsMVTGeom`` com filtro ``&&`` pelo
+  índice GIST;
+* demais bancos: R-tree do ``services/spatial.py`` e codificação em Python
+  (``services/mvt.py``).
+
+Os tiles ficam em um cache LRU em memória (``TILE_CACHE_SIZE`` tiles, com
+validade de ``TILE_CACHE_TTL`` segundos) e, se ``TILE_CACHE_DIR`` estiver
+configurado, também em disco, compartilhado entre os processos. Cada tile é
+guardado com a versão das alterações de imóveis (``services/property_changes.py``)
+lida antes de gerá-lo; o arquivo em disco leva a versão no cabeçalho. A cada
+requisição o processo lê a versão atual e carrega do registro as alterações
+que ainda não conhece (retângulo anterior e atual de cada imóvel); um tile só
+é servido se nenhuma alteração posterior à sua versão atinge o seu retângulo.
+Assim, ao alterar a geometria ou o status de um imóvel, apenas os tiles que
+cobrem a posição anterior e a nova deixam de valer, em todos os zooms e em
+todos os processos, e um tile gerado antes de um commit e gravado depois dele
+também é descartado.
+"""
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import select, text
+
+from src.models import db
+from src.models.property import Property
+from src.services import mvt, property_changes, spatial, wkb
+
+MAX_ZOOM = 22
+TILE_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+PG_TILE_SQL = text("""
+WITH bounds AS (
+    SELECT ST_TileEnvelope(:z, :x, :y) AS tile,
+           ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => :margin), 4326) AS filter
+),
+points AS (
+    SELECT p.id, p.municipal_code, p.regularization_status AS status,
+           ST_AsMVTGeom(ST_Transform(p.geometry, 3857), bounds.tile, :extent, :buffer, true) AS geom
+    FROM properties p, bounds
+    WHERE p.geometry && bounds.filter
+),
+polygons AS (
+    SELECT p.id, p.municipal_code, p.regularization_status AS status,
+           ST_AsMVTGeom(ST_Transform(p.polygon_geometry, 3857), bounds.tile, :extent, :buffer, true) AS geom
+    FROM properties p, bounds
+    WHERE p.polygon_geometry && bounds.filter
+)
+SELECT
+    coalesce((SELECT ST_AsMVT(points.*, 'properties', :extent, 'geom', 'id') FROM points WHERE geom IS NOT NULL), '') ||
+    coalesce((SELECT ST_AsMVT(polygons.*, 'property_polygons', :extent, 'geom', 'id') FROM polygons WHERE geom IS NOT NULL), '')
+""")
+
+# Versão das alterações de imóveis no início do arquivo do tile em disco
+FILE_HEADER = struct.Struct('>Q')
+# Acima disso, uma versão descarta todos os tiles anteriores (importações em lote)
+MAX_CHANGES_PER_VERSION = 1000
+# Retângulos alterados mantidos na memória do processo; tiles mais antigos consultam o registro
+MAX_TRACKED_CHANGES = 10000
+
+
+class TileCache:
+    """LRU de tiles em memória, com camada opcional em disco (z/x/y.mvt), validados pela versão"""
+
+    def __init__(self, max_entries=2048, ttl=600, directory=''):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        # chave -> (conteúdo, instante, versão em que o tile foi conferido)
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        # Alterações conhecidas: versões em (known_from, version], em ordem
+        self.version = None
+        self.known_from = None
+        self.change_versions = []
+        self.change_bounds = []
+
+    def _path(self, key):
+        z, x, y = key
+        return os.path.join(self.directory, str(z), str(x), f'{y}.mvt')
+
+    def _append(self, changes):
+        for version, bounds in changes:
+            self.change_versions.append(version)
+            self.change_bounds.append(bounds)
+        excess = len(self.change_versions) - MAX_TRACKED_CHANGES
+        if excess > 0:
+            self.known_from = self.change_versions[excess - 1]
+            del self.change_versions[:excess]
+            del self.change_bounds[:excess]
+
+    def sync(self, version):
+        """Carrega as alterações até a versão atual (lida antes de gerar qualquer tile)"""
+        with self.lock:
+            if self.version is None:
+                self.version = self.known_from = version
+                return
+            if version <= self.version:
+                return
+            changes = load_changes(self.version, version)
+            if changes is None:
+                # Registro não cobre o intervalo: nada anterior vale
+                self.entries.clear()
+                self.known_from = version
+                self.change_versions, self.change_bounds = [], []
+            else:
+                self._append(changes)
+            self.version = version
+
+    def _unchanged(self, key, version):
+        """True se nenhuma alteração posterior à versão atinge o tile"""
+        if version >= self.version:
+            return True
+        if version < self.known_from:
+            # Tile mais antigo que as alterações na memória (arquivo em disco, processo novo)
+            changes = load_changes(version, self.known_from)
+            if changes is None:
+                return False
+            bounds = [box for _, box in changes]
+        else:
+            bounds = []
+        bounds += self.change_bounds[bisect_right(self.change_versions, version):]
+
+        z, x, y = key
+        min_lng, min_lat, max_lng, max_lat = mvt.tile_bounds(z, x, y, buffer=mvt.BUFFER)
+        for box in bounds:
+            if box is None:
+                return False
+            if box[0] <= max_lng and box[2] >= min_lng and box[1] <= max_lat and box[3] >= min_lat:
+                return False
+        return True
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                data, stored_at, version = entry
+                if time.monotonic() - stored_at < self.ttl and self._unchanged(key, version):
+                    self.entries[key] = (data, stored_at, self.version)
+                    self.entries.move_to_end(key)
+                    return data
+                del self.entries[key]
+
+            if not self.directory:
+                return None
+            try:
+                with open(self._path(key), 'rb') as tile_file:
+                    content = tile_file.read()
+            except FileNotFoundError:
+                return None
+            if len(content) < FILE_HEADER.size or not self._unchanged(key, FILE_HEADER.unpack_from(content)[0]):
+                # Arquivo gravado antes de uma alteração que o atinge
+                self._remove_file(key)
+                return None
+            data = content[FILE_HEADER.size:]
+            self._remember(key, data, self.version)
+            return data
+
+    def _remember(self, key, data, version):
+        with self.lock:
+            self.entries[key] = (data, time.monotonic(), version)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def set(self, key, data, version):
+        """Guarda o tile gerado a partir da versão ``version`` (lida antes da geração)"""
+        self._remember(key, data, version)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as tile_file:
+                tile_file.write(FILE_HEADER.pack(version))
+                tile_file.write(data)
+            os.replace(temp_path, path)
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.directory:
+            for directory, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith('.mvt'):
+                        os.remove(os.path.join(directory, name))
+
+
+def tile_cache(app=None):
+    return (app or current_app).extensions['tile_cache']
+
+
+def _render_postgis(z, x, y):
+    return db.session.execute(PG_TILE_SQL, {
+        'z': z, 'x': x, 'y': y, 'extent': mvt.EXTENT, 'buffer': mvt.BUFFER,
+        'margin': mvt.BUFFER / mvt.EXTENT
+    }).scalar() or b''
+
+
+def _render_python(z, x, y):
+    index = spatial.fallback_index()
+    ids = sorted(set(index.tree.search(*mvt.tile_bounds(z, x, y, buffer=mvt.BUFFER))))
+    points, polygons = [], []
+    table = Property.__table__
+    for start in range(0, len(ids), 5000):
+        rows = db.session.execute(
+            select(table.c.id, table.c.municipal_code, table.c.regularization_status,
+                   table.c.geometry, table.c.polygon_geometry)
+            .where(table.c.id.in_(ids[start:start + 5000]))
+        )
+        for property_id, code, status, point, polygon in rows:
+            attributes = {'municipal_code': code, 'status': status}
+            point = wkb.decode(point)
+            if point:
+                commands = mvt.encode_point(*point['coordinates'], z, x, y)
+                if commands:
+                    points.append((property_id, mvt.POINT, commands, attributes))
+            polygon = wkb.decode(polygon)
+            if polygon:
+                commands = mvt.encode_polygon(polygon['coordinates'], z, x, y)
+                if commands:
+                    polygons.append((property_id, mvt.POLYGON, commands, attributes))
+
+    data = b''
+    if points:
+        data += mvt.encode_layer('properties', sorted(points))
+    if polygons:
+        data += mvt.encode_layer('property_polygons', sorted(polygons))
+    return data
+
+
+def get_tile(z, x, y):
+    """Conteúdo do tile, do cache ou gerado no banco"""
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError('Tile fora dos limites')
+
+    cache = tile_cache()
+    key = (z, x, y)
+    # Lida antes da geração: alterações confirmadas durante ela invalidam o tile
+    version = property_changes.current_version()
+    cache.sync(version)
+    data = cache.get(key)
+    if data is None:
+        data = _render_postgis(z, x, y) if db.engine.dialect.name == 'postgresql' else _render_python(z, x, y)
+        cache.set(key, bytes(data), version)
+    return data
+
+
+# --- Invalidação ---------------------------------------------------------------
+
+def load_changes(version, until):
+    """Alterações das versões (version, until]: lista de (versão, retângulo), None se não cobertas.
+
+    O retângulo envolve as posições anterior e atual dos imóveis alterados na
+    versão; None quando a versão alterou imóveis demais e descarta todos os tiles.
+    """
+    rows = property_changes.changes_since(version, until)
+    if rows is None:
+        return None
+    by_version = OrderedDict()
+    for change_version, property_id, previous in rows:
+        by_version.setdefault(change_version, []).append((property_id, previous))
+
+    # Posição atual, lida depois da versão: pode ser mais nova, nunca mais antiga
+    property_ids = {property_id for changes in by_version.values() if len(changes) <= MAX_CHANGES_PER_VERSION
+                    for property_id, _ in changes}
+    current = {}
+    table = Property.__table__
+    ordered = sorted(property_ids)
+    for start in range(0, len(ordered), 5000):
+        rows = db.session.execute(
+            select(table.c.id, table.c.geometry, table.c.polygon_geometry)
+            .where(table.c.id.in_(ordered[start:start + 5000]))
+        )
+        for property_id, point, polygon in rows:
+            current[property_id] = property_changes.geometry_bounds(point, polygon)
+
+    changes = []
+    for change_version, items in by_version.items():
+        if len(items) > MAX_CHANGES_PER_VERSION:
+            changes.append((change_version, None))
+            continue
+        for property_id, previous in items:
+            for box in (previous, current.get(property_id)):
+                if box:
+                    changes.append((change_version, box))
+    return changes
+
+
+def clear_cache():
+    """Descarta todos os tiles do cache (memória deste processo e disco)"""
+    tile_cache().clear()
+
+
+def init_app(app):
+    """Cria o cache de tiles"""
+    app.extensions['tile_cache'] = TileCache(
+        max_entries=app.config.get('TILE_CACHE_SIZE', 2048),
+        ttl=app.config.get('TILE_CACHE_TTL', 600),
+        directory=app.config.get('TILE_CACHE_DIR', '')
+    )
@@ -0,0 +1,125 @@
+"""Decodificação de geometrias WKB/EWKB em Python.
+
+Usada quando o banco não oferece funções espaciais para projetar coordenadas
+(SQLite com SpatiaLite devolve as geometrias como EWKB). Suporta os tipos das
+colunas de ``properties``: ``POINT`` e ``POLYGON`` (com Z/M ignorados).
+``decode_points`` decodifica muitos pontos 2D de uma vez com ``struct.iter_unpack``.
+"""
+import struct
+from binascii import unhexlify
+
+EWKB_Z = 0x80000000
+EWKB_M = 0x40000000
+EWKB_SRID = 0x20000000
+
+POINT = 1
+POLYGON = 3
+
+
+def _raw_bytes(value):
+    """Bytes do WKB a partir de WKBElement, bytes, memoryview ou texto hexadecimal"""
+    data = getattr(value, 'data', value)
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    if isinstance(data, str):
+        return unhexlify(data)
+    return bytes(data)
+
+
+def _header(data):
+    """Retorna (prefixo struct, tipo base, dimensões, deslocamento após o cabeçalho)"""
+    prefix = '<' if data[0] == 1 else '>'
+    (type_code,) = struct.unpack_from(prefix + 'I', data, 1)
+    offset = 5
+    if type_code & EWKB_SRID:
+        offset += 4
+
+    dimensions = 2
+    if type_code & EWKB_Z:
+        dimensions += 1
+    if type_code & EWKB_M:
+        dimensions += 1
+
+    # Variante ISO: 1001 (Z), 2001 (M), 3001 (ZM)
+    base = type_code & 0x0fffffff
+    iso_dimensions, base = divmod(base, 1000)
+    dimensions += {1: 1, 2: 1, 3: 2}.get(iso_dimensions, 0)
+    return prefix, base, dimensions, offset
+
+
+def _ring(data, prefix, dimensions, offset):
+    (count,) = struct.unpack_from(prefix + 'I', data, offset)
+    offset += 4
+    values = struct.unpack_from(prefix + 'd' * (count * dimensions), data, offset)
+    points = [[values[i], values[i + 1]] for i in range(0, len(values), dimensions)]
+    return points, offset + 8 * count * dimensions
+
+
+def decode(value):
+    """Geometria no formato GeoJSON (dict) ou None"""
+    if value is None:
+        return None
+    data = _raw_bytes(value)
+    if not data:
+        return None
+
+    prefix, base, dimensions, offset = _header(data)
+    if base == POINT:
+        x, y = struct.unpack_from(prefix + 'dd', data, offset)
+        return {'type': 'Point', 'coordinates': [x, y]}
+    if base == POLYGON:
+        (ring_count,) = struct.unpack_from(prefix + 'I', data, offset)
+        offset += 4
+        rings = []
+        for _ in range(ring_count):
+            ring, offset = _ring(data, prefix, dimensions, offset)
+            rings.append(ring)
+        return {'type': 'Polygon', 'coordinates': rings}
+    raise ValueError(f'Tipo de geometria WKB não suportado: {base}')
+
+
+# Layouts de ponto 2D little-endian: (tamanho, cabeçalho) -> formato para iter_unpack
+_POINT_LAYOUTS = {
+    (21, b'\x01' + struct.pack('<I', POINT)): '<5x2d',
+    (25, b'\x01' + struct.pack('<I', POINT | EWKB_SRID)): '<9x2d',
+}
+
+
+def decode_points(values):
+    """Coordenadas [x, y] de uma sequência de pontos (None para valores vazios).
+
+    Pontos 2D little-endian (o formato devolvido pelo PostGIS e pelo SpatiaLite)
+    são concatenados por layout e desempacotados em uma única chamada; os
+    demais passam por ``decode``.
+    """
+    results = [None] * len(values)
+    batches = {}
+    for position, value in enumerate(values):
+        if value is None:
+            continue
+        data = _raw_bytes(value)
+        if not data:
+            continue
+        layout = _POINT_LAYOUTS.get((len(data), data[:5]))
+        if layout is None:
+            geometry = decode(data)
+            results[position] = geometry['coordinates'] if geometry['type'] == 'Point' else None
+            continue
+        positions, chunks = batches.setdefault(layout, ([], []))
+        positions.append(position)
+        chunks.append(data)
+
+    for layout, (positions, chunks) in batches.items():
+        for position, (x, y) in zip(positions, struct.iter_unpack(layout, b''.join(chunks))):
+            results[position] = [x, y]
+    return results
+
+
+def bounds(geometry):
+    """Retângulo envolvente (min_x, min_y, max_x, max_y) de uma geometria GeoJSON"""
+    if geometry['type'] == 'Point':
+        x, y = geometry['coordinates']
+        return x, y, x, y
+    xs = [point[0] for ring in geometry['coordinates'] for point in ring]
+    ys = [point[1] for ring in geometry['coordinates'] for point in ring]
+    return min(xs), min(ys), max(xs), max(ys)